@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Context depth benchmark: decompiles each contract at a range of context
+depths, passed as ContextDepthHint facts to a single decompiler, and at the
+depth predicted from its code by src/prescan.py. Reports the runtime, peak
+memory and imprecision (jumps to many targets, polymorphic jump targets) of
+each run as CSV, showing the speed/precision trade-off of the prediction.
+
+Example:
+  ./benchmarks/context_depth.py tests/core-decompiler --depths 2,4,6,8 -o context_depth.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+
+GIGAHORSE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, GIGAHORSE_DIR)
+
+import src.factgen as factgen
+import src.prescan as prescan
+from scalability import run_measured, count_tuples
+
+DEFAULT_SOUFFLE_BIN = 'souffle'
+DEFAULT_DECOMPILER_DL = join(GIGAHORSE_DIR, 'logic/decompiler.dl')
+
+IMPRECISION = ('Analytics_JumpToMany', 'Analytics_PolymorphicTarget', 'Analytics_ReachableBlocks')
+
+
+def decompiler_args(args, fact_dir, out_dir):
+    if args.decompiler_bin:
+        return [abspath(args.decompiler_bin), "--facts={}".format(fact_dir), "--output={}".format(out_dir)]
+    return [DEFAULT_SOUFFLE_BIN, DEFAULT_DECOMPILER_DL,
+            "--fact-dir={}".format(fact_dir), "--output-dir={}".format(out_dir)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed/precision trade-off of per-contract context depths.")
+    parser.add_argument("contracts", nargs="+",
+                        help="bytecode files, or directories searched recursively for .hex files.")
+    parser.add_argument("--depths", default="2,3,4,6,8",
+                        help="comma-separated context depths to run every contract at.")
+    parser.add_argument("--decompiler_bin", default=None,
+                        help="compiled decompiler to use (runs souffle in interpreted mode otherwise).")
+    parser.add_argument("-T", "--timeout_secs", type=int, default=600)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+    depths = [int(d) for d in args.depths.split(',')]
+
+    env = os.environ.copy()
+    functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
+    env["LD_LIBRARY_PATH"] = functor_path
+    env["LIBRARY_PATH"] = functor_path
+
+    paths = []
+    for path in args.contracts:
+        if os.path.isdir(path):
+            paths += sorted(join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith('.hex'))
+        else:
+            paths.append(path)
+
+    writer = csv.writer(args.output)
+    writer.writerow(('contract', 'jumps', 'jumpis', 'push2_jump_targets', 'dispatcher_size', 'code_length',
+                     'depth', 'predicted', 'seconds', 'peak_kb') + IMPRECISION)
+
+    for path in paths:
+        with tempfile.TemporaryDirectory() as work_dir:
+            blocks = factgen.generate_facts(factgen.read_bytecode(path), work_dir, dasm=False)
+            features = prescan.scan(blocks)
+            predicted = prescan.context_depth(features)
+            for depth in sorted(set(depths) | {predicted}):
+                prescan.write_context_depth_hint(work_dir, depth)
+                out_dir = join(work_dir, 'out{}'.format(depth))
+                os.makedirs(out_dir)
+                seconds, peak_kb, timed_out = run_measured(decompiler_args(args, work_dir, out_dir), args.timeout_secs, env)
+                writer.writerow(
+                    (factgen.contract_name(path), features['jumps'], features['jumpis'],
+                     features['push2_jump_targets'], features['dispatcher_size'], features['code_length'],
+                     depth, depth == predicted, 'timeout' if timed_out else '{:.2f}'.format(seconds), peak_kb) +
+                    tuple('' if timed_out else count_tuples(out_dir, r) for r in IMPRECISION)
+                )
+                args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Context encoding benchmark: decompiles each contract with the nested record
+context encoding and with the compact one (COMPACT_CONTEXT), reporting the
+runtime and peak memory of both, and checking that they agree.
+
+Contexts are printed differently by the two encodings, but every relation
+must have the same number of tuples, and relations without contexts (such
+as the TAC_* outputs) the same contents.
+
+Example:
+  ./benchmarks/context_encoding.py tests/core-decompiler -o context_encoding.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+
+GIGAHORSE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, GIGAHORSE_DIR)
+
+import src.factgen as factgen
+from src.manifest import build_manifest
+from scalability import run_measured
+
+DEFAULT_SOUFFLE_BIN = 'souffle'
+DEFAULT_DECOMPILER_DL = join(GIGAHORSE_DIR, 'logic/decompiler.dl')
+
+ENCODINGS = ('nested', 'compact')
+
+
+def decompiler_args(args, encoding, fact_dir, out_dir):
+    binary = getattr(args, encoding + '_bin')
+    if binary:
+        return [abspath(binary), "--facts={}".format(fact_dir), "--output={}".format(out_dir)]
+    macros = ' '.join(
+        ["CONTEXT_SENSITIVITY={}".format(args.context_sensitivity)] +
+        (["COMPACT_CONTEXT"] if encoding == 'compact' else [])
+    )
+    return [DEFAULT_SOUFFLE_BIN, DEFAULT_DECOMPILER_DL, "-M", macros,
+            "--fact-dir={}".format(fact_dir), "--output-dir={}".format(out_dir)]
+
+
+def mismatches(nested_dir, compact_dir):
+    """The relations whose tuple counts differ, and those whose contents differ."""
+    nested, compact = (build_manifest(d, hashes=True) for d in (nested_dir, compact_dir))
+    counts, contents = [], []
+    for name in sorted(set(nested) | set(compact)):
+        a, b = nested.get(name, {}), compact.get(name, {})
+        if a.get('tuples') != b.get('tuples'):
+            counts.append(name)
+        elif a.get('hash') != b.get('hash'):
+            contents.append(name)
+    return counts, contents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the decompiler's context encodings.")
+    parser.add_argument("contracts", nargs="+",
+                        help="bytecode files, or directories searched recursively for .hex files.")
+    parser.add_argument("--context_sensitivity", default="transactional-context",
+                        help="the context sensitivity to compare the encodings of.")
+    for encoding in ENCODINGS:
+        parser.add_argument("--{}_bin".format(encoding), default=None,
+                            help="decompiler compiled with the {} encoding (runs souffle in interpreted mode otherwise).".format(encoding))
+    parser.add_argument("-T", "--timeout_secs", type=int, default=600)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
+    env["LD_LIBRARY_PATH"] = functor_path
+    env["LIBRARY_PATH"] = functor_path
+
+    paths = []
+    for path in args.contracts:
+        if os.path.isdir(path):
+            paths += sorted(join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith('.hex'))
+        else:
+            paths.append(path)
+
+    writer = csv.writer(args.output)
+    writer.writerow(('contract', 'nested_seconds', 'nested_peak_kb', 'compact_seconds', 'compact_peak_kb',
+                     'count_mismatches', 'context_relations'))
+
+    for path in paths:
+        with tempfile.TemporaryDirectory() as work_dir:
+            factgen.generate_facts(factgen.read_bytecode(path), work_dir, dasm=False)
+            row = [factgen.contract_name(path)]
+            timed_out = False
+            for encoding in ENCODINGS:
+                out_dir = join(work_dir, encoding)
+                os.makedirs(out_dir)
+                seconds, peak_kb, timed_out_now = run_measured(
+                    decompiler_args(args, encoding, work_dir, out_dir), args.timeout_secs, env)
+                timed_out = timed_out or timed_out_now
+                row += ['timeout' if timed_out_now else '{:.2f}'.format(seconds), peak_kb]
+
+            if timed_out:
+                row += ['', '']
+            else:
+                counts, contents = mismatches(*(join(work_dir, e) for e in ENCODINGS))
+                row += [' '.join(counts), ' '.join(contents)]
+            writer.writerow(row)
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Scalability benchmark: decompiles synthetic contracts while sweeping one
+generator parameter, and reports runtime and peak memory per contract as CSV.
+
+Example:
+  ./benchmarks/scalability.py --vary num_functions --values 1,2,4,8,16,32 --call_depth 4
+"""
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+GIGAHORSE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, GIGAHORSE_DIR)
+
+import src.blockparse as blockparse
+import src.exporter as exporter
+from src.synthetic import SyntheticContractGenerator
+
+DEFAULT_SOUFFLE_BIN = 'souffle'
+DEFAULT_DECOMPILER_DL = join(GIGAHORSE_DIR, 'logic/decompiler.dl')
+
+PARAMETERS = ('num_functions', 'call_depth', 'shared_functions', 'loops', 'code_size')
+
+
+def run_measured(args, timeout, env):
+    """Run a process, returning (seconds, peak RSS in KB, timed out)."""
+    start = time.time()
+    p = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    while True:
+        pid, status, usage = os.wait4(p.pid, os.WNOHANG)
+        if pid != 0:
+            return time.time() - start, usage.ru_maxrss, False
+        if time.time() - start > timeout:
+            p.kill()
+            _, _, usage = os.wait4(p.pid, 0)
+            return time.time() - start, usage.ru_maxrss, True
+        time.sleep(0.01)
+
+
+def count_tuples(out_dir, relation):
+    try:
+        with open(join(out_dir, relation + '.csv')) as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decompiler scalability benchmark on synthetic contracts.")
+    parser.add_argument("--vary", choices=PARAMETERS, required=True,
+                        help="the generator parameter to sweep.")
+    parser.add_argument("--values", required=True,
+                        help="comma-separated values of the swept parameter.")
+    for param in PARAMETERS:
+        parser.add_argument("--" + param, type=int, default=0 if param in ('shared_functions', 'loops', 'code_size') else 1)
+    parser.add_argument("--decompiler_bin", default=None,
+                        help="compiled decompiler to use (runs souffle in interpreted mode otherwise).")
+    parser.add_argument("-T", "--timeout_secs", type=int, default=600)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
+    env["LD_LIBRARY_PATH"] = functor_path
+    env["LIBRARY_PATH"] = functor_path
+
+    writer = csv.writer(args.output)
+    writer.writerow(PARAMETERS + ('bytes', 'seconds', 'max_rss_kb', 'timeout', 'blocks', 'functions'))
+
+    for value in map(int, args.values.split(',')):
+        params = {p: getattr(args, p) for p in PARAMETERS}
+        params[args.vary] = value
+        bytecode = SyntheticContractGenerator(**params).generate_hex()
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            out_dir = join(work_dir, 'out')
+            os.makedirs(out_dir)
+            blocks = blockparse.EVMBytecodeParser(bytecode).parse()
+            exporter.InstructionTsvExporter(blocks).export(output_dir=work_dir, bytecode_hex=bytecode)
+
+            if args.decompiler_bin:
+                analysis_args = [abspath(args.decompiler_bin), "--facts={}".format(work_dir), "--output={}".format(out_dir)]
+            else:
+                analysis_args = [DEFAULT_SOUFFLE_BIN, DEFAULT_DECOMPILER_DL,
+                                 "--fact-dir={}".format(work_dir), "--output-dir={}".format(out_dir)]
+            seconds, max_rss, timed_out = run_measured(analysis_args, args.timeout_secs, env)
+
+            writer.writerow(tuple(params[p] for p in PARAMETERS) + (
+                len(bytecode) // 2, '{:.2f}'.format(seconds), max_rss, int(timed_out),
+                count_tuples(out_dir, 'Analytics_Blocks'), count_tuples(out_dir, 'Analytics_Functions')
+            ))
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
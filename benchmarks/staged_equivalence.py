@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Staged decompiler equivalence check: decompiles each contract with the
+monolithic decompiler and with its two stages (decompiler_transform.dl,
+then decompiler_global.dl over the transform stage's outputs), reporting
+the relations whose tuples differ and the runtime of both.
+
+Only the relations output by the monolithic decompiler are compared: the
+transform stage also outputs the intermediate relations the global stage
+reads. An empty 'differences' column means the stages are equivalent for
+that contract.
+
+With --compile DIR, the three programs are first compiled into DIR (or
+reused from it, if already there), as gigahorse.py does.
+
+Example:
+  ./benchmarks/staged_equivalence.py tests/core-decompiler --compile build -o staged_equivalence.csv
+"""
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+
+GIGAHORSE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, GIGAHORSE_DIR)
+
+import src.factgen as factgen
+from src.sharding import diff_outputs
+from scalability import run_measured
+
+DEFAULT_SOUFFLE_BIN = 'souffle'
+
+PROGRAMS = ('decompiler', 'decompiler_transform', 'decompiler_global')
+
+
+def souffle_macros():
+    return 'GIGAHORSE_DIR={} BULK_ANALYSIS='.format(GIGAHORSE_DIR)
+
+
+def compile_programs(souffle_bin, build_dir, env):
+    """Compiles each of PROGRAMS into build_dir, unless already there. Returns the binaries by program."""
+    os.makedirs(build_dir, exist_ok=True)
+    binaries = {}
+    for program in PROGRAMS:
+        binary = abspath(join(build_dir, program + '_compiled'))
+        if not os.path.isfile(binary):
+            print("Compiling {}.dl".format(program), file=sys.stderr)
+            subprocess.run([souffle_bin, '-c', '-M', souffle_macros(), '-o', binary,
+                            join(GIGAHORSE_DIR, 'logic', program + '.dl')], env=env, check=True)
+        binaries[program] = binary
+    return binaries
+
+
+def program_args(souffle_bin, binaries, program, fact_dir, out_dir):
+    if program in binaries:
+        return [binaries[program], "--facts={}".format(fact_dir), "--output={}".format(out_dir)]
+    return [souffle_bin, join(GIGAHORSE_DIR, 'logic', program + '.dl'), '-M', souffle_macros(),
+            "--fact-dir={}".format(fact_dir), "--output-dir={}".format(out_dir)]
+
+
+def differences(monolithic_dir, staged_dir):
+    """The monolithic decompiler's output relations with different tuples in the staged outputs."""
+    outputs = set(os.listdir(monolithic_dir))
+    return sorted(name for name in diff_outputs(monolithic_dir, staged_dir) if name in outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that the staged decompiler agrees with the monolithic one.")
+    parser.add_argument("contracts", nargs="+",
+                        help="bytecode files, or directories searched recursively for .hex files.")
+    parser.add_argument("--souffle_bin", default=DEFAULT_SOUFFLE_BIN)
+    parser.add_argument("--compile", metavar="DIR", default=None,
+                        help="compile the programs into DIR first (runs souffle in interpreted mode otherwise).")
+    parser.add_argument("-T", "--timeout_secs", type=int, default=600)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
+    env["LD_LIBRARY_PATH"] = functor_path
+    env["LIBRARY_PATH"] = functor_path
+
+    binaries = compile_programs(args.souffle_bin, args.compile, env) if args.compile else {}
+
+    paths = []
+    for path in args.contracts:
+        if os.path.isdir(path):
+            paths += sorted(join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith('.hex'))
+        else:
+            paths.append(path)
+
+    writer = csv.writer(args.output)
+    writer.writerow(('contract', 'monolithic_seconds', 'staged_seconds', 'differences'))
+
+    for path in paths:
+        with tempfile.TemporaryDirectory() as work_dir:
+            factgen.generate_facts(factgen.read_bytecode(path), work_dir, dasm=False)
+            monolithic_dir, staged_dir = join(work_dir, 'mono'), join(work_dir, 'staged')
+            for d in (monolithic_dir, staged_dir):
+                os.makedirs(d)
+
+            def run(program, fact_dir, out_dir):
+                seconds, _, timed_out = run_measured(
+                    program_args(args.souffle_bin, binaries, program, fact_dir, out_dir), args.timeout_secs, env)
+                return None if timed_out else seconds
+
+            monolithic = run('decompiler', work_dir, monolithic_dir)
+            transform = run('decompiler_transform', work_dir, staged_dir)
+            global_stage = run('decompiler_global', staged_dir, staged_dir) if transform is not None else None
+            staged = None if global_stage is None else transform + global_stage
+
+            if monolithic is None or staged is None:
+                diff = ''
+            else:
+                diff = ' '.join(differences(monolithic_dir, staged_dir))
+            writer.writerow((factgen.contract_name(path),
+                             'timeout' if monolithic is None else '{:.2f}'.format(monolithic),
+                             'timeout' if staged is None else '{:.2f}'.format(staged),
+                             diff))
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmarks loading decompiler output with src/tac.py against the list-scanning
+approach previously used by clients/visualizeout.py.
+
+Run on the output directory of a large contract (e.g. .temp/<contract>/out), or
+without one to benchmark a synthetic output with --blocks blocks.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from src.tac import TACOutput
+
+NAIVE_SAMPLE = 200
+"""Number of blocks for which predecessors/successors are computed by scanning."""
+
+
+def write_synthetic_output(out_dir, num_blocks, seed=0):
+    rng = random.Random(seed)
+    blocks = ['0x{:x}'.format(i * 32) for i in range(num_blocks)]
+
+    def write(name, rows):
+        with open(join(out_dir, name + '.csv'), 'w') as f:
+            f.writelines('\t'.join(row) + '\n' for row in rows)
+
+    statements = [('0x{:x}'.format(int(b, 16) + j), b) for b in blocks for j in range(rng.randint(1, 12))]
+    write('TAC_Block', statements)
+    write('TAC_Op', ((s, rng.choice(('ADD', 'SLOAD', 'JUMPI', 'CALLPRIVATE'))) for s, _ in statements))
+    write('TAC_Def', ((s, '0x{:x}'.format(1 << 24 | i), '0') for i, (s, _) in enumerate(statements)))
+    write('TAC_Use', ((s, '0x{:x}'.format(1 << 24 | max(i - 1, 0)), '0') for i, (s, _) in enumerate(statements)))
+    edges = [(a, b) for a, b in zip(blocks, blocks[1:])]
+    edges += [(rng.choice(blocks), rng.choice(blocks)) for _ in range(num_blocks // 2)]
+    write('LocalBlockEdge', edges)
+
+
+def parse_csv(out_dir, name):
+    with open(join(out_dir, name + '.csv')) as f:
+        return [line.strip('\n \t\r').split('\t') for line in f]
+
+
+def measure(label, function):
+    """Times function, then runs it again under tracemalloc (which distorts timings) for its peak memory."""
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{:<40} {:10.3f}s {:10.1f} MB'.format(label, elapsed, peak / 2**20))
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TAC loader benchmark.")
+    parser.add_argument("out_dir", nargs="?", default=None, help="a decompiler output directory.")
+    parser.add_argument("--blocks", type=int, default=100000, help="size of the synthetic output.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.out_dir
+        if out_dir is None:
+            out_dir = tmp
+            write_synthetic_output(out_dir, args.blocks)
+
+        def naive_load():
+            return {name: parse_csv(out_dir, name) for name in ('TAC_Block', 'TAC_Op', 'TAC_Use', 'TAC_Def', 'LocalBlockEdge')}
+
+        def indexed_load():
+            tac = TACOutput(out_dir)
+            tac.block_statements()
+            for name in ('TAC_Op', 'TAC_Use', 'TAC_Def', 'LocalBlockEdge'):
+                tac.relation(name)
+            return tac
+
+        naive, _ = measure('load (lists of strings)', naive_load)
+        tac, _ = measure('load (TACOutput)', indexed_load)
+
+        edges = naive['LocalBlockEdge']
+        blocks = sorted({b for _, b in naive['TAC_Block']})
+        sample = blocks[:NAIVE_SAMPLE]
+
+        def naive_adjacency():
+            return [({k for k, v in edges if v == b}, {v for k, v in edges if k == b}) for b in sample]
+
+        def indexed_adjacency():
+            return [(set(tac.predecessors(b)), set(tac.successors(b))) for b in blocks]
+
+        naive_result, naive_time = measure('prev/next, scanning ({} blocks)'.format(len(sample)), naive_adjacency)
+        indexed_result, _ = measure('prev/next, indexed ({} blocks)'.format(len(blocks)), indexed_adjacency)
+        assert naive_result == indexed_result[:len(sample)]
+        print('Estimated scanning time for all {} blocks: {:.1f}s'.format(len(blocks), naive_time * len(blocks) / max(len(sample), 1)))
+
+
+if __name__ == '__main__':
+    main()
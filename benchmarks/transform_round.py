@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Transformation round benchmark: for each contract, reports how many statements
+the statement insertor changes and the time of the monolithic decompiler
+against the staged one. For contracts whose transformation changes nothing,
+both global stage variants are timed, showing the saving from reusing the
+pre-transformation local analysis.
+
+Both checks of equivalence are reported as the monolithic decompiler's
+output relations whose tuples differ: in the staged outputs
+('staged_differences') and, when the untransformed global stage runs, in
+its outputs compared with the regular global stage's
+('untransformed_differences'). Empty columns mean the variants agree.
+
+Example:
+  ./benchmarks/transform_round.py tests/core-decompiler -o transform_round.csv
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+
+GIGAHORSE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, GIGAHORSE_DIR)
+
+import src.factgen as factgen
+from src.sharding import diff_outputs
+from scalability import run_measured, count_tuples
+from staged_equivalence import differences
+
+DEFAULT_SOUFFLE_BIN = 'souffle'
+
+PROGRAMS = ('decompiler', 'decompiler_transform', 'decompiler_global', 'decompiler_global_untransformed')
+
+
+def program_args(args, program, fact_dir, out_dir):
+    binary = getattr(args, program + '_bin')
+    if binary:
+        return [abspath(binary), "--facts={}".format(fact_dir), "--output={}".format(out_dir)]
+    return [DEFAULT_SOUFFLE_BIN, join(GIGAHORSE_DIR, 'logic', program + '.dl'),
+            "--fact-dir={}".format(fact_dir), "--output-dir={}".format(out_dir)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the decompiler's transformation round.")
+    parser.add_argument("contracts", nargs="+",
+                        help="bytecode files, or directories searched recursively for .hex files.")
+    for program in PROGRAMS:
+        parser.add_argument("--{}_bin".format(program), default=None,
+                            help="compiled {}.dl to use (runs souffle in interpreted mode otherwise).".format(program))
+    parser.add_argument("-T", "--timeout_secs", type=int, default=600)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    env = os.environ.copy()
+    functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
+    env["LD_LIBRARY_PATH"] = functor_path
+    env["LIBRARY_PATH"] = functor_path
+
+    paths = []
+    for path in args.contracts:
+        if os.path.isdir(path):
+            paths += sorted(join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith('.hex'))
+        else:
+            paths.append(path)
+
+    writer = csv.writer(args.output)
+    writer.writerow(('contract', 'statements', 'transformed_statements', 'monolithic_seconds',
+                     'transform_seconds', 'global_seconds', 'global_untransformed_seconds',
+                     'staged_differences', 'untransformed_differences'))
+
+    for path in paths:
+        with tempfile.TemporaryDirectory() as work_dir:
+            factgen.generate_facts(factgen.read_bytecode(path), work_dir, dasm=False)
+            monolithic_dir, staged_dir, untransformed_dir, untransformed_out = (
+                join(work_dir, d) for d in ('mono', 'staged', 'untransformed', 'untransformed_out'))
+            for d in (monolithic_dir, staged_dir, untransformed_dir, untransformed_out):
+                os.makedirs(d)
+
+            def timed(program, fact_dir, out_dir):
+                seconds, _, timed_out = run_measured(program_args(args, program, fact_dir, out_dir), args.timeout_secs, env)
+                return 'timeout' if timed_out else '{:.2f}'.format(seconds)
+
+            monolithic = timed('decompiler', work_dir, monolithic_dir)
+            transform = timed('decompiler_transform', work_dir, staged_dir)
+            transformed = count_tuples(staged_dir, 'TransformedStatement')
+            if transformed == 0:
+                # The global stage writes over its inputs, so the untransformed one reads a copy of them
+                for name in os.listdir(staged_dir):
+                    shutil.copyfile(join(staged_dir, name), join(untransformed_dir, name))
+            global_stage = timed('decompiler_global', staged_dir, staged_dir)
+            untransformed = ''
+            if transformed == 0:
+                untransformed = timed('decompiler_global_untransformed', untransformed_dir, untransformed_out)
+
+            completed = 'timeout' not in (monolithic, transform, global_stage)
+            staged_differences = ' '.join(differences(monolithic_dir, staged_dir)) if completed else ''
+            untransformed_differences = ''
+            if completed and untransformed not in ('', 'timeout'):
+                outputs = set(os.listdir(monolithic_dir))
+                untransformed_differences = ' '.join(
+                    sorted(name for name in diff_outputs(staged_dir, untransformed_out) if name in outputs))
+
+            with open(join(work_dir, 'Statement_Opcode.facts')) as f:
+                statements = sum(1 for _ in f)
+            writer.writerow((factgen.contract_name(path), statements, transformed,
+                             monolithic, transform, global_stage, untransformed,
+                             staged_differences, untransformed_differences))
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,24 @@
 #!/usr/bin/env python3
 
-import pydot
+import argparse
+import hashlib
+import html
+import os
+import shutil
+import subprocess
+import sys
 from collections import defaultdict
+from multiprocessing import Pool, cpu_count
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from src.tac import TACOutput, pc_sort_key
 
 
 BLOCK_SIZE_LIMIT = 10
-def parseCsv(name):
-    f = open(name+'.csv')
-    return [line.strip('\n \t\r').split('\t') for line in f]
-
-def load_tac_blocks():
-    out = defaultdict(list)
-    for s, b in parseCsv('TAC_Block'):
-        out[b].append(s)
-    def sortkey(a):
-        try:
-            return int(a, 16)
-        except Exception:
-            return 0
-    return {k:sorted(ss, key = sortkey) for k, ss in out.items()}
-
-def load_tac_sorted(prop):
-    out = defaultdict(list)
-    for s, v, n in parseCsv(prop):
-        n = int(n)
-        while n > len(out[s]) - 1:
-            out[s].append('')
-        if n<0:
-            out[s].append(v)
-        else:
-            out[s][n] = v
-    return out
-
-tac_blocks = defaultdict(list,load_tac_blocks())
-tac_use = load_tac_sorted('TAC_Use')
-tac_def = load_tac_sorted('TAC_Def')
-function_arguments = load_tac_sorted('FormalArgs')
-high_level_function_name = dict(parseCsv('HighLevelFunctionName'))
-tac_op = dict(parseCsv('TAC_Op'))
-variable_value = dict(parseCsv('TAC_Variable_Value'))
 
+DEFAULT_CACHE_DIR = join(os.path.expanduser('~'), '.cache', 'gigahorse-visualizeout')
+"""Rendered per-function graphs, keyed by a hash of their Graphviz source."""
 
 special_block_colors = (
     ('Function',0,"yellow"),
@@ -50,95 +29,204 @@ special_block_colors = (
 )
 
 
-function_calls = defaultdict(set)
-for k,v in parseCsv('IRFunctionCall'):
-    function_calls[k].add(v)
-
-
-function_call_return = {a[0] : (a[1], a[2]) for a in parseCsv('IRFunctionCallReturn')}
-
-functions = {a[0]  for a in parseCsv('Function')}
-function_entries = {a[0]  for a in parseCsv('IRFunctionEntry')}
-in_function = dict(parseCsv('InFunction'))
-
-block_colors = defaultdict(lambda : "green")
-
-block_property = {}
-
-for k, index, v in special_block_colors:
-    special_blocks = [s[index] for s in parseCsv(k)]
-    block_property[k] = special_blocks
-    for s in special_blocks:
-        block_colors[s] = v
-    
-edges = parseCsv('LocalBlockEdge')
-def prev_block(block):
-    return {k for k,v in edges if v == block}
-def next_block(block):
-    return {v for k,v in edges if k == block}
-
-def format_var(v):
-    if v in variable_value:
-        value = '('+variable_value[v]+')'
+class Visualizer:
+    def __init__(self, tac: TACOutput):
+        self.tac = tac
+        self.function_arguments = tac.positional('FormalArgs')
+        self.function_calls = tac['IRFunctionCall'].to_multidict()
+        self.function_call_return = {a[0] : (a[1], a[2]) for a in tac['IRFunctionCallReturn']}
+        self.function_entries = set(tac['IRFunctionEntry'].project(0))
+        self.block_colors = defaultdict(lambda : "green")
+        self.block_property = {}
+        for k, index, v in special_block_colors:
+            special_blocks = list(tac[k].project(index))
+            self.block_property[k] = set(special_blocks)
+            for s in special_blocks:
+                self.block_colors[s] = v
+
+    def blocks(self):
+        """Maps every block, including blocks only mentioned by edges, to its statements."""
+        tac_blocks = defaultdict(list, self.tac.block_statements())
+        for fro, to in self.tac['LocalBlockEdge']:
+            # insert default placeholder items
+            tac_blocks[fro] ; tac_blocks[to]
+        return tac_blocks
+
+    def prev_block(self, block):
+        return set(self.tac.predecessors(block))
+
+    def next_block(self, block):
+        return set(self.tac.successors(block))
+
+    def format_var(self, v):
+        value = self.tac.variable_value(v)
+        value = '('+value+')' if value is not None else ''
+        return 'v' + v.replace('0x', '')+value
+
+    def render_statements(self, k, stmts):
+        tac = self.tac
+        sorted_stmts = []
+        if k in self.function_entries:
+            function_name = tac.function_name(tac.function_of(k))
+            sorted_stmts.append("function %s(%s)"%(function_name, ', '.join(map(self.format_var, self.function_arguments.get(k, [])))))
+        sorted_stmts.append("Block %s"%k)
+        for s in sorted(stmts, key = pc_sort_key):
+            op = tac.op(s)
+            defs = tac.defs(s)
+            if defs:
+                ret = ', '.join(self.format_var(v) for v in defs) + ' = '
+            else:
+                ret = ''
+            use = ' '.join(self.format_var(v) for v in tac.uses(s))
+            stmt_render = s+': '+ret+op+' '+use
+            if len(stmt_render) > 460:
+                stmt_render = stmt_render[:229] + '...' + stmt_render[-229:]
+            sorted_stmts.append(stmt_render)
+        return sorted_stmts
+
+    @staticmethod
+    def node_label(sorted_stmts):
+        if len(sorted_stmts) > BLOCK_SIZE_LIMIT:
+            half_limit = int(BLOCK_SIZE_LIMIT/2)
+            truncated_stmts = sorted_stmts[:half_limit] + ['...'] + sorted_stmts[-half_limit:]
+        else: truncated_stmts = sorted_stmts
+        return '\\l'.join(truncated_stmts) + '\\l'
+
+    def print_block(self, key, rendered, out=sys.stdout):
+        prev_block, next_block = self.prev_block(key), self.next_block(key)
+        print(file=out)
+        print('Begin block %s'%key, file=out)
+        print('prev = %s, next = %s'%(prev_block if len(prev_block) != 0 else "{}", next_block if len(next_block) != 0 else "{}"), file=out)
+        print('----------------------------------', file=out)
+        print('\n'.join(rendered), file=out)
+        print('----------------------------------', file=out)
+
+    def stream_text(self, out=sys.stdout):
+        """Prints every block without building any graph objects."""
+        tac_blocks = self.blocks()
+        for key in sorted(tac_blocks, key = pc_sort_key):
+            self.print_block(key, self.render_statements(key, tac_blocks[key]), out)
+
+    def graph(self, blocks, edges, rendered_statements, call_node_url=None):
+        """Builds a pydot graph over the given blocks and edges."""
+        import pydot
+        graph = pydot.Dot(graph_type='graph')
+
+        nodeDict = { k : pydot.Node(k, label=self.node_label(rendered_statements[k]), shape="rect", style="filled", fillcolor=self.block_colors[k]) for k in blocks }
+
+        for _, v in nodeDict.items():
+            graph.add_node(v)
+
+        for fro, to in edges:
+            if fro in self.function_calls and to in self.function_calls[fro]:
+                # call edge
+                call_node = "(%s) call %s"%(fro,to)
+                if call_node_url is not None:
+                    graph.add_node(pydot.Node(call_node, URL=call_node_url(to)))
+                graph.add_edge(pydot.Edge(nodeDict[fro], call_node, dir = 'forward', arrowHead = 'normal'))
+                if fro not in self.function_call_return:
+                    continue
+                ret = self.function_call_return[fro][1]
+                # return edge
+                if ret in nodeDict:
+                    graph.add_edge(pydot.Edge(call_node, nodeDict[ret], dir = 'forward', arrowHead = 'normal'))
+                continue
+            if fro in self.block_property["IRFunction_Return"]:
+                continue
+            if fro in nodeDict and to in nodeDict:
+                graph.add_edge(pydot.Edge(nodeDict[fro], nodeDict[to], dir = 'forward', arrowHead = 'normal'))
+        return graph
+
+    def render_whole_contract(self):
+        tac_blocks = self.blocks()
+        rendered_statements = {k: self.render_statements(k, body) for k, body in tac_blocks.items()}
+        graph = self.graph(tac_blocks, list(self.tac['LocalBlockEdge']), rendered_statements)
+        for key in sorted(rendered_statements, key = pc_sort_key):
+            self.print_block(key, rendered_statements[key])
+        graph.write_png('graph.png')
+
+    def function_sources(self):
+        """Yields (function, Graphviz source) for the subgraph of each function."""
+        edges = list(self.tac['LocalBlockEdge'])
+        tac_blocks = self.blocks()
+        for function, blocks in self.tac.function_blocks().items():
+            in_function = set(blocks)
+            function_edges = [(fro, to) for fro, to in edges if fro in in_function]
+            rendered = {k: self.render_statements(k, tac_blocks[k]) for k in blocks}
+            graph = self.graph(blocks, function_edges, rendered, call_node_url=function_filename)
+            yield function, graph.to_string()
+
+
+def function_filename(function):
+    return 'function_%s.svg' % function
+
+
+def render_svg(job):
+    """Renders Graphviz source to svg_path, reusing the cached rendering if there is one."""
+    source, svg_path, cache_dir = job
+    cached = join(cache_dir, hashlib.sha256(source.encode('utf-8')).hexdigest() + '.svg')
+    if not os.path.exists(cached):
+        tmp = '%s.%d.tmp' % (cached, os.getpid())
+        subprocess.run(['dot', '-Tsvg', '-o', tmp], input=source, universal_newlines=True, check=True)
+        os.replace(tmp, cached)
+    shutil.copyfile(cached, svg_path)
+    return svg_path
+
+
+def write_index(visualizer, out_dir):
+    tac = visualizer.tac
+    calls = defaultdict(set)
+    for block, callee in tac['IRFunctionCall']:
+        caller = tac.function_of(block)
+        if caller is not None:
+            calls[caller].add(callee)
+    functions = tac.function_blocks()
+    with open(join(out_dir, 'index.html'), 'w') as f:
+        f.write('<html><head><title>Functions</title></head><body>\n<h1>Functions</h1>\n<ul>\n')
+        for function in sorted(functions, key = pc_sort_key):
+            name = html.escape(tac.function_name(function) or function)
+            callees = ', '.join(
+                '<a href="%s">%s</a>' % (function_filename(c), html.escape(tac.function_name(c) or c))
+                for c in sorted(calls[function], key = pc_sort_key)
+            )
+            f.write('<li><a href="%s">%s</a> (%s, %d blocks)%s</li>\n' % (
+                function_filename(function), name, function, len(functions[function]),
+                ' calls ' + callees if callees else ''
+            ))
+        f.write('</ul>\n</body></html>\n')
+
+
+def render_per_function(visualizer, out_dir, jobs, cache_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    render_jobs = ((source, join(out_dir, function_filename(function)), cache_dir)
+                   for function, source in visualizer.function_sources())
+    with Pool(jobs) as pool:
+        for _ in pool.imap_unordered(render_svg, render_jobs):
+            pass
+    write_index(visualizer, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visualize the decompiler output in the current directory.")
+    parser.add_argument("--text", action="store_true", default=False,
+                        help="only print the blocks, streaming, without building any graph.")
+    parser.add_argument("--per_function", metavar="DIR", default=None,
+                        help="render one svg per function to DIR, with an index.html linking them.")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(),
+                        help="the number of functions to render in parallel.")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR,
+                        help="cache of rendered function graphs.")
+    args = parser.parse_args()
+
+    visualizer = Visualizer(TACOutput('.'))
+    if args.text:
+        visualizer.stream_text()
+    elif args.per_function:
+        render_per_function(visualizer, args.per_function, args.jobs, args.cache_dir)
     else:
-        value = ''
-    return 'v' + v.replace('0x', '')+value
-
-rendered_statements = {}
-def renderBlock(k, stmts):
-    sorted_stmts = []
-    if k in function_entries:
-        function_name = high_level_function_name[in_function[k]]
-        sorted_stmts.append("function %s(%s)"%(function_name, ', '.join(map(format_var, function_arguments[k]))))
-    sorted_stmts.append("Block %s"%k)                        
-    for s in sorted(stmts, key = lambda a: int(a.split('0x')[1].split('_')[0], base=16)):
-        op = tac_op[s]
-        if s in tac_def:
-            ret = ', '.join(format_var(v) for v in tac_def[s]) + ' = '
-        else:
-            ret = ''
-        use = ' '.join(format_var(v) for v in tac_use[s])
-        stmt_render = s+': '+ret+op+' '+use
-        if len(stmt_render) > 460:
-            stmt_render = stmt_render[:229] + '...' + stmt_render[-229:]
-        sorted_stmts.append(stmt_render)
-    if len(sorted_stmts) > BLOCK_SIZE_LIMIT:
-        half_limit = int(BLOCK_SIZE_LIMIT/2)
-        truncated_stmts = sorted_stmts[:half_limit] + ['...'] + sorted_stmts[-half_limit:]
-    else: truncated_stmts = sorted_stmts
-    rendered_statements[k] = sorted_stmts
-    return '\\l'.join(truncated_stmts) + '\\l'
-graph = pydot.Dot(graph_type='graph')
-
-for fro, to in edges:
-    # insert default placeholder items
-    tac_blocks[fro] ; tac_blocks[to]
-
-nodeDict = { k : pydot.Node(k, label=renderBlock(k, body), shape="rect", style="filled", fillcolor=block_colors[k]) for k, body in tac_blocks.items() }
-
-for _, v in nodeDict.items():
-    graph.add_node(v)
-
-for fro, to in edges:
-    if fro in function_calls and to in function_calls[fro]:
-        # call edge
-        graph.add_edge(pydot.Edge(nodeDict[fro], "(%s) call %s"%(fro,to), dir = 'forward', arrowHead = 'normal'))
-        if fro not in function_call_return:
-            continue
-        ret = function_call_return[fro][1]
-        # return edge
-        graph.add_edge(pydot.Edge("(%s) call %s"%(fro,to), nodeDict[ret], dir = 'forward', arrowHead = 'normal'))
-        continue
-    if fro in block_property["IRFunction_Return"]:
-        continue
-    graph.add_edge(pydot.Edge(nodeDict[fro], nodeDict[to], dir = 'forward', arrowHead = 'normal'))
-
-for key in sorted(rendered_statements, key = lambda a: int(a.split('0x')[1], 16)):
-    print()
-    print('Begin block %s'%key)
-    print('prev = %s, next = %s'%(prev_block(key) if len(prev_block(key)) != 0 else "{}", next_block(key) if len(next_block(key)) != 0 else "{}"))
-    print('----------------------------------')
-    print('\n'.join(rendered_statements[key]))
-    print('----------------------------------')
-graph.write_png('graph.png')
+        visualizer.render_whole_contract()
+
 
+if __name__ == '__main__':
+    main()
@@ -8,20 +8,33 @@ import json
 import logging
 import signal
 import shutil
-import re
 import subprocess
 import sys
 import time
-import hashlib
-import pathlib
 from collections import defaultdict
 from multiprocessing import Process, SimpleQueue, Manager, Event, cpu_count
-from os.path import abspath, dirname, join, getsize
+from os.path import abspath, dirname, join
 import os
 
 # Local project imports
 import src.exporter as exporter
 import src.blockparse as blockparse
+import src.factgen as factgen
+from src.telemetry import BatchTelemetry
+from src.cache import CompiledProgramCache, program_key, write_program_key
+from src.common import public_function_signature_filename
+from src.stages import StageCache, TRANSFORM_INPUTS
+from src.profiling import StageProfiler
+from src.scheduling import allocate_threads, predict_jumpdests
+import src.fastpath as fastpath
+import src.prescan as prescan
+import src.discovery as discovery
+import src.plugins as plugins
+import src.scratch as scratch
+import src.sharding as sharding
+import src.summaries as summaries
+from src.tac import TACOutput
+from src.manifest import build_manifest, write_manifest, nonempty_relations, manifest_analytics
 
 devnull = subprocess.DEVNULL
 GIGAHORSE_DIR = dirname(abspath(__file__))
@@ -40,7 +53,20 @@ DEFAULT_DECOMPILER_DL = join(GIGAHORSE_DIR, 'logic/decompiler.dl')
 DEFAULT_SOUFFLE_EXECUTABLE = 'decompiler_compiled'
 """Compiled vulnerability specification file."""
 
-DEFAULT_CACHE_DIR = join(GIGAHORSE_DIR, 'cache')
+TRANSFORM_STAGE_DL = join(GIGAHORSE_DIR, 'logic/decompiler_transform.dl')
+TRANSFORM_STAGE_EXECUTABLE = 'decompiler_transform_compiled'
+GLOBAL_STAGE_DL = join(GIGAHORSE_DIR, 'logic/decompiler_global.dl')
+GLOBAL_STAGE_EXECUTABLE = 'decompiler_global_compiled'
+GLOBAL_UNTRANSFORMED_STAGE_DL = join(GIGAHORSE_DIR, 'logic/decompiler_global_untransformed.dl')
+GLOBAL_UNTRANSFORMED_STAGE_EXECUTABLE = 'decompiler_global_untransformed_compiled'
+"""The stages of the decompiler, used with --staged. The untransformed global stage is
+used when the transformation changed nothing, reusing the transform stage's local analysis."""
+
+SHARD_VALIDATION_FILE = 'shard_validation.json'
+"""Output file listing the relations where sharded and monolithic decompilation differ."""
+
+DEFAULT_CACHE_DIR = os.environ.get('GIGAHORSE_CACHE_DIR', join(GIGAHORSE_DIR, 'cache'))
+"""Directory of compiled Souffle programs, which may be shared between checkouts."""
 
 TEMP_WORKING_DIR = ".temp"
 """Scratch working directory."""
@@ -54,6 +80,12 @@ DEFAULT_PATTERN = ".*.hex"
 DEFAULT_NUM_JOBS = int(cpu_count()*0.9)
 """The number of subprocesses to run at once."""
 
+ENGINES = ('compiled', 'interpreted', 'auto')
+"""How Souffle programs are run. 'auto' interprets them until their compilation finishes."""
+
+INFO_ANALYTICS = {'engine', 'stage', 'context_depth', 'fast_path'}
+"""Analytics that describe the run rather than flag the contract."""
+
 # Command Line Arguments
 
 parser = argparse.ArgumentParser(
@@ -64,7 +96,7 @@ parser.add_argument(
     "filepath",
     metavar = "DIR",
     nargs="+",
-    help="The location to grab contracts from (as bytecode files). Accepts both filenames and directories. All contract filenames should be unique."
+    help="The location to grab contracts from (as bytecode files). Accepts filenames, directories, which are searched recursively, and archives of contracts (.jsonl, .jsonl.gz, .jsonl.zst, .tar, .tar.gz, .zip), which are streamed without extracting them. All contract names should be unique."
 )
 
 parser.add_argument("-S",
@@ -91,6 +123,22 @@ parser.add_argument("-p",
                     help="A regular expression. Only filenames matching it "
                          "will be processed.")
 
+parser.add_argument("--name_field",
+                    default=factgen.DEFAULT_NAME_FIELD,
+                    metavar="FIELD",
+                    help="The field of JSONL records to name contracts by.")
+
+parser.add_argument("--bytecode_field",
+                    default=factgen.DEFAULT_BYTECODE_FIELD,
+                    metavar="FIELD",
+                    help="The field of JSONL records holding contract bytecode.")
+
+parser.add_argument("--contract_list",
+                    default=None,
+                    metavar="FILE",
+                    help="Read the contract paths to analyze from FILE, one per line, if it exists. Otherwise "
+                         "write the paths found in the given locations to FILE, for later runs to reuse.")
+
 parser.add_argument("-r",
                     "--results_file",
                     nargs="?",
@@ -108,6 +156,13 @@ parser.add_argument("-j",
                     metavar="NUM",
                     help="The number of subprocesses to run at once.")
 
+parser.add_argument("--thread_budget",
+                    action="store_true",
+                    default=False,
+                    help="Count -j as Souffle threads rather than contracts: large contracts, and the last "
+                         "contracts of a batch, get several of the -j threads. By default, every Souffle "
+                         "program runs with one thread.")
+
 parser.add_argument("-k",
                     "--skip",
                     type=int,
@@ -139,6 +194,13 @@ parser.add_argument("-q",
                     default=False,
                     help="Silence output.")
 
+parser.add_argument("--no_plugins",
+                    action="store_true",
+                    default=False,
+                    help=f"Run Python clients as scripts, even those setting {plugins.PLUGIN_MARKER} = True and "
+                         f"defining {plugins.ENTRY_POINT}(out_dir), which by default are imported once and run in "
+                         "the worker for each contract.")
+
 parser.add_argument("--rerun_clients",
                     action="store_true",
                     default=False,
@@ -149,6 +211,18 @@ parser.add_argument("--restart",
                     default=False,
                     help="Silence output.")
 
+parser.add_argument("--cache_dir",
+                    default=DEFAULT_CACHE_DIR,
+                    metavar="DIR",
+                    help="Directory of compiled programs, which can be shared between checkouts "
+                         "and concurrent runs (also settable via GIGAHORSE_CACHE_DIR).")
+
+parser.add_argument("--cache_max_size",
+                    type=int,
+                    default=0,
+                    metavar="MB",
+                    help="Evict least recently used compiled programs beyond this total size (0 for no limit).")
+
 parser.add_argument("--reuse_datalog_bin",
                     action="store_true",
                     default=False,
@@ -160,6 +234,113 @@ parser.add_argument("-i",
                     default=False,
                     help="Run souffle in interpreted mode.")
 
+parser.add_argument("--engine",
+                    choices=ENGINES,
+                    default=None,
+                    help="How to run Souffle programs: compiled (the default), interpreted (same as -i), or "
+                         "auto: start interpreting immediately and switch each program to its compiled "
+                         "binary as soon as that has been compiled in the background.")
+
+parser.add_argument("--staged",
+                    action="store_true",
+                    default=False,
+                    help="Run the decompiler as two separately compiled stages. Transform stage outputs are "
+                         "cached by input, and a contract timing out in the global stage keeps them.")
+
+parser.add_argument("--selectors",
+                    default=None,
+                    metavar="LIST",
+                    help="Only decompile the public functions in the comma-separated LIST, given as selectors "
+                         "(0xa9059cbb), signatures (transfer(address,uint256)) or names (transfer). Requires the "
+                         "transactional-context, selective_Ncontext+ or full_Ncontext+ sensitivity.")
+
+parser.add_argument("--shard_public_functions",
+                    type=int,
+                    default=0,
+                    metavar="NUM",
+                    help="Decompile large contracts as up to NUM shards, each analyzing a subset of the "
+                         "public functions, in parallel, then merge their outputs.")
+
+parser.add_argument("--shard_min_size",
+                    type=int,
+                    default=8192,
+                    metavar="BYTES",
+                    help="Only shard contracts with at least this much bytecode.")
+
+parser.add_argument("--shard_validate",
+                    action="store_true",
+                    default=False,
+                    help="Also decompile sharded contracts as a whole and write the relations where the "
+                         f"merged outputs differ to {SHARD_VALIDATION_FILE}.")
+
+parser.add_argument("--predict_context_depth",
+                    action="store_true",
+                    default=False,
+                    help="Choose each contract's context depth from features of its code, instead of the "
+                         "decompiler's default. Ignored if MAX_CONTEXT_DEPTH is set with -M. Only the "
+                         "transactional-context sensitivity supports it.")
+
+parser.add_argument("--no_fast_path",
+                    action="store_true",
+                    default=False,
+                    help="Decompile contracts instantiating a known template (empty code, EIP-1167 proxies) "
+                         "like any other, instead of reusing the decompilation of the template.")
+
+parser.add_argument("--function_hashes",
+                    action="store_true",
+                    default=False,
+                    help=f"Write a location-independent hash of each decompiled function to {summaries.FUNCTION_HASH_FILE}.")
+
+parser.add_argument("--function_summaries",
+                    default=None,
+                    metavar="FILE",
+                    help="Share the SQLite store of per-function client results FILE with clients (through "
+                         f"{summaries.SUMMARY_STORE_ENV}), so that they can reuse results for functions seen "
+                         "in other contracts. Implies --function_hashes.")
+
+parser.add_argument("--scratch_dir",
+                    default=None,
+                    metavar="DIR",
+                    help="Run each contract in a scratch directory under DIR (e.g. the RAM-backed /dev/shm), "
+                         "then keep only the outputs selected by --persist in the working directory.")
+
+parser.add_argument("--persist",
+                    default=','.join(scratch.DEFAULT_PERSISTED),
+                    metavar="LIST",
+                    help="Comma-separated patterns of the output files kept when using --scratch_dir.")
+
+parser.add_argument("--persist_archive",
+                    action="store_true",
+                    default=False,
+                    help=f"With --scratch_dir, also keep all outputs of each contract, packed as {scratch.OUTPUT_ARCHIVE}.")
+
+parser.add_argument("--no_dasm",
+                    action="store_true",
+                    default=False,
+                    help="Do not write contract.dasm for each contract.")
+
+parser.add_argument("--manifest_counts",
+                    action="store_true",
+                    default=False,
+                    help="Record the number of tuples of every output relation in manifest.json, not only "
+                         "of the Analytics_* ones. Reads every output file.")
+
+parser.add_argument("--manifest_hashes",
+                    action="store_true",
+                    default=False,
+                    help="Also record an order-insensitive hash of each output relation in manifest.json.")
+
+parser.add_argument("--metrics_port",
+                    type=int,
+                    default=None,
+                    metavar="PORT",
+                    help="Serve live progress metrics in Prometheus text format on localhost:PORT/metrics.")
+
+parser.add_argument("--stats_file",
+                    default=None,
+                    metavar="FILE",
+                    help="Periodically rewrite live progress metrics to FILE (as JSON).")
+
 souffle_env = os.environ.copy()
 functor_path = join(GIGAHORSE_DIR, 'souffle-addon')
 souffle_env["LD_LIBRARY_PATH"] = functor_path
@@ -175,25 +356,68 @@ if not os.path.isfile(join(functor_path, 'libfunctors.so')):
 def get_working_dir(contract_name):
     return join(os.path.abspath(TEMP_WORKING_DIR), os.path.split(contract_name)[1].split('.')[0])
 
+def get_scratch_dir(contract_name):
+    return join(scratch_root, os.path.split(contract_name)[1].split('.')[0])
+
 def prepare_working_dir(contract_name) -> (str, str):
     newdir = get_working_dir(contract_name)
     out_dir = join(newdir, 'out')
 
     if os.path.isdir(newdir):
-        return True, newdir, out_dir
+        if not (args.rerun_clients and scratch.is_persisted(newdir)):
+            return True, newdir, out_dir
+        # clients need all of the decompiler's outputs, not only the persisted ones
+        shutil.rmtree(newdir)
+
+    if args.scratch_dir:
+        # the working directory is only created once the outputs to keep are persisted
+        newdir = get_scratch_dir(contract_name)
+        out_dir = join(newdir, 'out')
+        shutil.rmtree(newdir, ignore_errors=True)
 
     # recreate dir
     os.makedirs(newdir)
     os.makedirs(out_dir)
     return False, newdir, out_dir
 
+def souffle_command(spec, executable, fact_dir, out_dir, threads=1):
+    """
+    The command running a Souffle program, and the engine it uses: its compiled
+    binary, if that is ready, otherwise the interpreter.
+    """
+    jobs = ["--jobs={}".format(threads)] if threads > 1 else []
+    if args.engine != 'interpreted' and compiled_programs[executable].is_set():
+        return [join(os.getcwd(), executable),
+                "--facts={}".format(fact_dir),
+                "--output={}".format(out_dir)
+        ] + jobs, 'compiled'
+    return [args.souffle_bin,
+            "-M", souffle_macro_defs(),
+            spec,
+            "--fact-dir={}".format(fact_dir),
+            "--output-dir={}".format(out_dir)
+    ] + jobs, 'interpreted'
+
+def compile_and_signal(spec, executable, ready):
+    try:
+        compile_datalog(spec, executable)
+    except Exception as e:
+        log(f"Compiling {spec} failed: {e}")
+        if args.engine == 'auto':
+            log(f"{spec} will keep running interpreted.")
+        raise
+    ready.set()
+
+def souffle_macro_defs():
+    """The macro definitions passed to Souffle, whether it compiles or interprets a program."""
+    return f'GIGAHORSE_DIR={GIGAHORSE_DIR} BULK_ANALYSIS= {args.souffle_macros}'.strip()
+
+
 def compile_datalog(spec, executable):
     if args.reuse_datalog_bin and os.path.isfile(executable):
         return
 
-    pathlib.Path(DEFAULT_CACHE_DIR).mkdir(exist_ok=True)
-
-    souffle_macros = f'GIGAHORSE_DIR={GIGAHORSE_DIR} BULK_ANALYSIS= {args.souffle_macros}'.strip()
+    souffle_macros = souffle_macro_defs()
 
     cpp_macros = []
     for macro_def in souffle_macros.split(' '):
@@ -204,24 +428,139 @@ def compile_datalog(spec, executable):
     preproc_process = subprocess.run(preproc_command, universal_newlines=True, capture_output=True)
     assert not(preproc_process.returncode), f"Preprocessing for {spec} failed. Stopping."
 
-    hasher = hashlib.md5()
-    hasher.update(preproc_process.stdout.encode('utf-8'))
-    md5_hash = hasher.hexdigest()
+    cache = CompiledProgramCache(args.cache_dir, args.cache_max_size * 2**20)
+    key = cache.key(preproc_process.stdout, args.souffle_bin, join(functor_path, 'libfunctors.so'), souffle_macros)
 
-    cache_path = join(DEFAULT_CACHE_DIR, md5_hash)
-
-    if os.path.exists(cache_path):
-        log(f"Found cached executable for {spec}")
-    else:
+    def build(path):
         log(f"Compiling {spec} to C++ program and executable")
-        compilation_command = [args.souffle_bin, '-c', '-M', souffle_macros, '-o', cache_path, spec]
+        compilation_command = [args.souffle_bin, '-c', '-M', souffle_macros, '-o', path, spec]
         process = subprocess.run(compilation_command, universal_newlines=True, env = souffle_env)
         assert not(process.returncode), "Compilation failed. Stopping."
 
-    shutil.copy2(cache_path, executable)
-    
-    
-def analyze_contract(job_index: int, index: int, contract_filename: str, result_queue, timeout) -> None:
+    if cache.lookup(key) is not None:
+        log(f"Found cached executable for {spec}")
+    # A hard link, so that evicting the cache entry leaves the executable in place
+    cache.get_or_build(key, build, executable)
+    # The link does not tell which program it is, so caches of its outputs read the key instead
+    write_program_key(executable, key)
+
+
+def run_staged_decompiler(work_dir, out_dir, calc_timeout, engines, analytics, threads):
+    """
+    Runs the transform and global stages of the decompiler, reusing cached
+    transform stage outputs for identical inputs. If the transformation changed
+    nothing, the global stage reuses the transform stage's local analysis.
+    Returns the last stage that completed, or None if the first one timed out.
+    """
+    transform_args, engine = souffle_command(TRANSFORM_STAGE_DL, TRANSFORM_STAGE_EXECUTABLE, work_dir, out_dir, threads)
+    cache = None
+    if engine == 'compiled':
+        cache = StageCache(join(args.cache_dir, 'stages'))
+        key = cache.key(program_key(TRANSFORM_STAGE_EXECUTABLE), work_dir, TRANSFORM_INPUTS)
+    if cache is None or not cache.restore(key, out_dir):
+        engines.add(engine)
+        before = set(os.listdir(out_dir))
+        if run_process(transform_args, calc_timeout()) < 0:
+            return None
+        if cache is not None:
+            cache.store(key, out_dir, [f for f in os.listdir(out_dir) if f not in before])
+
+    with open(join(out_dir, 'TransformedStatement.csv')) as f:
+        transformed = sum(1 for _ in f)
+    analytics['transformed_statements'] = transformed
+
+    # The global stage reads both the original facts and the transform stage outputs
+    global_fact_dir = join(work_dir, 'global_facts')
+    os.makedirs(global_fact_dir, exist_ok=True)
+    for fact_dir in (work_dir, out_dir):
+        for entry in os.scandir(fact_dir):
+            link = join(global_fact_dir, entry.name)
+            if entry.is_file() and not os.path.lexists(link):
+                os.symlink(entry.path, link)
+
+    if transformed:
+        global_args, engine = souffle_command(GLOBAL_STAGE_DL, GLOBAL_STAGE_EXECUTABLE, global_fact_dir, out_dir, threads)
+    else:
+        global_args, engine = souffle_command(GLOBAL_UNTRANSFORMED_STAGE_DL, GLOBAL_UNTRANSFORMED_STAGE_EXECUTABLE, global_fact_dir, out_dir, threads)
+    engines.add(engine)
+    if run_process(global_args, calc_timeout()) < 0:
+        return 'transform'
+    return 'global'
+
+def run_sharded_decompiler(work_dir, out_dir, blocks, calc_timeout, engines, analytics, threads):
+    """
+    Runs the decompiler on shards of the contract's public functions in parallel,
+    as many at once as the job holds slots (threads), and merges their outputs
+    into out_dir. With --shard_validate, also runs the whole decompiler and
+    records the relations where the merged outputs differ.
+    Returns the time it took and -1 if it timed out.
+    """
+    shards = sharding.partition(sharding.dispatch_selectors(blocks), args.shard_public_functions)
+    analytics['shards'] = len(shards)
+    parallel = min(threads, len(shards))
+    shard_threads = max(1, threads // parallel)
+    shard_commands, shard_out_dirs = [], []
+    for i, shard in enumerate(shards):
+        shard_dir = join(work_dir, f'shard{i}')
+        shard_out_dir = join(shard_dir, 'out')
+        sharding.prepare_shard(work_dir, shard_dir, shard)
+        os.makedirs(shard_out_dir)
+        shard_args, engine = souffle_command(DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE, shard_dir, shard_out_dir, shard_threads)
+        engines.add(engine)
+        shard_commands.append(shard_args)
+        shard_out_dirs.append(shard_out_dir)
+    runtime = run_processes(shard_commands, calc_timeout(), parallel=parallel)
+    if runtime < 0:
+        return runtime
+    sharding.merge_outputs(shard_out_dirs, out_dir)
+
+    if args.shard_validate:
+        whole_out_dir = join(work_dir, 'unsharded_out')
+        os.makedirs(whole_out_dir)
+        analysis_args, engine = souffle_command(DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE, work_dir, whole_out_dir, threads)
+        engines.add(engine)
+        if run_process(analysis_args, calc_timeout()) < 0:
+            return -1
+        diff = sharding.diff_outputs(whole_out_dir, out_dir)
+        with open(join(out_dir, SHARD_VALIDATION_FILE), 'w') as f:
+            json.dump({name: {'missing': missing, 'extra': extra} for name, (missing, extra) in sorted(diff.items())}, f, indent=1)
+        analytics['shard_mismatched_relations'] = len(diff)
+        if diff:
+            log("{}: sharded decompilation differs in {} relations.".format(os.path.basename(work_dir), len(diff)))
+    return runtime
+
+def run_fast_path(match, work_dir, out_dir, calc_timeout, engines, analytics):
+    """
+    Writes the decompiler outputs of a contract instantiating a known template,
+    from the cached outputs for the template's canonical instance, decompiling
+    that first if it is not cached. Only used with the compiled decompiler, which
+    identifies the program, and not with --staged. Returns whether it succeeded.
+    """
+    template, canonical_bytecode, substitutions = match
+    if args.engine == 'interpreted' or not fastpath.available(compiled_programs, DEFAULT_SOUFFLE_EXECUTABLE):
+        return False
+    depth = analytics.get('context_depth')
+    key = fastpath.cache_key(template, program_key(DEFAULT_SOUFFLE_EXECUTABLE), depth)
+    cache = StageCache(join(args.cache_dir, 'fastpath'))
+    if not cache.restore(key, out_dir):
+        canonical_dir = join(work_dir, 'canonical')
+        canonical_out_dir = join(canonical_dir, 'out')
+        factgen.generate_facts(canonical_bytecode, canonical_dir, dasm=False)
+        os.makedirs(canonical_out_dir)
+        if depth is not None:
+            prescan.write_context_depth_hint(canonical_dir, depth)
+        analysis_args, engine = souffle_command(DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE, canonical_dir, canonical_out_dir)
+        engines.add(engine)
+        # Outputs of a failed run must not be cached for every later instance
+        if run_process(analysis_args, calc_timeout(), check=True) < 0:
+            return False
+        cache.store(key, canonical_out_dir, os.listdir(canonical_out_dir))
+        cache.restore(key, out_dir)
+    fastpath.instantiate(out_dir, substitutions)
+    return True
+
+def analyze_contract(job_index: int, index: int, contract_filename: str, result_queue, timeout, threads: int = 1,
+                     bytecode: str = None) -> None:
     """
     Perform dataflow analysis on a contract, storing the result in the queue.
     This is a worker function to be passed to a subprocess.
@@ -231,13 +570,18 @@ def analyze_contract(job_index: int, index: int, contract_filename: str, result_
         index: the number of the particular contract being analyzed
         contract_filename: the absolute path of the contract bytecode file to process
         result_queue: a multiprocessing queue in which to store the analysis results
+        threads: the number of threads to run Souffle programs with
+        bytecode: the contract's bytecode, for contracts read from archives
+          rather than from contract_filename (then only their name)
     """
 
+    work_dir = None
     try:
         # prepare working directory
         exists, work_dir, out_dir = prepare_working_dir(contract_filename)
         assert not(args.restart and exists)
         analytics = {}
+        engines = set()
         contract_name = os.path.split(contract_filename)[1]
         disassemble_start = time.time()
         def calc_timeout():
@@ -245,115 +589,121 @@ def analyze_contract(job_index: int, index: int, contract_filename: str, result_
         if exists:
             decomp_start = time.time()
         else:
-            with open(contract_filename) as file:
-                bytecode = file.read().strip()
+            profiler = StageProfiler()
+            if bytecode is None:
+                bytecode = factgen.read_bytecode(contract_filename, profiler)
 
             # Disassemble contract
-            blocks = blockparse.EVMBytecodeParser(bytecode).parse()
-            exporter.InstructionTsvExporter(blocks).export(output_dir=work_dir, bytecode_hex=bytecode)
+            blocks = factgen.generate_facts(bytecode, work_dir, profiler, dasm=not args.no_dasm)
+            if selected_functions:
+                sharding.write_selection(work_dir, selected_functions, [])
+            if args.predict_context_depth:
+                analytics['context_depth'] = prescan.context_depth(prescan.scan(blocks))
+                prescan.write_context_depth_hint(work_dir, analytics['context_depth'])
 
             os.symlink(join(work_dir, 'bytecode.hex'), join(out_dir, 'bytecode.hex'))
+            analytics.update(profiler.as_analytics())
             
             
             # Run souffle on those relations
             decomp_start = time.time()
 
-            if not args.interpreted:
-                analysis_args = [join(os.getcwd(), DEFAULT_SOUFFLE_EXECUTABLE),
-                             "--facts={}".format(work_dir),
-                             "--output={}".format(out_dir)
-                ]
+            match = None if args.no_fast_path else fastpath.recognize(bytecode)
+            if match is not None and run_fast_path(match, work_dir, out_dir, calc_timeout, engines, analytics):
+                analytics['fast_path'] = match[0]
+                runtime = 0
+            elif args.staged:
+                stage = run_staged_decompiler(work_dir, out_dir, calc_timeout, engines, analytics, threads)
+                if stage is not None:
+                    analytics['stage'] = stage
+                if stage == 'transform':
+                    # keep the results of the transform stage
+                    manifest = build_manifest(out_dir, hashes=args.manifest_hashes, counts=args.manifest_counts)
+                    write_manifest(out_dir, manifest)
+                    result_queue.put((contract_name, nonempty_relations(manifest), ["TIMEOUT"], {'stage': stage}))
+                    telemetry.record_outcome(job_index, 'timeout')
+                    log("{} timed out in the global stage.".format(contract_name))
+                    return
+                runtime = -1 if stage is None else 0
+            elif args.shard_public_functions > 1 and factgen.code_size(bytecode) >= args.shard_min_size:
+                runtime = run_sharded_decompiler(work_dir, out_dir, blocks, calc_timeout, engines, analytics, threads)
             else:
-                analysis_args = [DEFAULT_SOUFFLE_BIN,
-                             DEFAULT_DECOMPILER_DL,
-                             "--fact-dir={}".format(work_dir),
-                             "--output-dir={}".format(out_dir)
-                ]
-
-            runtime = run_process(analysis_args, calc_timeout())
+                analysis_args, engine = souffle_command(DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE, work_dir, out_dir, threads)
+                engines.add(engine)
+                runtime = run_process(analysis_args, calc_timeout())
             if runtime < 0:
                 result_queue.put((contract_filename, [], ["TIMEOUT"], {}))
+                telemetry.record_outcome(job_index, 'timeout')
                 log("{} timed out.".format(contract_filename))
                 return
+            if args.function_hashes:
+                summaries.write_function_hashes(out_dir, summaries.function_hashes(TACOutput(out_dir)))
             # end decompilation
         if exists and not args.rerun_clients:
             return
         client_start = time.time()
         for souffle_client in souffle_clients:
-            if not args.interpreted:
-                analysis_args = [join(os.getcwd(), souffle_client+'_compiled'),
-                             "--facts={}".format(out_dir),
-                             "--output={}".format(out_dir)
-                ]
-            else:
-                analysis_args = [DEFAULT_SOUFFLE_BIN,
-                             join(os.getcwd(), souffle_client),
-                             "--fact-dir={}".format(out_dir),
-                             "--output-dir={}".format(out_dir)
-                ]
+            analysis_args, engine = souffle_command(join(os.getcwd(), souffle_client), souffle_client+'_compiled', out_dir, out_dir, threads)
+            engines.add(engine)
             runtime = run_process(analysis_args, calc_timeout())
             if runtime < 0:
                 result_queue.put((contract_name, [], ["TIMEOUT"], {}))
+                telemetry.record_outcome(job_index, 'timeout')
                 log("{} timed out.".format(contract_name))
                 return
         for python_client in python_clients:
             out_filename = join(out_dir, python_client.split('/')[-1]+'.out')
             err_filename = join(out_dir, python_client.split('/')[-1]+'.err')
-            runtime = run_process([join(os.getcwd(), python_client)], calc_timeout(), open(out_filename, 'w'), open(err_filename, 'w'), cwd = out_dir)
+            if python_client in plugin_clients:
+                with open(out_filename, 'w') as out, open(err_filename, 'w') as err:
+                    runtime = plugins.run_plugin(plugin_clients[python_client], out_dir, calc_timeout(), out, err)
+            else:
+                runtime = run_process([join(os.getcwd(), python_client)], calc_timeout(), open(out_filename, 'w'), open(err_filename, 'w'), cwd = out_dir)
             if runtime < 0:
                 result_queue.put((contract_name, [], ["TIMEOUT"], {}))
+                telemetry.record_outcome(job_index, 'timeout')
                 log("{} timed out.".format(contract_name))
                 return
             
         # Collect the results and put them in the result queue
-        files = []
-        for fname in os.listdir(out_dir):
-            fpath = join(out_dir, fname)
-            if getsize(fpath) != 0:
-                files.append(fname.split(".")[0])
+        manifest = build_manifest(out_dir, hashes=args.manifest_hashes, counts=args.manifest_counts)
+        write_manifest(out_dir, manifest)
+        files = nonempty_relations(manifest)
         meta = []
         # Decompile + Analysis time
         analytics['disassemble_time'] = decomp_start - disassemble_start
         analytics['decomp_time'] = client_start - decomp_start
         analytics['client_time'] = time.time() - client_start
+        if engines:
+            analytics['engine'] = engines.pop() if len(engines) == 1 else 'mixed'
         log("{}: {:.36} completed in {:.2f} + {:.2f} + {:.2f} secs".format(
             index, contract_name, analytics['disassemble_time'],
             analytics['decomp_time'], analytics['client_time']
         ))
 
-        get_gigahorse_analytics(out_dir, analytics)
+        analytics.update(manifest_analytics(out_dir, manifest))
 
         result_queue.put((contract_name, files, meta, analytics))
+        for stage in ('disassemble', 'decomp', 'client'):
+            telemetry.record_stage(job_index, stage, analytics[stage + '_time'])
+        telemetry.record_outcome(job_index, 'completed')
 
     except Exception as e:
         log("Error: {}".format(e))
         result_queue.put((contract_name, [], ["error"], {}))
+        telemetry.record_outcome(job_index, 'failed')
 
+    finally:
+        if args.scratch_dir and work_dir is not None and not exists:
+            scratch.persist(work_dir, get_working_dir(contract_filename), persisted, args.persist_archive)
 
-def get_gigahorse_analytics(out_dir, analytics):
-    for fname in os.listdir(out_dir):
-        fpath = join(out_dir, fname)
-        if not fname.startswith('Analytics_'):
-            continue
-        stat_name = fname.split(".")[0]
-        analytics[stat_name] = sum(1 for line in open(join(out_dir, fname)))
-
-    for desc_fname in os.listdir(out_dir):
-        if desc_fname.startswith('VulnerabilityDescription_'):
-            fname = desc_fname[25:]
-            stat_name = fname.split(".")[0]
-            fpath = join(out_dir, fname)
-            if os.path.exists(fpath):
-                analytics[stat_name] = open(fpath).read()
-            else:
-                analytics[stat_name] = ''
 
-def run_process(args, timeout: int, stdout = devnull, stderr = devnull, cwd = '.') -> float:
+def run_process(args, timeout: int, stdout = devnull, stderr = devnull, cwd = '.', check = False) -> float:
     ''' Runs process described by args, for a specific time period
     as specified by the timeout.
 
     Returns the time it took to run the process and -1 if the process
-    times out
+    times out, or with check, if it exits with an error
     '''
     if timeout < 0:
         return -1
@@ -367,6 +717,36 @@ def run_process(args, timeout: int, stdout = devnull, stderr = devnull, cwd = '.
             os.kill(p.pid, signal.SIGTERM)
             return -1
         time.sleep(0.01)
+    if check and p.returncode != 0:
+        return -1
+    return elapsed_time
+
+def run_processes(args_list, timeout: int, cwd = '.', parallel = 0) -> float:
+    ''' Runs the processes described by args_list in parallel, at most
+    parallel of them at once (all of them, if 0), for a specific time
+    period as specified by the timeout.
+
+    Returns the time it took for all of them to finish and -1 if they
+    time out
+    '''
+    if timeout < 0:
+        return -1
+    start_time = time.time()
+    pending = list(args_list)
+    parallel = parallel or len(pending)
+    running = []
+    while True:
+        running = [p for p in running if p.poll() is None]
+        while pending and len(running) < parallel:
+            running.append(subprocess.Popen(pending.pop(0), stdout = devnull, stderr = devnull, cwd = cwd, env = souffle_env))
+        elapsed_time = time.time() - start_time
+        if not running:
+            break
+        if elapsed_time >= timeout:
+            for p in running:
+                os.kill(p.pid, signal.SIGTERM)
+            return -1
+        time.sleep(0.01)
     return elapsed_time
 
 def flush_queue(run_sig, result_queue, result_list):
@@ -387,6 +767,44 @@ def flush_queue(run_sig, result_queue, result_list):
 
 # Main Body
 args = parser.parse_args()
+if args.engine is None:
+    args.engine = 'interpreted' if args.interpreted else 'compiled'
+if args.staged and args.shard_public_functions:
+    parser.error("--shard_public_functions cannot be combined with --staged")
+if args.selectors and args.shard_public_functions:
+    parser.error("--shard_public_functions cannot be combined with --selectors")
+context_sensitivity = sharding.context_sensitivity(args.souffle_macros)
+if args.predict_context_depth and context_sensitivity != sharding.DEFAULT_CONTEXT_SENSITIVITY:
+    # the other context sensitivities choose their own depth, ignoring ContextDepthHint
+    parser.error("--predict_context_depth requires the transactional-context sensitivity")
+if args.shard_public_functions > 1 and context_sensitivity not in sharding.SELECTION_CONTEXT_SENSITIVITIES:
+    # the others analyze every public function, so every shard would decompile the whole contract
+    parser.error("--shard_public_functions requires one of the {} sensitivities".format(
+        ', '.join(sharding.SELECTION_CONTEXT_SENSITIVITIES)))
+if args.selectors and context_sensitivity not in sharding.SELECTION_CONTEXT_SENSITIVITIES:
+    # the others ignore SelectedPublicFunction, decompiling the whole contract
+    parser.error("--selectors requires one of the {} sensitivities".format(
+        ', '.join(sharding.SELECTION_CONTEXT_SENSITIVITIES)))
+
+selected_functions = []
+if args.selectors:
+    try:
+        selected_functions = sharding.resolve_selectors(args.selectors.split(','), public_function_signature_filename)
+    except ValueError as e:
+        parser.error(str(e))
+
+scratch_root = None
+persisted = args.persist.split(',')
+if args.scratch_dir:
+    # one directory per run, so that concurrent runs sharing DIR do not clash
+    scratch_root = join(abspath(args.scratch_dir), 'gigahorse-{}'.format(os.getpid()))
+    os.makedirs(scratch_root)
+
+if args.function_summaries:
+    args.function_hashes = True
+    souffle_env[summaries.SUMMARY_STORE_ENV] = abspath(args.function_summaries)
+    # Create the store before the workers, which then only open it
+    summaries.FunctionSummaryStore(args.function_summaries).close()
 
 log_level = logging.WARNING if args.quiet else logging.INFO + 1
 log = lambda msg: logging.log(logging.INFO + 1, msg)
@@ -394,18 +812,37 @@ logging.basicConfig(format='%(message)s', level=log_level)
 
 # Here we compile the decompiler and any of its clients in parallel :)
 compile_processes_args = []
-compile_processes_args.append((DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE))
+if args.staged:
+    compile_processes_args.append((TRANSFORM_STAGE_DL, TRANSFORM_STAGE_EXECUTABLE))
+    compile_processes_args.append((GLOBAL_STAGE_DL, GLOBAL_STAGE_EXECUTABLE))
+    compile_processes_args.append((GLOBAL_UNTRANSFORMED_STAGE_DL, GLOBAL_UNTRANSFORMED_STAGE_EXECUTABLE))
+else:
+    compile_processes_args.append((DEFAULT_DECOMPILER_DL, DEFAULT_SOUFFLE_EXECUTABLE))
 
 souffle_clients = [a for a in args.client.split(',') if a.endswith('.dl')]
 python_clients = [a for a in args.client.split(',') if a.endswith('.py')]
 
-if not args.interpreted:
-    for c in souffle_clients:
-        compile_processes_args.append((c, c+'_compiled'))
+# Clients opting in as plugins are imported once, here, and shared by the
+# workers forked from this process; other Python clients run as scripts
+plugin_clients = {}
+if not args.no_plugins:
+    for c in python_clients:
+        if plugins.is_plugin(c):
+            try:
+                plugin_clients[c] = plugins.load_plugin(c)
+            except Exception as e:
+                log("Running {} as a script, as it cannot be imported: {}".format(c, e))
+
+for c in souffle_clients:
+    compile_processes_args.append((c, c+'_compiled'))
 
-    running_processes = []
-    for compile_args in compile_processes_args:
-        proc = Process(target = compile_datalog, args=compile_args)
+# Set once each program's compiled binary can be used, shared with the workers
+compiled_programs = {executable: Event() for _, executable in compile_processes_args}
+
+running_processes = []
+if args.engine != 'interpreted':
+    for spec, executable in compile_processes_args:
+        proc = Process(target = compile_and_signal, args=(spec, executable, compiled_programs[executable]))
         proc.start()
         running_processes.append(proc)
 
@@ -413,37 +850,28 @@ if args.restart:
     log("Removing working directory {}".format(TEMP_WORKING_DIR))
     shutil.rmtree(TEMP_WORKING_DIR, ignore_errors = True)    
     
-if not args.interpreted:
+if args.engine == 'compiled':
     for p in running_processes:
         p.join()
 
     # check all programs have been compiled
-    for _, v in compile_processes_args:
-        open(v, 'r') # check program exists
-
-# Extract contract filenames.
-log("Processing contract names.")
+    for spec, v in compile_processes_args:
+        if not compiled_programs[v].is_set():
+            raise Exception(f"Compilation of {spec} failed. Stopping.")
 
-contracts = []
+# Find contract filenames lazily, so that analysis starts with the first one found.
+if args.contract_list and os.path.isfile(args.contract_list):
+    log("Reading contract names from {}.".format(args.contract_list))
+    contracts = discovery.read_contract_list(args.contract_list)
+else:
+    if args.engine == 'interpreted' and any(os.path.isdir(filepath) for filepath in args.filepath):
+        log("[WARNING]: Running batch analysis in interpreted mode.")
+    contracts = discovery.discover_contracts(args.filepath, args.filename_pattern)
+    if args.contract_list:
+        contracts = discovery.record_contract_list(contracts, args.contract_list)
 
-# Filter according to the given pattern.
-re_string = args.filename_pattern
-if not re_string.endswith("$"):
-    re_string = re_string + "$"
-pattern = re.compile(re_string)
-
-
-for filepath in args.filepath:
-    if os.path.isdir(filepath):
-        if args.interpreted:
-            log("[WARNING]: Running batch analysis in interpreted mode.")
-        unfiltered = [join(filepath, f) for f in os.listdir(filepath)]
-    else:
-        unfiltered = [filepath]
-        
-    contracts += [u for u in unfiltered if pattern.match(u) is not None]
-
-contracts = contracts[args.skip:]
+contracts = discovery.contract_inputs(contracts, args.filename_pattern, args.name_field, args.bytecode_field)
+contracts = discovery.Lookahead(itertools.islice(contracts, args.skip, None))
 
 
 log("Setting up workers.")
@@ -463,6 +891,15 @@ run_signal.set()
 flush_proc = Process(target=flush_queue, args=(run_signal, res_queue, res_list))
 flush_proc.start()
 
+# Live progress counters, shared with (and updated by) the workers
+telemetry = BatchTelemetry(args.jobs)
+# The total is only known once all contracts have been found
+telemetry.total = None
+if args.metrics_port is not None:
+    telemetry.start_http_server(args.metrics_port)
+if args.stats_file:
+    telemetry.start_stats_file_writer(args.stats_file)
+
 workers = []
 avail_jobs = list(range(args.jobs))
 contract_iter = enumerate(contracts)
@@ -474,23 +911,45 @@ try:
         # If there's both workers and contracts available, use the former to work on the latter.
         while not contracts_exhausted and len(avail_jobs) > 0:
             try:
-                index, contract_name = next(contract_iter)
+                index, (name, path, bytecode) = next(contract_iter)
+                # Contracts read from archives are only named, and their bytecode passed in memory
+                contract_name = path or name
                 working_dir = get_working_dir(contract_name)
                 if os.path.isdir(working_dir) and not args.rerun_clients:
-                    # no need to create another process
+                    # no need to create another process, nor to count it: it will record no outcome
                     continue
-
-                # reduce number of available jobs
-                job_index = avail_jobs.pop()
-                proc = Process(target=analyze_contract, args=(job_index, index, contract_name, res_queue, args.timeout_secs))
+                telemetry.dispatched += 1
+
+                threads = 1
+                if args.thread_budget or args.shard_public_functions > 1:
+                    # Predicted from the size of the hex, so that the dispatcher never reads bytecode
+                    try:
+                        code_size = os.path.getsize(path) // 2 if bytecode is None else factgen.code_size(bytecode)
+                    except OSError:
+                        code_size = 0
+                    if args.thread_budget:
+                        threads = allocate_threads(predict_jumpdests(code_size), len(avail_jobs),
+                                                   1 + contracts.remaining(len(avail_jobs)))
+                    if args.shard_public_functions > 1 and code_size >= args.shard_min_size:
+                        # a slot for each shard run at once
+                        threads = max(threads, min(args.shard_public_functions, len(avail_jobs)))
+
+                # reduce number of available jobs, by one per thread
+                slots = [avail_jobs.pop() for _ in range(threads)]
+                job_index = slots[0]
+                proc = Process(target=analyze_contract, args=(job_index, index, contract_name, res_queue, args.timeout_secs, threads, bytecode))
                 proc.start()
                 start_time = time.time()
                 workers.append({"name": contract_name,
                                 "proc": proc,
                                 "time": start_time,
-                                "job_index": job_index})
+                                "job_index": job_index,
+                                "slots": slots,
+                                "outcomes": telemetry.outcomes(job_index)})
+                telemetry.running = len(workers)
             except StopIteration:
                 contracts_exhausted = True
+                telemetry.total = telemetry.dispatched
 
         # Loop until some process terminates (to retask it) or,
         # if there are no unanalyzed contracts left, until currently-running contracts are done
@@ -501,34 +960,54 @@ try:
                 proc = workers[i]["proc"]
                 name = workers[i]["name"]
                 job_index = workers[i]["job_index"]
+                slots = workers[i]["slots"]
 
                 if time.time() - start_time > (args.timeout_secs + 1):
-                    res_queue.put((name, [], ["TIMEOUT"], {}))
                     proc.terminate()
-                    log("{} timed out.".format(name))
+                    proc.join()
+                    # the worker may have finished, and reported its outcome, just before being terminated
+                    if telemetry.outcomes(job_index) == workers[i]["outcomes"]:
+                        res_queue.put((name, [], ["TIMEOUT"], {}))
+                        telemetry.record_outcome(job_index, 'timeout')
+                        log("{} timed out.".format(name))
+                    if args.scratch_dir and os.path.isdir(get_scratch_dir(name)):
+                        # the worker was terminated before persisting its outputs, or while removing its scratch dir
+                        if scratch.is_persisted(get_working_dir(name)):
+                            shutil.rmtree(get_scratch_dir(name), ignore_errors=True)
+                        else:
+                            scratch.persist(get_scratch_dir(name), get_working_dir(name), persisted, args.persist_archive)
                     to_remove.append(i)
-                    avail_jobs.append(job_index)
+                    avail_jobs.extend(slots)
                 elif not proc.is_alive():
                     to_remove.append(i)
                     proc.join()
-                    avail_jobs.append(job_index)
+                    avail_jobs.extend(slots)
 
             # Reverse index order so as to pop elements correctly
             for i in reversed(to_remove):
                 workers.pop(i)
+            telemetry.running = len(workers)
 
             time.sleep(0.01)
 
+    if args.engine == 'auto' and any(p.is_alive() for p in running_processes):
+        log("Waiting for background compilation to finish, for use by later runs.")
+    for p in running_processes:
+        p.join()
+
     # Conclude and write results to file.
     run_signal.clear()
     flush_proc.join(1)
     # it's important to count the total after proc.join
     total = len(res_list)
     log(f"\nFinished {total} contracts...\n")
+    if args.stats_file:
+        telemetry.write_stats_file(args.stats_file)
 
     vulnerability_counts = defaultdict(int)
     analytics_sums = defaultdict(int)
     meta_counts = defaultdict(int)
+    info_counts = defaultdict(int)
     all_files = set()
     for contract, files, meta, analytics in res_list:
         for f in files:
@@ -536,7 +1015,10 @@ try:
         for m in meta:
             meta_counts[m] += 1
         for k, a in analytics.items():
-            if isinstance(a, int):
+            if k in INFO_ANALYTICS:
+                info_counts[(k, a)] += 1
+                continue
+            if isinstance(a, (int, float)):
                 analytics_sums[k] += a
             if isinstance(a, str):
                 # whether it's flagged or not
@@ -551,7 +1033,7 @@ try:
         log('Analytics')
         log('-'*80)
         for res, sums in analytics_sums_sorted:
-            log("  {}: {}".format(res, sums))
+            log("  {}: {}".format(res, sums if isinstance(sums, int) else "{:.2f}".format(sums)))
         log('\n')
         
     vulnerability_counts_sorted = sorted(list(vulnerability_counts.items()), key = lambda a: a[0])
@@ -563,6 +1045,13 @@ try:
         for res, count in vulnerability_counts_sorted:
             log("  {}: {:.2f}%".format(res, 100 * count / total))
 
+    if info_counts:
+        log('-'*80)
+        log('Engines, stages reached, context depths and fast paths')
+        log('-'*80)
+        for (k, a), v in sorted(info_counts.items()):
+            log(f"  {k} {a}: {v} of {total} contracts")
+
     if meta_counts:
         log('-'*80)
         log('Timeouts and Errors')
@@ -580,3 +1069,7 @@ except Exception as e:
 
     traceback.print_exc()
     flush_proc.terminate()
+
+finally:
+    if scratch_root is not None:
+        shutil.rmtree(scratch_root, ignore_errors=True)
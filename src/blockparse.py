@@ -35,6 +35,7 @@ import typing as t
 
 import src.basicblock as basicblock
 import src.opcodes as opcodes
+from src.profiling import StageProfiler, NULL_PROFILER
 
 STRICT = False
 ENDIANNESS = "big"
@@ -64,9 +65,13 @@ class BlockParser(abc.ABC):
         """
 
     @abc.abstractmethod
-    def parse(self) -> t.Iterable[basicblock.EVMBasicBlock]:
+    def parse(self, profiler: StageProfiler = NULL_PROFILER) -> t.Iterable[basicblock.EVMBasicBlock]:
         """
         Parses the raw input object and returns an iterable of BasicBlocks.
+
+        Args:
+          profiler: records the time spent parsing ops ("parse") and building
+            blocks ("blocks"), and the number of ops and blocks produced.
         """
         self._ops = []
         return self._ops
@@ -84,14 +89,18 @@ class EVMDasmParser(BlockParser):
         """
         super().__init__(dasm)
 
-    def parse(self):
+    def parse(self, profiler: StageProfiler = NULL_PROFILER):
         """
         Parses the raw input object containing EVM disassembly
         and returns an iterable of EVMBasicBlocks.
         """
 
         super().parse()
+        with profiler.stage('parse'):
+            self.__parse_ops()
+        return build_blocks(self._ops, profiler)
 
+    def __parse_ops(self):
         # Construct a list of EVMOp objects from the raw input disassembly
         # lines, ignoring the first line of input (which is the bytecode's hex
         # representation when using Ethereum's disasm tool). Any line which does
@@ -116,8 +125,6 @@ class EVMDasmParser(BlockParser):
                 if STRICT:
                     raise e
 
-        return basicblock.blocks_from_ops(self._ops)
-
     @staticmethod
     def evm_op_from_dasm(line: str) -> basicblock.EVMOp:
         """
@@ -177,14 +184,21 @@ class EVMBytecodeParser(BlockParser):
     def __has_more_bytes(self):
         return self.__pc < len(self._raw)
 
-    def parse(self) -> t.Iterable[basicblock.EVMBasicBlock]:
+    def parse(self, profiler: StageProfiler = NULL_PROFILER) -> t.Iterable[basicblock.EVMBasicBlock]:
         """
         Parses the raw input object containing EVM bytecode
         and returns an iterable of EVMBasicBlocks.
         """
 
         super().parse()
+        profiler.count('bytes', len(self._raw))
+        with profiler.stage('parse'):
+            self.__parse_ops()
 
+        # build basic blocks from the sequence of opcodes
+        return build_blocks(self._ops, profiler)
+
+    def __parse_ops(self):
         while self.__has_more_bytes():
             pc = self.__pc
             byte = int.from_bytes(self.__consume(1), ENDIANNESS)
@@ -214,5 +228,11 @@ class EVMBytecodeParser(BlockParser):
 
             self._ops.append(basicblock.EVMOp(pc, op, const))
 
-        # build basic blocks from the sequence of opcodes
-        return basicblock.blocks_from_ops(self._ops)
+
+def build_blocks(ops: t.List[basicblock.EVMOp], profiler: StageProfiler = NULL_PROFILER) -> t.Iterable[basicblock.EVMBasicBlock]:
+    """Builds basic blocks from parsed ops, recording the time taken and object counts."""
+    profiler.count('ops', len(ops))
+    with profiler.stage('blocks'):
+        blocks = basicblock.blocks_from_ops(ops)
+    profiler.count('blocks', len(blocks))
+    return blocks
@@ -0,0 +1,223 @@
+"""cache.py: A cache of compiled Souffle programs, safe to share between concurrent runs and checkouts"""
+
+import fcntl
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import typing as t
+from contextlib import contextmanager
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's contents, or '' if it does not exist."""
+    hasher = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(chunk)
+    except FileNotFoundError:
+        return ''
+    return hasher.hexdigest()
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    """
+    Replaces destination atomically with a hard link to source, or a copy
+    of it across filesystems. Unlike a symbolic link, the result stays
+    valid if source is later removed, e.g. evicted from a cache.
+    """
+    tmp = '{}.{}.tmp'.format(destination, os.getpid())
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copy2(source, tmp)
+    os.replace(tmp, destination)
+
+
+PROGRAM_KEY_SUFFIX = '.key'
+"""Suffix of the file, next to an executable linked from the cache, holding the key it was compiled for."""
+
+
+def write_program_key(executable: str, key: str) -> None:
+    """Records next to executable the cache key of the program it was compiled from."""
+    path = executable + PROGRAM_KEY_SUFFIX
+    with open(path + '.tmp', 'w') as f:
+        f.write(key + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def program_key(executable: str) -> str:
+    """
+    The identity of the program compiled to executable, for caches of its
+    outputs: the cache key it was compiled for or, for an executable not
+    compiled through the cache, a digest of the executable itself.
+    """
+    try:
+        with open(executable + PROGRAM_KEY_SUFFIX) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return file_digest(executable)
+
+
+def souffle_version(souffle_bin: str) -> str:
+    """The version banner printed by souffle_bin, or '' if it cannot be run."""
+    try:
+        process = subprocess.run([souffle_bin, '--version'], universal_newlines=True, capture_output=True)
+    except OSError:
+        return ''
+    return process.stdout.strip()
+
+
+class CompiledProgramCache:
+    """
+    Compiled programs keyed by everything that affects the binary: the
+    preprocessed program, the Souffle version, the functor library, macros
+    and C++ compiler settings.
+
+    Entries are published atomically (built under a temporary name, then
+    renamed), and a per-key lock ensures that concurrent runs sharing the
+    cache directory compile each program once. When max_size is set,
+    least recently used entries are evicted after each publish, unless
+    another run holds their lock.
+
+    Souffle leaves the generated C++ source next to each binary; it is
+    kept with the binary, counted towards its size and evicted with it.
+
+    Usage:
+      cache = CompiledProgramCache(cache_dir)
+      key = cache.key(preprocessed, souffle_bin, functors_path, macros)
+      binary = cache.get_or_build(key, lambda path: compile_to(path))
+    """
+
+    BYPRODUCTS = ('.cpp',)
+    """Suffixes of the files Souffle writes next to a binary when compiling it."""
+
+    def __init__(self, cache_dir: str, max_size: int = 0):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        """Maximum total size of the cache in bytes; 0 for unlimited."""
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, preprocessed: str, souffle_bin: str, functors_path: str, macros: str) -> str:
+        hasher = hashlib.sha256()
+        for part in (
+            preprocessed,
+            souffle_version(souffle_bin),
+            file_digest(functors_path),
+            macros,
+            os.environ.get('CXX', ''),
+            os.environ.get('CXXFLAGS', ''),
+            platform.machine(),
+        ):
+            hasher.update(part.encode('utf-8'))
+            hasher.update(b'\0')
+        return hasher.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str) -> t.Optional[str]:
+        """The cached binary for key, marking it as recently used, or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @contextmanager
+    def _locked(self, key: str, blocking: bool = True):
+        """
+        Holds the lock of key, raising BlockingIOError if it is held elsewhere
+        and not blocking. Lock files are removed with their evicted entries.
+        """
+        lock_path = self.path(key) + '.lock'
+        while True:
+            lock = open(lock_path, 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                lock.close()
+                raise
+            # the lock file may have been removed, with its entry, while we waited for it
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock.close()
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def get_or_build(self, key: str, build: t.Callable[[str], None], destination: t.Optional[str] = None) -> str:
+        """
+        Returns the cached binary for key, calling build(path) to create it
+        at a temporary path first if it is not cached. The binary is linked
+        to destination, if given, while the key's lock keeps concurrent runs
+        from evicting it.
+        """
+        with self._locked(key):
+            if self.lookup(key) is None:
+                tmp_path = '{}.{}.tmp'.format(self.path(key), os.getpid())
+                try:
+                    build(tmp_path)
+                    for suffix in self.BYPRODUCTS:
+                        if os.path.exists(tmp_path + suffix):
+                            os.replace(tmp_path + suffix, self.path(key) + suffix)
+                    os.replace(tmp_path, self.path(key))
+                finally:
+                    for path in [tmp_path] + [tmp_path + suffix for suffix in self.BYPRODUCTS]:
+                        if os.path.exists(path):
+                            os.remove(path)
+            if destination is not None:
+                link_or_copy(self.path(key), destination)
+        self.evict(keep=key)
+        return self.path(key)
+
+    def entries(self) -> t.List[os.DirEntry]:
+        """The cached binaries, without their byproducts, locks or unpublished builds."""
+        return [
+            entry for entry in os.scandir(self.cache_dir)
+            if entry.is_file() and '.' not in entry.name
+        ]
+
+    def size(self, key: str) -> int:
+        """The size in bytes of the cached binary for key and its byproducts."""
+        size = 0
+        for suffix in ('',) + self.BYPRODUCTS:
+            try:
+                size += os.stat(self.path(key) + suffix).st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def evict(self, keep: t.Optional[str] = None) -> t.List[str]:
+        """Removes least recently used entries until the cache fits in max_size. Returns the removed keys."""
+        if not self.max_size:
+            return []
+        entries = sorted(self.entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(self.size(e.name) for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            if entry.name == keep:
+                continue
+            try:
+                with self._locked(entry.name, blocking=False):
+                    size = self.size(entry.name)
+                    for suffix in ('',) + self.BYPRODUCTS:
+                        if os.path.exists(entry.path + suffix):
+                            os.remove(entry.path + suffix)
+                    os.remove(entry.path + '.lock')
+            except BlockingIOError:
+                # being built or linked by another run
+                continue
+            total -= size
+            removed.append(entry.name)
+        return removed
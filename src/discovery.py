@@ -0,0 +1,100 @@
+"""discovery.py: Lazily finding the contract files of a batch, so that analysis starts with the first one found"""
+
+import collections
+import os
+import re
+import typing as t
+
+import src.factgen as factgen
+
+
+def walk_contracts(path: str, pattern: t.Pattern) -> t.Iterator[str]:
+    """
+    The files under path (itself, if it is a file) whose paths match pattern,
+    searching directories recursively as they are read. Symbolic links to
+    directories are not followed. Archives given as path are always used.
+    """
+    if not os.path.isdir(path):
+        if pattern.match(path) is not None or factgen.is_archive(path):
+            yield path
+        return
+    directories = [path]
+    while directories:
+        directory = directories.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif pattern.match(entry.path) is not None:
+                    yield entry.path
+
+
+def discover_contracts(paths: t.Iterable[str], filename_pattern: str) -> t.Iterator[str]:
+    """The contract files under each of paths with filenames matching filename_pattern."""
+    if not filename_pattern.endswith("$"):
+        filename_pattern = filename_pattern + "$"
+    pattern = re.compile(filename_pattern)
+    for path in paths:
+        yield from walk_contracts(path, pattern)
+
+
+def read_contract_list(list_file: str) -> t.Iterator[str]:
+    """The contract paths in list_file, one per line."""
+    with open(list_file) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def record_contract_list(contracts: t.Iterable[str], list_file: str) -> t.Iterator[str]:
+    """
+    Passes contracts through, writing them to list_file for later runs to
+    read instead of searching again. The list is only published once all
+    contracts have been seen, so an interrupted search leaves no list behind.
+    """
+    tmp = list_file + '.tmp'
+    with open(tmp, 'w') as f:
+        for contract in contracts:
+            f.write(contract + '\n')
+            yield contract
+    os.replace(tmp, list_file)
+
+
+def contract_inputs(sources: t.Iterable[str], pattern: str = factgen.DEFAULT_PATTERN,
+                    name_field: str = factgen.DEFAULT_NAME_FIELD,
+                    bytecode_field: str = factgen.DEFAULT_BYTECODE_FIELD) -> t.Iterator[factgen.ContractInput]:
+    """The contracts in sources: bytecode files, or archives whose contracts are streamed in memory."""
+    for source in sources:
+        if factgen.is_archive(source):
+            yield from factgen.archive_inputs(source, pattern, name_field, bytecode_field)
+        else:
+            yield factgen.contract_name(source), source, None
+
+
+class Lookahead:
+    """
+    An iterator that can tell whether few items are left, by reading at most
+    a given number of items ahead of the ones consumed.
+    """
+
+    def __init__(self, iterable: t.Iterable[t.Any]):
+        self._iterator = iter(iterable)
+        self._buffer: t.Deque[t.Any] = collections.deque()
+
+    def __iter__(self) -> 'Lookahead':
+        return self
+
+    def __next__(self) -> t.Any:
+        if self._buffer:
+            return self._buffer.popleft()
+        return next(self._iterator)
+
+    def remaining(self, limit: int) -> int:
+        """The number of items left, if fewer than limit, and limit otherwise."""
+        while len(self._buffer) < limit:
+            try:
+                self._buffer.append(next(self._iterator))
+            except StopIteration:
+                break
+        return min(len(self._buffer), limit)
@@ -1,11 +1,11 @@
 """exporter.py: abstract classes for exporting facts"""
 
 import abc
-import csv
 import logging
 import os
 from collections import defaultdict
 import src.opcodes as opcodes
+from src.profiling import StageProfiler, NULL_PROFILER
 from src.common import public_function_signature_filename, event_signature_filename
 
 
@@ -59,15 +59,40 @@ def generate_interface():
         f.write('\n')
     f.close()
 
+DASM_ROW_FORMAT = "{:>7}: {:<10}"
+
+
+def disassembly_row(stmt, op, push_value = None):
+    row = DASM_ROW_FORMAT.format(stmt, op)
+    if push_value is not None:
+        row += push_value
+    return row
+
+
 def get_disassembly(statement_opcode, push_value):
-    output = []
-    row_format ="{:>7}: {:<10}"
-    for s, op in statement_opcode:
-        row = row_format.format(s, op)
-        if s in push_value:
-            row += push_value[s]
-        output.append(row)
-    return '\n'.join(output)            
+    return '\n'.join(disassembly_row(s, op, push_value.get(s)) for s, op in statement_opcode)
+
+
+def write_disassembly(facts_dir):
+    """
+    Writes contract.dasm from the Statement_Opcode and PushValue facts in facts_dir,
+    for contracts whose facts were exported without it. Both fact files are in
+    statement order, so they are merged in a single streaming pass.
+    """
+    def read_facts(filename):
+        with open(os.path.join(facts_dir, filename)) as f:
+            for line in f:
+                yield line.rstrip('\n').split('\t')
+
+    push_values = read_facts('PushValue.facts')
+    next_push = next(push_values, None)
+    with open(os.path.join(facts_dir, 'contract.dasm'), 'w') as f:
+        for i, (stmt, op) in enumerate(read_facts('Statement_Opcode.facts')):
+            value = None
+            if next_push is not None and next_push[0] == stmt:
+                value = next_push[1]
+                next_push = next(push_values, None)
+            f.write(('\n' if i else '') + disassembly_row(stmt, op, value))
 
 
 class Exporter(abc.ABC):
@@ -111,10 +136,25 @@ class InstructionTsvExporter(Exporter):
         """
         self.blocks.append((block.entry, str(block)))
     
-    def export(self, output_dir = "", bytecode_hex = None):
+    def export(self, output_dir = "", bytecode_hex = None, profiler: StageProfiler = NULL_PROFILER, dasm: bool = True):
         """
         Print basic block info to tsv.
+
+        Args:
+          profiler: records the time spent linking signature files ("links"),
+            writing facts ("facts") and rendering the disassembly ("dasm").
+          dasm: whether to also write contract.dasm. It can be produced later
+            from the facts with write_disassembly (generatefacts --write_dasm).
         """
+        with profiler.stage('links'):
+            self.__export_links(output_dir, bytecode_hex)
+        with profiler.stage('facts'):
+            self.__export_facts(output_dir, profiler)
+        if dasm:
+            with profiler.stage('dasm'):
+                write_disassembly(output_dir)
+
+    def __export_links(self, output_dir, bytecode_hex):
         if output_dir != "":
             os.makedirs(output_dir, exist_ok=True)
         
@@ -143,33 +183,38 @@ class InstructionTsvExporter(Exporter):
         else:
             open(events_filename_out, 'w').close()    
 
-        def join(filename):
-            return os.path.join(output_dir, filename)
-
-        def generate(filename, entries):
-            with open(join(filename), 'w') as f:
-                writer = csv.writer(f, delimiter='\t', lineterminator='\n')
-                writer.writerows(entries)
-
-
-        instructions = []
-        instructions_order = []
-        push_value = []
-        for block in self.blocks:
-            for op in block.evm_ops:
-                instructions_order.append(int(op.pc))
-                instructions.append((hex(op.pc), op.opcode.name))
-                if op.opcode.is_push():
-                    push_value.append((hex(op.pc), hex(op.value)))
-
-        instructions_order = list(map(hex, sorted(instructions_order)))
-        generate('Statement_Next.facts', zip(instructions_order, instructions_order[1:]))
-
-        generate('Statement_Opcode.facts', instructions)
-                    
-        generate('PushValue.facts', push_value)
-        dasm = get_disassembly(instructions, dict(push_value))
-        with open(join('contract.dasm'), 'w') as f:
-            f.write(dasm)
-        
-        
+        # No public function selection: all public functions are analyzed,
+        # and no context depth hint: the decompiler's default depth is used
+        for filename in ('SelectedPublicFunction.facts', 'ExcludedPublicFunction.facts', 'ContextDepthHint.facts'):
+            open(os.path.join(output_dir, filename), 'w').close()
+
+    def __export_facts(self, output_dir, profiler):
+        """
+        Writes all fact files in a single pass over the ops. Parsers emit ops in
+        program counter order, so statement order needs no sorting.
+        """
+        def open_facts(filename):
+            return open(os.path.join(output_dir, filename), 'w')
+
+        with open_facts('Statement_Opcode.facts') as opcode_file, \
+             open_facts('PushValue.facts') as push_file, \
+             open_facts('Statement_Next.facts') as next_file:
+            statements = push_values = 0
+            prev_pc = None
+            for block in self.blocks:
+                for op in block.evm_ops:
+                    pc = int(op.pc)
+                    stmt = hex(pc)
+                    if prev_pc is not None:
+                        if pc <= prev_pc:
+                            raise ValueError("Statement {} is out of order (follows {})".format(stmt, hex(prev_pc)))
+                        next_file.write('{}\t{}\n'.format(hex(prev_pc), stmt))
+                    opcode_file.write('{}\t{}\n'.format(stmt, op.opcode.name))
+                    if op.opcode.is_push():
+                        push_file.write('{}\t{}\n'.format(stmt, hex(op.value)))
+                        push_values += 1
+                    statements += 1
+                    prev_pc = pc
+
+        profiler.count('statements', statements)
+        profiler.count('push_values', push_values)
@@ -0,0 +1,255 @@
+"""factgen.py: Fact generation for one or many contracts"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import typing as t
+import zipfile
+import zlib
+from multiprocessing import Pool
+
+import src.blockparse as blockparse
+import src.exporter as exporter
+from src.basicblock import EVMBasicBlock
+from src.profiling import StageProfiler, NULL_PROFILER
+
+DEFAULT_PATTERN = ".*.hex"
+"""Default filename pattern for contract files in batch mode."""
+
+ContractInput = t.Tuple[str, t.Optional[str], t.Optional[str]]
+"""(contract name, bytecode file path, bytecode): exactly one of the last two is set."""
+
+ARCHIVE_SUFFIXES = ('.jsonl', '.jsonl.gz', '.jsonl.zst', '.tar', '.tar.gz', '.tgz', '.zip')
+"""Files read as archives of many contracts, rather than as the bytecode of one."""
+
+BATCH_CHUNKSIZE = 16
+"""Contracts sent to a batch worker at a time."""
+
+DEFAULT_NAME_FIELD = 'address'
+DEFAULT_BYTECODE_FIELD = 'bytecode'
+"""Default fields of JSONL records holding the contract name and bytecode."""
+
+
+def contract_name(filename: str) -> str:
+    """The name of a contract: its file name, up to the first dot."""
+    return os.path.split(filename)[1].split('.')[0]
+
+
+def code_size(bytecode: str) -> int:
+    """The size in bytes of hex bytecode, not counting its 0x prefix."""
+    return len(bytecode.strip().replace("0x", "")) // 2
+
+
+def generate_facts(bytecode: str, out_dir: str, profiler: StageProfiler = NULL_PROFILER, dasm: bool = True) -> t.List[EVMBasicBlock]:
+    """Parses hex bytecode and exports its decompiler input facts to out_dir. Returns the parsed blocks."""
+    blocks = blockparse.EVMBytecodeParser(bytecode).parse(profiler)
+    exporter.InstructionTsvExporter(blocks).export(output_dir=out_dir, bytecode_hex=bytecode, profiler=profiler, dasm=dasm)
+    return blocks
+
+
+def read_bytecode(path: str, profiler: StageProfiler = NULL_PROFILER) -> str:
+    with profiler.stage('read'):
+        with open(path) as f:
+            return f.read().strip()
+
+
+def is_archive(path: str) -> bool:
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+
+def _open_text(path: str) -> t.TextIO:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('Reading {} requires the zstandard package (pip install zstandard)'.format(path))
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path)
+
+
+def archive_inputs(path: str, pattern: str = DEFAULT_PATTERN, name_field: str = DEFAULT_NAME_FIELD,
+                   bytecode_field: str = DEFAULT_BYTECODE_FIELD) -> t.Iterator[ContractInput]:
+    """
+    Streams the contracts of an archive, with their bytecode in memory:
+      - JSONL (optionally gzip or zstd compressed): one JSON object per line,
+        named by its name_field (up to its first dot, without directories),
+        with its hex bytecode in bytecode_field; records without a name are
+        numbered,
+      - tar (optionally compressed) or zip: every member file whose name
+        matches pattern, holding hex bytecode.
+    """
+    if '.jsonl' in os.path.basename(path):
+        with _open_text(path) as f:
+            for i, line in enumerate(f):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                # Names become directory names, so they are reduced to a file name like those of members
+                name = contract_name(str(record.get(name_field) or '')) or 'contract{}'.format(i)
+                yield name, None, (record.get(bytecode_field) or '').strip()
+        return
+
+    regex = re.compile(pattern if pattern.endswith('$') else pattern + '$')
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and regex.match(info.filename):
+                    yield contract_name(info.filename), None, archive.read(info).decode().strip()
+    else:
+        # Stream mode: members are read in order, without seeking back
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and regex.match(member.name):
+                    yield contract_name(member.name), None, archive.extractfile(member).read().decode().strip()
+
+
+def batch_inputs(source: str, pattern: str = DEFAULT_PATTERN) -> t.Iterator[ContractInput]:
+    """
+    Enumerates the contracts of a batch. The source is either:
+      - a directory, whose files matching pattern are used,
+      - "-", for a stream of hex bytecode lines on stdin, each optionally
+        preceded by a contract name and whitespace,
+      - an archive of contracts (see archive_inputs),
+      - a list file, containing one bytecode file path per line.
+    """
+    if os.path.isdir(source):
+        regex = re.compile(pattern if pattern.endswith('$') else pattern + '$')
+        for entry in os.scandir(source):
+            if entry.is_file() and regex.match(entry.name):
+                yield contract_name(entry.name), entry.path, None
+    elif source == '-':
+        for i, line in enumerate(sys.stdin):
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) == 1:
+                yield 'contract{}'.format(i), None, fields[0]
+            else:
+                yield contract_name(fields[0]), None, fields[-1]
+    elif is_archive(source):
+        yield from archive_inputs(source, pattern)
+    else:
+        with open(source) as f:
+            for line in f:
+                path = line.strip()
+                if path:
+                    yield contract_name(path), path, None
+
+
+def _generate_to_dir(item: ContractInput, out_root: str, dasm: bool):
+    name, path, bytecode = item
+    profiler = StageProfiler()
+    try:
+        if bytecode is None:
+            bytecode = read_bytecode(path, profiler)
+        generate_facts(bytecode, os.path.join(out_root, name), profiler, dasm)
+        return name, None, profiler, None
+    except Exception as e:
+        return name, '{}: {}'.format(type(e).__name__, e), profiler, None
+
+
+def _generate_to_memory(item: ContractInput, _: str, dasm: bool):
+    """Generates facts in a scratch directory and returns them as tar members."""
+    name, path, bytecode = item
+    profiler = StageProfiler()
+    try:
+        if bytecode is None:
+            bytecode = read_bytecode(path, profiler)
+        with tempfile.TemporaryDirectory() as scratch:
+            generate_facts(bytecode, scratch, profiler, dasm)
+            members = []
+            for entry in sorted(os.scandir(scratch), key=lambda e: e.name):
+                if entry.is_symlink():
+                    members.append((entry.name, None, os.readlink(entry.path)))
+                else:
+                    with open(entry.path, 'rb') as f:
+                        members.append((entry.name, f.read(), None))
+        return name, None, profiler, members
+    except Exception as e:
+        return name, '{}: {}'.format(type(e).__name__, e), profiler, None
+
+
+def _star_generate(args):
+    function, item, out_root, dasm = args
+    return function(item, out_root, dasm)
+
+
+def _add_members(archive: tarfile.TarFile, name: str, members) -> None:
+    for filename, data, link in members:
+        info = tarfile.TarInfo('{}/{}'.format(name, filename))
+        info.mtime = int(time.time())
+        if link is not None:
+            info.type = tarfile.SYMTYPE
+            info.linkname = link
+            archive.addfile(info)
+        else:
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def batch_generate(inputs: t.Iterable[ContractInput], out_dir: str, jobs: int = 1,
+                   shards: int = 0, dasm: bool = True) -> t.Tuple[int, t.List[t.Tuple[str, str]], StageProfiler]:
+    """
+    Generates facts for many contracts using a pool of jobs processes.
+
+    Args:
+      inputs: the contracts to process, e.g. from batch_inputs.
+      out_dir: facts go to out_dir/<contract name>/, or to tar shards in out_dir.
+      shards: if non-zero, write this many tar archives (facts-NNN.tar),
+        contracts being assigned to shards by a hash of their name.
+      dasm: whether to write contract.dasm for each contract.
+
+    Returns:
+      The number of contracts whose facts were generated, a list of the
+      (contract, error) pairs of the ones that failed,
+      and the aggregated fact generation profile.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    function = _generate_to_memory if shards else _generate_to_dir
+    archives = [tarfile.open(os.path.join(out_dir, 'facts-{:03d}.tar'.format(i)), 'w') for i in range(shards)]
+    profile = StageProfiler()
+    errors = []
+    done = 0
+    # The pool reads tasks as fast as it can queue them, so inputs (with their
+    # bytecode, for archives) are only read up to a window ahead of the results
+    window = threading.Semaphore(2 * jobs * BATCH_CHUNKSIZE)
+    stopped = threading.Event()
+
+    def tasks():
+        for item in inputs:
+            window.acquire()
+            if stopped.is_set():
+                return
+            yield function, item, out_dir, dasm
+
+    try:
+        with Pool(jobs) as pool:
+            try:
+                for name, error, profiler, members in pool.imap_unordered(_star_generate, tasks(), BATCH_CHUNKSIZE):
+                    window.release()
+                    profile.merge(profiler)
+                    if error is not None:
+                        logging.warning("%s: %s", name, error)
+                        errors.append((name, error))
+                        continue
+                    done += 1
+                    if members is not None:
+                        _add_members(archives[zlib.crc32(name.encode()) % shards], name, members)
+            finally:
+                # unblock the pool's task feeder, so that the pool can be shut down
+                stopped.set()
+                window.release()
+    finally:
+        for archive in archives:
+            archive.close()
+    return done, errors, profile
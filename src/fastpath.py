@@ -0,0 +1,80 @@
+"""fastpath.py: Recognizing contracts that instantiate a known template, such as EIP-1167 minimal proxies"""
+
+import os
+import re
+import typing as t
+
+import src.blockparse as blockparse
+
+MAX_TEMPLATE_SIZE = 45
+"""Size in bytes of the largest template, so larger contracts are not parsed."""
+
+EIP1167_PATTERN = re.compile(
+    r'CALLDATASIZE RETURNDATASIZE RETURNDATASIZE CALLDATACOPY RETURNDATASIZE RETURNDATASIZE RETURNDATASIZE '
+    r'CALLDATASIZE RETURNDATASIZE PUSH(\d+) GAS DELEGATECALL RETURNDATASIZE DUP3 DUP1 RETURNDATACOPY SWAP1 '
+    r'RETURNDATASIZE SWAP2 PUSH1 JUMPI REVERT JUMPDEST RETURN$'
+)
+"""Ops of an EIP-1167 minimal proxy, including the variants with shorter (vanity) implementation addresses."""
+
+CANONICAL_ADDRESS_BYTE = 'be'
+"""Fills the implementation address of canonical proxies, so that it is easy to tell apart in outputs."""
+
+Match = t.Tuple[str, str, t.Dict[str, str]]
+"""(template, canonical bytecode, substitutions): the outputs for the contract are those
+for the canonical bytecode, with every substitution key replaced by its value."""
+
+
+def recognize(bytecode: str) -> t.Optional[Match]:
+    """The template that bytecode instantiates, or None if it is not a known one."""
+    code = bytecode.replace("0x", "")
+    if len(code) > 2 * MAX_TEMPLATE_SIZE:
+        return None
+    ops = [op for block in blockparse.EVMBytecodeParser(code).parse() for op in block.evm_ops]
+    if not ops:
+        return 'empty', '', {}
+
+    match = EIP1167_PATTERN.match(' '.join(op.opcode.name for op in ops))
+    if match is None or ops[19].value != ops[22].pc:
+        return None
+    address = ops[9]
+    width = address.opcode.push_len()
+    canonical = CANONICAL_ADDRESS_BYTE * width
+    start = 2 * (address.pc + 1)
+    template = 'eip1167' if width == 20 else 'eip1167_push{}'.format(width)
+    return template, code[:start] + canonical + code[start + 2 * width:], {hex(int(canonical, 16)): hex(address.value)}
+
+
+def available(compiled_programs: t.Mapping[str, t.Any], executable: str) -> bool:
+    """
+    Whether the fast path can be used for the decompiler compiled to executable,
+    whose outputs it caches: it must be one of the compiled_programs of this run
+    (runs with --staged compile the stages instead), and ready.
+
+    Args:
+        compiled_programs: the programs compiled by this run, each with an Event set once it is ready
+        executable: the compiled decompiler's file name
+    """
+    ready = compiled_programs.get(executable)
+    return ready is not None and ready.is_set()
+
+
+def cache_key(template: str, program_id: str, context_depth: t.Optional[int]) -> str:
+    """The key of a template's canonical outputs, as computed by the program identified by program_id."""
+    return '{}-{}-{}'.format(template, program_id, context_depth)
+
+
+def instantiate(out_dir: str, substitutions: t.Dict[str, str]) -> None:
+    """Rewrites the canonical outputs in out_dir for the matched contract."""
+    if not substitutions:
+        return
+    for entry in os.scandir(out_dir):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        with open(entry.path) as f:
+            contents = f.read()
+        rewritten = contents
+        for canonical, actual in substitutions.items():
+            rewritten = rewritten.replace(canonical, actual)
+        if rewritten != contents:
+            with open(entry.path, 'w') as f:
+                f.write(rewritten)
@@ -0,0 +1,133 @@
+"""manifest.py: Per-contract manifest of output relations and their sizes"""
+
+import hashlib
+import json
+import os
+import typing as t
+
+MANIFEST_FILE = 'manifest.json'
+"""Name of the manifest written to each contract's output directory."""
+
+READ_CHUNK_SIZE = 1 << 20
+
+RELATION_SUFFIXES = ('.csv', '.facts')
+"""Suffixes of the files of Souffle relations, which are named after them."""
+
+COUNTED_PREFIXES = ('Analytics_',)
+"""Relations whose tuples are always counted, as the analytics are made of their sizes."""
+
+Manifest = t.Dict[str, t.Dict[str, t.Any]]
+"""Maps relation names to {'file', 'size'[, 'tuples'][, 'hash']} entries."""
+
+
+def relation_name(filename: str) -> str:
+    """The relation stored in filename; other files, e.g. client outputs, go by their whole name."""
+    for suffix in RELATION_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def _count_tuples(path: str) -> int:
+    tuples = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            tuples += chunk.count(b'\n')
+            last = chunk[-1:]
+    return tuples + (last != b'\n')
+
+
+def _count_and_hash_tuples(path: str) -> t.Tuple[int, str]:
+    """
+    Counts tuples and computes a hash of the relation's contents that does
+    not depend on the order of its tuples: the sum of the tuples' hashes.
+    """
+    tuples = 0
+    total = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            digest = hashlib.blake2b(line.rstrip(b'\r\n'), digest_size=8).digest()
+            total = (total + int.from_bytes(digest, 'little')) & 0xffffffffffffffff
+            tuples += 1
+    return tuples, '{:016x}'.format(total)
+
+
+def build_manifest(out_dir: str, hashes: bool = False, counts: bool = False) -> Manifest:
+    """
+    Lists out_dir once, recording the size of every output file. Only the
+    tuples of Analytics_* relations are counted, unless counts or hashes are
+    requested, and empty files are not opened.
+
+    Args:
+        out_dir: the contract's output directory
+        hashes: whether to also record the tuple count and an order-insensitive
+          hash of each relation
+        counts: whether to also record the tuple count of each relation
+    """
+    manifest = {}
+    for entry in os.scandir(out_dir):
+        if entry.name == MANIFEST_FILE or not entry.is_file():
+            continue
+        size = entry.stat().st_size
+        name = relation_name(entry.name)
+        info = {'file': entry.name, 'size': size}
+        if size == 0:
+            info['tuples'] = 0
+            if hashes:
+                info['hash'] = '{:016x}'.format(0)
+        elif hashes:
+            info['tuples'], info['hash'] = _count_and_hash_tuples(entry.path)
+        elif counts or name.startswith(COUNTED_PREFIXES):
+            info['tuples'] = _count_tuples(entry.path)
+        manifest[name] = info
+    return manifest
+
+
+def write_manifest(out_dir: str, manifest: Manifest) -> None:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def read_manifest(out_dir: str) -> t.Optional[Manifest]:
+    """The manifest written to out_dir, or None if there is none."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def nonempty_relations(manifest: Manifest) -> t.List[str]:
+    """
+    The "files" of a contract in results.json: its non-empty output files,
+    named up to their first dot (e.g. client for client.py.out), as they
+    always have been, whatever the manifest is keyed by.
+    """
+    return [info['file'].split('.')[0] for info in manifest.values() if info['size'] > 0]
+
+
+def manifest_analytics(out_dir: str, manifest: Manifest) -> t.Dict[str, t.Union[int, str]]:
+    """
+    The gigahorse analytics of a contract: the tuple count of every Analytics_*
+    relation and, for every VulnerabilityDescription_<X> relation, the contents
+    of X. Only non-empty X relations are read.
+    """
+    analytics = {}
+    for name, info in manifest.items():
+        if name.startswith('Analytics_'):
+            analytics[name] = info['tuples']
+        elif name.startswith('VulnerabilityDescription_'):
+            flagged = name[len('VulnerabilityDescription_'):]
+            flagged_info = manifest.get(flagged)
+            if flagged_info is not None and flagged_info['size'] > 0:
+                with open(os.path.join(out_dir, flagged_info['file'])) as f:
+                    analytics[flagged] = f.read()
+            else:
+                analytics[flagged] = ''
+    return analytics
@@ -0,0 +1,113 @@
+"""plugins.py: Python clients loaded once and run in-process for each contract"""
+
+import ast
+import contextlib
+import importlib.util
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+import typing as t
+from types import ModuleType
+
+ENTRY_POINT = 'analyze'
+"""The function a client module defines to be run as a plugin: analyze(out_dir) -> results."""
+
+PLUGIN_MARKER = 'GIGAHORSE_PLUGIN'
+"""The module-level name a client sets to True to opt in to being run as a plugin."""
+
+
+class ClientTimeout(BaseException):
+    """
+    Raised in a plugin whose analysis of a contract ran out of time. Not an
+    Exception, so that clients catching every Exception do not swallow it.
+    """
+
+
+def is_plugin(path: str) -> bool:
+    """
+    Whether the client at path opts in to being run as a plugin: it sets
+    PLUGIN_MARKER = True and defines an ENTRY_POINT function, both at the top
+    level. The client is parsed, not run: script-style clients may do their
+    work when imported. Clients that cannot be parsed here (e.g. Python 2
+    scripts) are not plugins.
+    """
+    try:
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+    except (SyntaxError, UnicodeDecodeError, ValueError):
+        return False
+    marked = any(isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and node.value.value is True
+                 and any(isinstance(target, ast.Name) and target.id == PLUGIN_MARKER for target in node.targets)
+                 for node in tree.body)
+    return marked and any(isinstance(node, ast.FunctionDef) and node.name == ENTRY_POINT for node in tree.body)
+
+
+def load_plugin(path: str) -> ModuleType:
+    """
+    Imports the client at path, as a script would find its imports: with its
+    directory on sys.path. Run before forking workers, so that they share the
+    module and everything it imports.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = 'gigahorse_client_' + os.path.basename(path).split('.')[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_results(results: t.Any, out: t.TextIO) -> None:
+    """Prints the results of analyze: strings as they are, anything else as JSON."""
+    if results is None:
+        return
+    if isinstance(results, str):
+        out.write(results)
+    else:
+        json.dump(results, out, indent=1, sort_keys=True)
+        out.write('\n')
+
+
+def _raise_timeout(signum, frame):
+    raise ClientTimeout()
+
+
+def run_plugin(module: ModuleType, out_dir: str, timeout: float, stdout: t.TextIO, stderr: t.TextIO) -> float:
+    """
+    Runs a plugin's analysis of the contract in out_dir, with what it prints
+    and its results redirected to stdout, and its errors to stderr, as for a
+    script-style client. Must be run in the main thread of a process.
+
+    Returns the time it took and -1 if it timed out.
+    """
+    if timeout <= 0:
+        return -1
+    start_time = time.time()
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                write_results(getattr(module, ENTRY_POINT)(out_dir), stdout)
+            except Exception:
+                # Like a failing script: the contract is done, with the error reported
+                traceback.print_exc()
+    except ClientTimeout:
+        return -1
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    return time.time() - start_time
+
+
+def run_as_script(analyze: t.Callable[[str], t.Any]) -> None:
+    """
+    Lets a plugin also be run as a script, in a decompiler output directory:
+      if __name__ == '__main__':
+          run_as_script(analyze)
+    """
+    write_results(analyze('.'), sys.stdout)
@@ -0,0 +1,64 @@
+"""prescan.py: Cheap features of a contract's code, used to configure its analysis"""
+
+import os
+import typing as t
+
+import src.basicblock as basicblock
+import src.opcodes as opcodes
+from src.sharding import dispatch_selectors
+
+CONTEXT_DEPTH_HINT_FACTS = 'ContextDepthHint.facts'
+"""Input fact overriding the decompiler's default context depth for a contract."""
+
+CONTEXT_DEPTH_BY_JUMPS = ((6000, 4), (15000, 3))
+"""(number of jumps, context depth) pairs: contracts with fewer jumps than the
+first element get the second as their context depth. Predictions never exceed
+the decompiler's default depth (4), only lowering it for large contracts, until
+deeper contexts for small contracts are measured with benchmarks/context_depth.py."""
+
+MIN_CONTEXT_DEPTH = 2
+"""Context depth of contracts with more jumps than CONTEXT_DEPTH_BY_JUMPS covers."""
+
+LARGE_DISPATCHER = 64
+"""Number of public functions beyond which contracts get one less level of context."""
+
+Features = t.Dict[str, int]
+
+
+def scan(blocks: t.Iterable[basicblock.EVMBasicBlock]) -> Features:
+    """
+    Features of the parsed code of a contract, all linear to compute:
+      - code_length: bytes of code
+      - jumps, jumpis: the number of JUMP and JUMPI instructions
+      - push2_jump_targets: PUSH2 instructions pushing a JUMPDEST, roughly the
+        number of jump targets and return addresses known statically
+      - dispatcher_size: the number of selectors the dispatcher compares against
+    """
+    blocks = list(blocks)
+    ops = [op for block in blocks for op in block.evm_ops]
+    jumpdests = {op.pc for op in ops if op.opcode == opcodes.JUMPDEST}
+    return {
+        'code_length': ops[-1].pc + 1 + ops[-1].opcode.push_len() if ops else 0,
+        'jumps': sum(1 for op in ops if op.opcode == opcodes.JUMP),
+        'jumpis': sum(1 for op in ops if op.opcode == opcodes.JUMPI),
+        'push2_jump_targets': sum(1 for op in ops if op.opcode == opcodes.PUSH2 and op.value in jumpdests),
+        'dispatcher_size': len(dispatch_selectors(blocks)),
+    }
+
+
+def context_depth(features: Features) -> int:
+    """
+    The context depth to analyze a contract with: the default for contracts
+    with few jumps, shallower for large ones and ones with many public
+    functions, whose contexts multiply.
+    """
+    jumps = features['jumps'] + features['jumpis']
+    depth = next((d for limit, d in CONTEXT_DEPTH_BY_JUMPS if jumps < limit), MIN_CONTEXT_DEPTH)
+    if features['dispatcher_size'] > LARGE_DISPATCHER:
+        depth -= 1
+    return max(depth, MIN_CONTEXT_DEPTH)
+
+
+def write_context_depth_hint(fact_dir: str, depth: int) -> None:
+    with open(os.path.join(fact_dir, CONTEXT_DEPTH_HINT_FACTS), 'w') as f:
+        f.write('{}\n'.format(depth))
@@ -0,0 +1,76 @@
+"""profiling.py: Lightweight timers and counters for instrumenting fact generation"""
+
+import time
+import typing as t
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class StageProfiler:
+    """
+    Accumulates wall-clock time per named stage and counts of named objects.
+
+    Usage:
+      profiler = StageProfiler()
+      with profiler.stage('parse'):
+          ...
+      profiler.count('ops', len(ops))
+    """
+
+    def __init__(self):
+        self.times: t.Dict[str, float] = defaultdict(float)
+        """Seconds spent in each stage, in order of first entry."""
+
+        self.counts: t.Dict[str, int] = defaultdict(int)
+        """Number of objects of each kind processed."""
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block, adding to the total of stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counts[name] += n
+
+    def merge(self, other: 'StageProfiler') -> None:
+        """Add the timings and counts of another profiler to this one."""
+        for name, seconds in other.times.items():
+            self.times[name] += seconds
+        for name, n in other.counts.items():
+            self.counts[name] += n
+
+    def as_analytics(self, prefix: str = 'facts_') -> t.Dict[str, t.Union[int, float]]:
+        """Flatten into analytics entries: <prefix><stage>_time and <prefix><kind>."""
+        analytics = {f'{prefix}{name}_time': seconds for name, seconds in self.times.items()}
+        analytics.update({f'{prefix}{name}': n for name, n in self.counts.items()})
+        return analytics
+
+    def report(self) -> str:
+        """Human-readable breakdown, one stage or count per line."""
+        total = sum(self.times.values())
+        lines = []
+        for name, seconds in self.times.items():
+            share = 100 * seconds / total if total > 0 else 0.0
+            lines.append('  {:<12} {:8.4f}s {:5.1f}%'.format(name, seconds, share))
+        lines.append('  {:<12} {:8.4f}s'.format('total', total))
+        for name, n in self.counts.items():
+            lines.append('  {:<12} {:>9}'.format(name, n))
+        return '\n'.join(lines)
+
+
+class NullProfiler(StageProfiler):
+    """A profiler that records nothing, used when instrumentation is off."""
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,163 @@
+"""rundiff.py: Comparing the outputs of two gigahorse runs over the same contracts"""
+
+import json
+import os
+import typing as t
+from collections import defaultdict
+from multiprocessing import Pool
+
+from src.factgen import contract_name
+from src.manifest import Manifest, build_manifest, read_manifest
+from src.store import contract_out_dirs
+
+EMPTY_HASH = '{:016x}'.format(0)
+"""The hash of an empty (or missing) relation."""
+
+ContractDiff = t.Dict[str, t.Any]
+"""{'contract', 'changed': [relations], 'analytics': {name: (old, new)}[, 'tuples': {relation: diff}]}."""
+
+
+def relation_hashes(out_dir: str) -> Manifest:
+    """
+    The manifest of out_dir with an order-insensitive hash of every relation:
+    the one written by gigahorse if it was run with --manifest_hashes, or one
+    built now otherwise.
+    """
+    manifest = read_manifest(out_dir)
+    if manifest is None or any('hash' not in info for info in manifest.values()):
+        manifest = build_manifest(out_dir, hashes=True)
+    return manifest
+
+
+def changed_relations(old: Manifest, new: Manifest) -> t.List[str]:
+    """Relations whose contents differ; missing relations are equal to empty ones."""
+    return sorted(
+        name for name in set(old) | set(new)
+        if old.get(name, {}).get('hash', EMPTY_HASH) != new.get(name, {}).get('hash', EMPTY_HASH)
+    )
+
+
+def _tuples(out_dir: str, manifest: Manifest, relation: str) -> t.Set[str]:
+    info = manifest.get(relation)
+    if info is None or info['size'] == 0:
+        return set()
+    with open(os.path.join(out_dir, info['file'])) as f:
+        return {line.rstrip('\r\n') for line in f}
+
+
+def tuple_diff(old_dir: str, new_dir: str, relation: str, old: Manifest, new: Manifest,
+               max_tuples: int) -> t.Dict[str, t.Any]:
+    """The numbers of tuples of relation only in the old and only in the new outputs, with up to max_tuples of each."""
+    old_tuples, new_tuples = _tuples(old_dir, old, relation), _tuples(new_dir, new, relation)
+    removed, added = old_tuples - new_tuples, new_tuples - old_tuples
+    return {
+        'removed': len(removed), 'added': len(added),
+        'removed_sample': sorted(removed)[:max_tuples], 'added_sample': sorted(added)[:max_tuples],
+    }
+
+
+def compare_contract(job: t.Tuple[str, str, str, int]) -> ContractDiff:
+    """
+    Compares the outputs of a contract in two runs, by relation hashes. If
+    max_tuples is positive, also diffs the tuples of the changed relations.
+    """
+    name, old_dir, new_dir, max_tuples = job
+    old, new = relation_hashes(old_dir), relation_hashes(new_dir)
+    changed = changed_relations(old, new)
+    diff: ContractDiff = {
+        'contract': name,
+        'changed': changed,
+        'analytics': {
+            relation: (old.get(relation, {}).get('tuples', 0), new.get(relation, {}).get('tuples', 0))
+            for relation in changed if relation.startswith('Analytics_')
+        },
+    }
+    if max_tuples > 0 and changed:
+        diff['tuples'] = {relation: tuple_diff(old_dir, new_dir, relation, old, new, max_tuples)
+                          for relation in changed}
+    return diff
+
+
+def compare_runs(old_work_dir: str, new_work_dir: str, jobs: int = 1, sample: int = 20,
+                 max_tuples: int = 10) -> t.Dict[str, t.Any]:
+    """
+    Compares every contract in both working directories, jobs at a time.
+    Tuple-level diffs are computed for the first sample contracts (by name)
+    with changes, reporting up to max_tuples added and removed tuples per
+    relation.
+
+    Returns a report with the contracts only in either run, the number of
+    changed contracts per relation, the total change of each Analytics_*
+    relation's size and the diffs of changed contracts.
+    """
+    old_dirs, new_dirs = dict(contract_out_dirs(old_work_dir)), dict(contract_out_dirs(new_work_dir))
+    common = sorted(set(old_dirs) & set(new_dirs))
+    # The sampled contracts are only known once their hashes are compared, so
+    # hashes are compared first, and the tuples of a sample diffed afterwards
+    work = ((name, old_dirs[name], new_dirs[name], 0) for name in common)
+
+    changed_contracts = []
+    relation_changes: t.Dict[str, int] = defaultdict(int)
+    analytics_deltas: t.Dict[str, int] = defaultdict(int)
+    with Pool(jobs) as pool:
+        for diff in pool.imap_unordered(compare_contract, work, chunksize=16):
+            if not diff['changed']:
+                continue
+            changed_contracts.append(diff)
+            for relation in diff['changed']:
+                relation_changes[relation] += 1
+            for relation, (old, new) in diff['analytics'].items():
+                analytics_deltas[relation] += new - old
+
+        changed_contracts.sort(key=lambda diff: diff['contract'])
+        sampled = [(diff['contract'], old_dirs[diff['contract']], new_dirs[diff['contract']], max_tuples)
+                   for diff in changed_contracts[:sample]]
+        changed_contracts[:sample] = pool.map(compare_contract, sampled)
+
+    return {
+        'compared': len(common),
+        'only_old': sorted(set(old_dirs) - set(new_dirs)),
+        'only_new': sorted(set(new_dirs) - set(old_dirs)),
+        'relation_changes': dict(sorted(relation_changes.items())),
+        'analytics_deltas': dict(sorted(analytics_deltas.items())),
+        'contracts': changed_contracts,
+    }
+
+
+def _read_results(results_file: str) -> t.Dict[str, t.Tuple[t.List[str], t.Dict[str, t.Any]]]:
+    """Maps each contract of a results.json to its (meta, analytics)."""
+    with open(results_file) as f:
+        results = json.load(f)
+    # Timed out contracts are sometimes reported by path rather than by name
+    return {contract_name(name): (meta, analytics) for name, _, meta, analytics in results}
+
+
+def compare_results(old_results_file: str, new_results_file: str, top: int = 20) -> t.Dict[str, t.Any]:
+    """
+    Compares the results.json files of two runs: the total time of each
+    stage, the contracts whose outcome (timeout, error) changed, and the top
+    contracts by slowdown and by speedup.
+    """
+    old, new = _read_results(old_results_file), _read_results(new_results_file)
+    stages = ('disassemble_time', 'decomp_time', 'client_time')
+    totals = {stage: [0.0, 0.0] for stage in stages}
+    outcomes = {}
+    deltas = []
+    for name in sorted(set(old) & set(new)):
+        (old_meta, old_analytics), (new_meta, new_analytics) = old[name], new[name]
+        if old_meta != new_meta:
+            outcomes[name] = (old_meta, new_meta)
+            continue
+        if not all(stage in old_analytics and stage in new_analytics for stage in stages):
+            continue
+        for stage in stages:
+            totals[stage][0] += old_analytics[stage]
+            totals[stage][1] += new_analytics[stage]
+        deltas.append((sum(new_analytics[s] for s in stages) - sum(old_analytics[s] for s in stages), name))
+    deltas.sort()
+    return {
+        'stage_totals': {stage: tuple(total) for stage, total in totals.items()},
+        'outcome_changes': outcomes,
+        'slowdowns': [(name, delta) for delta, name in reversed(deltas[-top:]) if delta > 0],
+        'speedups': [(name, delta) for delta, name in deltas[:top] if delta < 0],
+    }
@@ -0,0 +1,37 @@
+"""scheduling.py: Sharing the core budget of a batch between the contracts being analyzed"""
+
+JUMPDESTS_PER_THREAD = 400
+"""Predicted size, in JUMPDESTs, that warrants each additional Souffle thread."""
+
+BYTES_PER_JUMPDEST = 40
+"""Average bytecode size per JUMPDEST, not counting PUSH data as instructions (median of tests/, 28 to 62)."""
+
+
+def predict_jumpdests(code_size: int) -> int:
+    """
+    The number of JUMPDESTs predicted for a contract of code_size bytes, to
+    allocate threads without reading its bytecode.
+    """
+    return code_size // BYTES_PER_JUMPDEST
+
+
+def allocate_threads(jumpdests: int, free: int, pending: int) -> int:
+    """
+    The number of threads to run the next contract's Souffle programs with.
+
+    Contracts get threads in proportion to their predicted size, up to the
+    free part of the budget. Near the end of a batch, when fewer contracts are
+    left to dispatch than there are free threads, the free threads are split
+    between the remaining contracts instead of idling.
+
+    Args:
+        jumpdests: the number of JUMPDESTs in the contract
+        free: threads of the budget not used by running contracts
+        pending: contracts left to dispatch, including this one
+    """
+    if free < 1:
+        return 1
+    threads = 1 + jumpdests // JUMPDESTS_PER_THREAD
+    if pending < free:
+        threads = max(threads, free // max(pending, 1))
+    return min(threads, free)
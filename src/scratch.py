@@ -0,0 +1,70 @@
+"""scratch.py: Running jobs in scratch (e.g. RAM-backed) directories, keeping only selected outputs"""
+
+import fnmatch
+import os
+import shutil
+import tarfile
+import typing as t
+
+from src.manifest import build_manifest, read_manifest, write_manifest
+
+DEFAULT_PERSISTED = (
+    'Analytics_*', 'Vulnerability*', 'PublicFunction.csv', 'HighLevelFunctionName.csv', '*.py.out', '*.py.err'
+)
+"""Patterns of the output files kept by default: the ones results and summaries are made of."""
+
+OUTPUT_ARCHIVE = 'out.tar.gz'
+"""Name of the archive of all of a job's outputs, when these are kept packed."""
+
+PERSISTED_MARKER = 'persisted'
+"""File marking a working directory that only holds the outputs kept from a scratch directory."""
+
+
+def persist(scratch_dir: str, work_dir: str, patterns: t.Sequence[str], archive: bool = False) -> None:
+    """
+    Copies the output files of a job matching any of patterns from its
+    scratch directory to the out/ directory of its persistent working
+    directory, with a manifest of the copied files, then removes the
+    scratch directory. The working directory is marked with PERSISTED_MARKER.
+
+    The working directory is assembled next to its final path and moved
+    into place with its marker already written, so that it never exists
+    half-persisted: an existing working directory marks a finished job.
+
+    Args:
+        scratch_dir: the job's scratch working directory, with outputs in out/
+        work_dir: the persistent working directory, replaced if it exists
+        patterns: shell-style patterns of the output file names to keep
+        archive: whether to also keep all outputs, packed as OUTPUT_ARCHIVE
+    """
+    scratch_out = os.path.join(scratch_dir, 'out')
+    tmp_dir = work_dir.rstrip(os.sep) + '.tmp'
+    out_dir = os.path.join(tmp_dir, 'out')
+    try:
+        # Left over by a persist that was interrupted
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(out_dir)
+        # The manifest is missing for jobs that timed out or failed
+        manifest = read_manifest(scratch_out)
+        if manifest is None:
+            manifest = build_manifest(scratch_out) if os.path.isdir(scratch_out) else {}
+        kept = {name: info for name, info in manifest.items()
+                if any(fnmatch.fnmatchcase(info['file'], pattern) for pattern in patterns)}
+        for info in kept.values():
+            shutil.copyfile(os.path.join(scratch_out, info['file']), os.path.join(out_dir, info['file']))
+        write_manifest(out_dir, kept)
+        if archive and os.path.isdir(scratch_out):
+            with tarfile.open(os.path.join(tmp_dir, OUTPUT_ARCHIVE), 'w:gz', dereference=True) as packed:
+                packed.add(scratch_out, arcname='out')
+        open(os.path.join(tmp_dir, PERSISTED_MARKER), 'w').close()
+        if os.path.isdir(work_dir):
+            shutil.rmtree(work_dir)
+        os.replace(tmp_dir, work_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def is_persisted(work_dir: str) -> bool:
+    """Whether work_dir only holds the outputs persisted from a scratch directory, not all of them."""
+    return os.path.exists(os.path.join(work_dir, PERSISTED_MARKER))
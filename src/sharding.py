@@ -0,0 +1,199 @@
+"""sharding.py: Restricting the analysis of a contract to some of its public functions, and
+splitting it into shards by public function"""
+
+import os
+import re
+import typing as t
+
+import src.basicblock as basicblock
+
+SELECTED_FACTS = 'SelectedPublicFunction.facts'
+EXCLUDED_FACTS = 'ExcludedPublicFunction.facts'
+"""Input facts restricting the public functions the decompiler analyzes."""
+
+DISPATCH_PATTERN = re.compile(r'((DUP|SWAP)\d+ )*EQ PUSH\d+ JUMPI')
+"""Ops following a selector push in a Solidity-style dispatcher."""
+
+Shard = t.Tuple[t.List[str], t.List[str]]
+"""(selected, excluded) public function selectors."""
+
+DEFAULT_CONTEXT_SENSITIVITY = 'transactional-context'
+"""The decompiler's context sensitivity, unless CONTEXT_SENSITIVITY is defined."""
+
+SELECTION_CONTEXT_SENSITIVITIES = (DEFAULT_CONTEXT_SENSITIVITY, 'selective_Ncontext+', 'full_Ncontext+')
+"""Context sensitivities that only analyze the selected public functions (AnalyzedPublicFunction)."""
+
+NEGATED_RELATIONS: t.Dict[str, t.Optional[t.Tuple[str, t.Tuple[int, ...]]]] = {
+    'Analytics_UnreachableBlock': None,
+    'Analytics_MissingJumpTarget': None,
+    'Analytics_MissingImplementation': None,
+    'Analytics_BlockHasNoIRBlock': ('Analytics_ReachableBlocks', (0,)),
+    'Analytics_StmtMissingOperand': ('TAC_Op', (0,)),
+    'Analytics_InexactFunctionCallArguments': ('TAC_Op', (0,)),
+    'Analytics_BlockInNoFunctions': ('TAC_Block', (1,)),
+    'Analytics_BlockIsEmpty': ('LocalBlockEdge', (0, 1)),
+    'Analytics_JumpToManyWithoutGlobalImprecision': ('Analytics_JumpToMany', (0,)),
+}
+"""
+Output relations derived through the absence of facts that another shard's
+functions may supply, e.g. a block unreachable from one shard's functions
+but reachable from another's. Each maps to the output relation and columns
+listing the subjects (first columns of its tuples) a shard analyzed, or to
+None if every shard analyzes every subject. A tuple of these is only merged
+if every shard that analyzed its subject derived it. The negations in the
+other outputs only concern facts of the same function, which every shard
+analyzing the function derives alike.
+"""
+
+
+def dispatch_selectors(blocks: t.Iterable[basicblock.EVMBasicBlock]) -> t.List[str]:
+    """
+    The function selectors the contract's dispatcher compares against, in code
+    order, formatted like PushValue facts.
+    """
+    ops = [op for block in blocks for op in block.evm_ops]
+    selectors = []
+    for i, op in enumerate(ops):
+        if op.opcode.name not in ('PUSH3', 'PUSH4'):
+            continue
+        following = ' '.join(o.opcode.name for o in ops[i + 1:i + 6])
+        selector = hex(op.value)
+        if DISPATCH_PATTERN.match(following) and selector not in selectors:
+            selectors.append(selector)
+    return selectors
+
+
+def resolve_selectors(specs: t.Iterable[str], signatures_file: str) -> t.List[str]:
+    """
+    The selectors, formatted like PushValue facts, of public functions given
+    as hex selectors, full signatures or names (matching every signature with
+    that name) in signatures_file, a PublicFunctionSignature.facts file.
+    Raises ValueError for names with no known signature.
+    """
+    signatures = []
+    if os.path.isfile(signatures_file):
+        with open(signatures_file) as f:
+            signatures = [line.rstrip('\n').split('\t') for line in f if '\t' in line]
+
+    selectors, unknown = [], []
+    for spec in specs:
+        if spec.startswith('0x'):
+            matches = [spec]
+        else:
+            matches = [h for h, sig in signatures if spec in (sig, sig.split('(')[0])]
+        if not matches:
+            unknown.append(spec)
+        for selector in matches:
+            selector = hex(int(selector, 16))
+            if selector not in selectors:
+                selectors.append(selector)
+    if unknown:
+        raise ValueError('unknown public functions: {}'.format(', '.join(unknown)))
+    return selectors
+
+
+def context_sensitivity(souffle_macros: str) -> str:
+    """The context sensitivity the decompiler is run with, given the macros passed to Souffle."""
+    for macro in souffle_macros.split():
+        if macro.startswith('CONTEXT_SENSITIVITY='):
+            return macro[len('CONTEXT_SENSITIVITY='):]
+    return DEFAULT_CONTEXT_SENSITIVITY
+
+
+def write_selection(fact_dir: str, selected: t.List[str], excluded: t.List[str]) -> None:
+    """Restricts the public functions the decompiler analyzes on the facts in fact_dir."""
+    for filename, selectors in ((SELECTED_FACTS, selected), (EXCLUDED_FACTS, excluded)):
+        with open(os.path.join(fact_dir, filename), 'w') as f:
+            f.writelines(selector + '\n' for selector in selectors)
+
+
+def partition(selectors: t.List[str], shards: int) -> t.List[Shard]:
+    """
+    Splits the analysis into at most shards parts. All but the last shard select
+    a group of selectors; the last excludes those, so it also covers public
+    functions the dispatcher prescan missed, such as the fallback function.
+    """
+    shards = max(1, min(shards, len(selectors)))
+    groups = [selectors[i::shards] for i in range(shards)]
+    selected = groups[:-1]
+    excluded = [selector for group in selected for selector in group]
+    return [(group, []) for group in selected] + [([], excluded)]
+
+
+def prepare_shard(fact_dir: str, shard_dir: str, shard: Shard) -> None:
+    """Creates a fact directory for a shard, linking to the contract's facts."""
+    os.makedirs(shard_dir, exist_ok=True)
+    for entry in os.scandir(fact_dir):
+        if entry.is_file() and entry.name not in (SELECTED_FACTS, EXCLUDED_FACTS):
+            os.symlink(entry.path, os.path.join(shard_dir, entry.name))
+    write_selection(shard_dir, *shard)
+
+
+def _output_files(out_dir: str) -> t.List[str]:
+    return [entry.name for entry in os.scandir(out_dir) if entry.is_file(follow_symlinks=False)]
+
+
+def _tuples(path: str) -> t.List[bytes]:
+    with open(path, 'rb') as f:
+        return [line.rstrip(b'\n') for line in f]
+
+
+def _subjects(out_dir: str, relation: str, columns: t.Tuple[int, ...]) -> t.Set[bytes]:
+    path = os.path.join(out_dir, relation + '.csv')
+    if not os.path.exists(path):
+        return set()
+    subjects = set()
+    for line in _tuples(path):
+        fields = line.split(b'\t')
+        subjects.update(fields[column] for column in columns if column < len(fields))
+    return subjects
+
+
+def merge_outputs(out_dirs: t.List[str], merged_dir: str) -> None:
+    """
+    Unions each output relation over the shards' output directories, keeping the
+    first occurrence of each tuple. The tuples of NEGATED_RELATIONS are only kept
+    if all the shards that analyzed their subjects agree on them.
+    """
+    names = []
+    for out_dir in out_dirs:
+        names += [name for name in _output_files(out_dir) if name not in names]
+    for name in names:
+        shard_lines = [
+            _tuples(os.path.join(out_dir, name)) if os.path.exists(os.path.join(out_dir, name)) else []
+            for out_dir in out_dirs
+        ]
+        relation = os.path.splitext(name)[0]
+        if relation in NEGATED_RELATIONS:
+            domain = NEGATED_RELATIONS[relation]
+            # Each shard's tuples and the subjects it analyzed (None for all)
+            shards = [(set(lines), None if domain is None else _subjects(out_dir, *domain))
+                      for out_dir, lines in zip(out_dirs, shard_lines)]
+        seen = set()
+        with open(os.path.join(merged_dir, name), 'wb') as merged:
+            for line in (line for lines in shard_lines for line in lines):
+                if line in seen:
+                    continue
+                seen.add(line)
+                if relation in NEGATED_RELATIONS:
+                    subject = line.split(b'\t')[0]
+                    if not all(line in tuples for tuples, subjects in shards
+                               if subjects is None or subject in subjects):
+                        continue
+                merged.write(line + b'\n')
+
+
+def diff_outputs(expected_dir: str, actual_dir: str) -> t.Dict[str, t.Tuple[int, int]]:
+    """
+    Compares output relations as sets of tuples. Returns, for each file that
+    differs, the number of tuples missing from actual_dir and of extra tuples in it.
+    """
+    diff = {}
+    for name in set(_output_files(expected_dir)) | set(_output_files(actual_dir)):
+        expected, actual = (
+            set(_tuples(os.path.join(d, name))) if os.path.exists(os.path.join(d, name)) else set()
+            for d in (expected_dir, actual_dir)
+        )
+        if expected != actual:
+            diff[name] = (len(expected - actual), len(actual - expected))
+    return diff
@@ -0,0 +1,62 @@
+"""stages.py: Caching of the intermediate results of the staged decompiler"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import typing as t
+
+PIPELINE_STAGES = ('transform', 'global')
+"""Stages of the staged decompiler, in the order they run."""
+
+TRANSFORM_INPUTS = ('Statement_Opcode.facts', 'Statement_Next.facts', 'PushValue.facts')
+"""The facts read by the transform stage."""
+
+
+class StageCache:
+    """
+    Output files of a stage, keyed by the identity of the stage's program and
+    a hash of its input files. Entries are directories, published atomically
+    by renaming a fully written temporary directory.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(program_id: str, fact_dir: str, inputs: t.Iterable[str]) -> str:
+        hasher = hashlib.sha256(program_id.encode('utf-8'))
+        for name in inputs:
+            hasher.update(b'\0' + name.encode('utf-8') + b'\0')
+            try:
+                with open(os.path.join(fact_dir, name), 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        hasher.update(chunk)
+            except FileNotFoundError:
+                pass
+        return hasher.hexdigest()
+
+    def restore(self, key: str, out_dir: str) -> bool:
+        """Copies the cached outputs for key to out_dir. Returns whether there were any."""
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry):
+            return False
+        for name in os.listdir(entry):
+            shutil.copyfile(os.path.join(entry, name), os.path.join(out_dir, name))
+        os.utime(entry)
+        return True
+
+    def store(self, key: str, out_dir: str, outputs: t.Iterable[str]) -> None:
+        """Caches the given output files of out_dir under key, unless another run already has."""
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry):
+            return
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            for name in outputs:
+                shutil.copyfile(os.path.join(out_dir, name), os.path.join(tmp, name))
+            os.rename(tmp, entry)
+        except OSError:
+            # lost the race to a concurrent run storing the same entry
+            shutil.rmtree(tmp, ignore_errors=True)
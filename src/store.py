@@ -0,0 +1,172 @@
+"""store.py: An indexed SQLite store of output relations across many decompiled contracts"""
+
+import os
+import sqlite3
+import typing as t
+from multiprocessing import Pool
+
+from src.manifest import read_manifest
+
+DEFAULT_RELATIONS = (
+    'PublicFunction', 'HighLevelFunctionName', 'ConstantPossibleSigHash', 'IRFunctionCall', 'StaticallyGuardedBlock'
+)
+"""Relations ingested by default: small ones that queries across contracts are about."""
+
+INSERT_BATCH_SIZE = 50000
+"""Number of rows inserted per executemany call."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY, contract INTEGER NOT NULL, relation TEXT NOT NULL,
+                                 tuple TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS cells (row INTEGER NOT NULL, position INTEGER NOT NULL, value TEXT NOT NULL);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS rows_by_relation ON rows (relation, contract);
+CREATE INDEX IF NOT EXISTS rows_by_contract ON rows (contract);
+CREATE INDEX IF NOT EXISTS cells_by_value ON cells (value, position);
+CREATE INDEX IF NOT EXISTS cells_by_row ON cells (row);
+"""
+"""Created after bulk loading, which is faster than maintaining them during it."""
+
+ContractRows = t.Tuple[str, t.Dict[str, t.List[str]]]
+"""(contract name, {relation: lines of its output file})."""
+
+Result = t.Tuple[str, str, t.Tuple[str, ...]]
+"""(contract name, relation, tuple)."""
+
+
+def selector_values(selector: str) -> t.List[str]:
+    """The forms a function selector takes in outputs: zero-padded to 8 digits, and as a number."""
+    number = int(selector, 16)
+    return sorted({'0x{:08x}'.format(number), hex(number)})
+
+
+def contract_out_dirs(work_dir: str) -> t.Iterator[t.Tuple[str, str]]:
+    """(contract name, output directory) of every contract in a gigahorse working directory."""
+    for entry in os.scandir(work_dir):
+        out_dir = os.path.join(entry.path, 'out')
+        if entry.is_dir() and os.path.isdir(out_dir):
+            yield entry.name, out_dir
+
+
+def _read_contract(job: t.Tuple[str, str, t.Sequence[str]]) -> ContractRows:
+    name, out_dir, relations = job
+    manifest = read_manifest(out_dir)
+    rows = {}
+    for relation in relations:
+        if manifest is not None:
+            info = manifest.get(relation)
+            if info is None or info['size'] == 0:
+                continue
+            path = os.path.join(out_dir, info['file'])
+        else:
+            path = os.path.join(out_dir, relation + '.csv')
+        try:
+            with open(path) as f:
+                rows[relation] = [line.rstrip('\n') for line in f]
+        except FileNotFoundError:
+            pass
+    return name, rows
+
+
+class QueryStore:
+    """
+    Output relations of many contracts in one SQLite database. Every tuple is
+    a row, and every column value of a tuple a cell, indexed by value, so that
+    contracts can be looked up by the values in their outputs.
+
+    Usage:
+      store = QueryStore('results.sqlite')
+      store.ingest(contract_out_dirs('.temp'))
+      store.query(relation='HighLevelFunctionName', value='transfer(address,uint256)')
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def ingest(self, out_dirs: t.Iterable[t.Tuple[str, str]], relations: t.Sequence[str] = DEFAULT_RELATIONS,
+               jobs: int = 1) -> int:
+        """
+        Loads the given relations of each (contract name, output directory),
+        replacing any previously loaded outputs of the same contracts. Output
+        files are read by jobs processes, while this process inserts their rows
+        in bulk. Returns the number of contracts loaded.
+        """
+        work = ((name, out_dir, relations) for name, out_dir in out_dirs)
+        connection = self.connection
+        # Bulk loading: a crash loses the database rather than a few transactions
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        loaded = 0
+        with Pool(jobs) as pool:
+            for name, rows in pool.imap_unordered(_read_contract, work, chunksize=16):
+                with connection:
+                    self._replace_contract(name, rows)
+                loaded += 1
+        connection.executescript(INDEXES)
+        return loaded
+
+    def _replace_contract(self, name: str, rows: t.Dict[str, t.List[str]]) -> None:
+        connection = self.connection
+        existing = connection.execute('SELECT id FROM contracts WHERE name = ?', (name,)).fetchone()
+        if existing is not None:
+            contract = existing[0]
+            connection.execute('DELETE FROM cells WHERE row IN (SELECT id FROM rows WHERE contract = ?)', (contract,))
+            connection.execute('DELETE FROM rows WHERE contract = ?', (contract,))
+        else:
+            contract = connection.execute('INSERT INTO contracts (name) VALUES (?)', (name,)).lastrowid
+
+        next_row = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM rows').fetchone()[0]
+        row_batch, cell_batch = [], []
+        for relation, lines in rows.items():
+            for line in lines:
+                row_batch.append((next_row, contract, relation, line))
+                cell_batch.extend((next_row, position, value) for position, value in enumerate(line.split('\t')))
+                next_row += 1
+                if len(cell_batch) >= INSERT_BATCH_SIZE:
+                    self._insert(row_batch, cell_batch)
+                    row_batch, cell_batch = [], []
+        self._insert(row_batch, cell_batch)
+
+    def _insert(self, row_batch, cell_batch) -> None:
+        self.connection.executemany('INSERT INTO rows VALUES (?, ?, ?, ?)', row_batch)
+        self.connection.executemany('INSERT INTO cells VALUES (?, ?, ?)', cell_batch)
+
+    def query(self, contract: t.Optional[str] = None, relation: t.Optional[str] = None,
+              values: t.Sequence[str] = (), position: t.Optional[int] = None,
+              limit: t.Optional[int] = None) -> t.List[Result]:
+        """
+        The tuples matching all the given criteria: of a contract, of a
+        relation, and with one of values (in the given column, if any).
+        """
+        joins, conditions, parameters = [], [], []
+        if values:
+            joins.append('JOIN cells ON cells.row = rows.id')
+            conditions.append('cells.value IN ({})'.format(', '.join('?' * len(values))))
+            parameters += values
+            if position is not None:
+                conditions.append('cells.position = ?')
+                parameters.append(position)
+        if contract is not None:
+            conditions.append('contracts.name = ?')
+            parameters.append(contract)
+        if relation is not None:
+            conditions.append('rows.relation = ?')
+            parameters.append(relation)
+        sql = 'SELECT DISTINCT contracts.name, rows.relation, rows.tuple, rows.id FROM rows ' \
+              'JOIN contracts ON contracts.id = rows.contract {} {} ORDER BY rows.id'.format(
+                  ' '.join(joins), 'WHERE ' + ' AND '.join(conditions) if conditions else '')
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        return [(name, rel, tuple(tup.split('\t'))) for name, rel, tup, _ in self.connection.execute(sql, parameters)]
+
+    def contracts(self, relation: t.Optional[str] = None, values: t.Sequence[str] = (),
+                  position: t.Optional[int] = None) -> t.List[str]:
+        """The names of the contracts with tuples matching the criteria, as for query."""
+        return sorted({name for name, _, _ in self.query(relation=relation, values=values, position=position)})
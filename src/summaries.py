@@ -0,0 +1,182 @@
+"""summaries.py: Canonical hashes of decompiled functions, and client results reused across contracts"""
+
+import hashlib
+import os
+import sqlite3
+import typing as t
+
+from src.cache import file_digest
+from src.tac import TACOutput
+
+FUNCTION_HASH_FILE = 'FunctionHash.csv'
+"""Output relation (function, hash) written next to the decompiler's outputs."""
+
+SUMMARY_STORE_ENV = 'GIGAHORSE_FUNCTION_SUMMARIES'
+"""Environment variable through which clients are given the path of the summary store."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (function_hash TEXT NOT NULL, client_hash TEXT NOT NULL,
+                                      summary TEXT NOT NULL, PRIMARY KEY (function_hash, client_hash));
+"""
+
+
+def function_hashes(tac: TACOutput) -> t.Dict[str, str]:
+    """
+    Maps each function of a decompiler output to a hash of its three-address
+    code that does not depend on where the function is in the contract:
+    blocks are numbered in program order, variables in order of first
+    occurrence, and constants pointing to blocks are replaced by their number.
+    Constants pointing to blocks of other functions, such as the targets of
+    calls, are replaced by the hash of that function and the block's number
+    in it, so hashes are computed bottom-up over the call graph. Recursive
+    functions are hashed together with every function in their cycles.
+    Functions with equal hashes have the same statements, data flow and
+    control flow, and call functions with equal hashes.
+    """
+    function_blocks = tac.function_blocks()
+    block_numbers = {function: {block: str(i) for i, block in enumerate(blocks)}
+                     for function, blocks in function_blocks.items()}
+    block_function = {block: function for function, blocks in function_blocks.items() for block in blocks}
+    formal_args = tac.positional('FormalArgs')
+    block_statements = tac.block_statements()
+
+    # The code of each function, with the blocks of other functions it refers to left out
+    texts: t.Dict[str, str] = {}
+    references: t.Dict[str, t.List[str]] = {}
+    for function, blocks in function_blocks.items():
+        numbers = block_numbers[function]
+        variables: t.Dict[str, str] = {}
+        referenced: t.List[str] = []
+
+        def variable(var: str) -> str:
+            if var not in variables:
+                variables[var] = 'v{}'.format(len(variables))
+            name = variables[var]
+            value = tac.variable_value(var)
+            if value is None:
+                return name
+            if value in numbers:
+                return '{}=B{}'.format(name, numbers[value])
+            if value in block_function:
+                referenced.append(value)
+                return '{}=B?'.format(name)
+            return '{}={}'.format(name, value)
+
+        lines = [' '.join(map(variable, formal_args.get(function, [])))]
+        for block in blocks:
+            lines.append('B' + numbers[block])
+            for stmt in block_statements.get(block, []):
+                lines.append('{} {} -> {}'.format(
+                    tac.op(stmt), ' '.join(map(variable, tac.uses(stmt))), ' '.join(map(variable, tac.defs(stmt)))
+                ))
+            lines.append('succ ' + ' '.join(sorted(numbers.get(s, '?') for s in tac.successors(block))))
+        texts[function] = '\n'.join(lines)
+        references[function] = referenced
+
+    callees = {function: {block_function[block] for block in referenced}
+               for function, referenced in references.items()}
+    reachable: t.Dict[str, t.Set[str]] = {}
+    for function in function_blocks:
+        seen, stack = set(), [function]
+        while stack:
+            for callee in callees[stack.pop()]:
+                if callee not in seen:
+                    seen.add(callee)
+                    stack.append(callee)
+        reachable[function] = seen
+
+    def local_digest(function: str) -> str:
+        return hashlib.sha256(texts[function].encode('utf-8')).hexdigest()
+
+    hashes: t.Dict[str, str] = {}
+
+    def function_hash(function: str) -> str:
+        if function in hashes:
+            return hashes[function]
+        # Functions calling each other (a strongly connected component of the call
+        # graph) are hashed together: references within the component by the code
+        # of their target, those to other functions by their (bottom-up) hash
+        component = {function} | {callee for callee in reachable[function] if function in reachable[callee]}
+        digests = {}
+        for member in component:
+            hasher = hashlib.sha256(texts[member].encode('utf-8'))
+            for block in references[member]:
+                callee = block_function[block]
+                callee_id = '~' + local_digest(callee) if callee in component else function_hash(callee)
+                hasher.update('\nB?={}:B{}'.format(callee_id, block_numbers[callee][block]).encode('utf-8'))
+            digests[member] = hasher.hexdigest()
+        if len(component) == 1:
+            hashes[function] = digests[function]
+        else:
+            component_digest = hashlib.sha256(' '.join(sorted(digests.values())).encode('utf-8')).hexdigest()
+            for member, digest in digests.items():
+                hashes[member] = hashlib.sha256('{} {}'.format(digest, component_digest).encode('utf-8')).hexdigest()
+        return hashes[function]
+
+    return {function: function_hash(function) for function in function_blocks}
+
+
+def write_function_hashes(out_dir: str, hashes: t.Dict[str, str]) -> None:
+    with open(os.path.join(out_dir, FUNCTION_HASH_FILE), 'w') as f:
+        f.writelines('{}\t{}\n'.format(function, h) for function, h in sorted(hashes.items()))
+
+
+def read_function_hashes(out_dir: str) -> t.Dict[str, str]:
+    """The hashes written by write_function_hashes, or {} if there are none."""
+    try:
+        with open(os.path.join(out_dir, FUNCTION_HASH_FILE)) as f:
+            return dict(line.rstrip('\n').split('\t') for line in f)
+    except FileNotFoundError:
+        return {}
+
+
+def client_hash(client_path: str) -> str:
+    """Identifies a version of a client, so that its summaries are not reused by other versions."""
+    return file_digest(client_path)
+
+
+class FunctionSummaryStore:
+    """
+    Results of clients for single functions, keyed by (function hash, client
+    hash), in an SQLite database shared by all the contracts of a run, and
+    across runs. A client looks up the functions of a contract before
+    analyzing them, and stores its results for the ones it had to analyze.
+    The first summary stored for a key is kept.
+
+    Usage:
+      store = FunctionSummaryStore(os.environ[SUMMARY_STORE_ENV])
+      hashes = read_function_hashes('.')
+      known = store.get_many(hashes.values(), client_hash(__file__))
+      store.put(hashes[function], client_hash(__file__), summary)
+    """
+
+    def __init__(self, path: str, timeout: float = 60):
+        # Every worker of a run writes to the store: wait for each other's transactions
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get(self, function_hash: str, client: str) -> t.Optional[str]:
+        row = self.connection.execute('SELECT summary FROM summaries WHERE function_hash = ? AND client_hash = ?',
+                                      (function_hash, client)).fetchone()
+        return None if row is None else row[0]
+
+    def get_many(self, function_hashes: t.Iterable[str], client: str) -> t.Dict[str, str]:
+        """Maps each of function_hashes that has a summary for client to it."""
+        function_hashes = list(set(function_hashes))
+        found = {}
+        # Stay below SQLite's limit on the number of parameters of a statement
+        for start in range(0, len(function_hashes), 500):
+            batch = function_hashes[start:start + 500]
+            found.update(self.connection.execute(
+                'SELECT function_hash, summary FROM summaries WHERE client_hash = ? AND function_hash IN ({})'.format(
+                    ', '.join('?' * len(batch))), [client] + batch))
+        return found
+
+    def put(self, function_hash: str, client: str, summary: str) -> None:
+        with self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO summaries VALUES (?, ?, ?)',
+                                    (function_hash, client, summary))
@@ -0,0 +1,206 @@
+"""synthetic.py: Generate synthetic EVM bytecode with tunable structure, for scalability testing"""
+
+import random
+import typing as t
+
+import src.opcodes as opcodes
+
+LABEL_PUSH = opcodes.PUSH2
+"""Opcode used to push jump targets, widened automatically for very large programs."""
+
+FILLER_UNIT = (("PUSH1", 0x01), ("PUSH1", 0x02), ("ADD", None), ("POP", None))
+"""Straight-line, stack-neutral code used to pad function bodies up to a target size."""
+
+FILLER_UNIT_SIZE = 6
+
+
+class Assembler:
+    """
+    A minimal two-pass EVM assembler supporting symbolic jump labels.
+    """
+
+    def __init__(self):
+        self._items = []
+        """List of (opcode, operand) pairs, operands being ints, labels or None."""
+
+    def op(self, name: str, value: t.Optional[int] = None) -> 'Assembler':
+        """Append an instruction. PUSH instructions take an integer operand."""
+        opcode = opcodes.opcode_by_name(name)
+        if opcode.is_push() != (value is not None):
+            raise ValueError("Operand mismatch for opcode {}".format(name))
+        self._items.append((opcode, value))
+        return self
+
+    def push_label(self, label: str) -> 'Assembler':
+        """Push the address of the given label."""
+        self._items.append((LABEL_PUSH, label))
+        return self
+
+    def label(self, label: str) -> 'Assembler':
+        """Mark the current position as a jump target (emits a JUMPDEST)."""
+        self._items.append((opcodes.JUMPDEST, label))
+        return self
+
+    def jump(self, label: str) -> 'Assembler':
+        return self.push_label(label).op("JUMP")
+
+    def jumpi(self, label: str) -> 'Assembler':
+        return self.push_label(label).op("JUMPI")
+
+    def __layout(self, label_push: opcodes.OpCode) -> t.Tuple[t.Dict[str, int], int]:
+        labels = {}
+        pc = 0
+        for opcode, value in self._items:
+            if opcode == opcodes.JUMPDEST and value is not None:
+                if value in labels:
+                    raise ValueError("Duplicate label {}".format(value))
+                labels[value] = pc
+            if opcode == LABEL_PUSH and isinstance(value, str):
+                pc += 1 + label_push.push_len()
+            else:
+                pc += 1 + opcode.push_len()
+        return labels, pc
+
+    def assemble(self) -> bytes:
+        """Resolve labels and return the encoded bytecode."""
+        label_push = LABEL_PUSH
+        labels, size = self.__layout(label_push)
+        if size > 0xffff:
+            label_push = opcodes.PUSH3
+            labels, size = self.__layout(label_push)
+
+        code = bytearray()
+        for opcode, value in self._items:
+            if opcode == LABEL_PUSH and isinstance(value, str):
+                opcode, value = label_push, labels[value]
+            code.append(opcode.code)
+            if opcode.is_push():
+                code += value.to_bytes(opcode.push_len(), "big")
+        return bytes(code)
+
+
+class SyntheticContractGenerator:
+    """
+    Emits valid, Solidity-shaped bytecode whose size and structure are
+    controlled by a handful of parameters:
+
+      num_functions: number of public functions reachable from the dispatcher.
+      call_depth: length of the chain of private function calls made by each
+        public function.
+      shared_functions: if non-zero, the number of private call chains, shared
+        round-robin by the public functions, so that many call sites share the
+        same callees and return-address blocks. Otherwise every public function
+        gets its own private call chain.
+      loops: number of counted loops in the body of each public function.
+      code_size: minimum size of the generated code in bytes, reached by padding
+        public function bodies with straight-line code.
+      seed: seed used to generate function selectors.
+    """
+
+    def __init__(self, num_functions: int = 1, call_depth: int = 1, shared_functions: int = 0,
+                 loops: int = 0, code_size: int = 0, seed: int = 0):
+        if num_functions < 0 or call_depth < 0 or shared_functions < 0 or loops < 0:
+            raise ValueError("Generator parameters must be non-negative")
+        self.num_functions = num_functions
+        self.call_depth = call_depth
+        self.shared_functions = shared_functions
+        self.loops = loops
+        self.code_size = code_size
+        self.selectors = self.__make_selectors(num_functions, seed)
+
+    @staticmethod
+    def __make_selectors(n: int, seed: int) -> t.List[int]:
+        rng = random.Random(seed)
+        selectors = set()
+        while len(selectors) < n:
+            selectors.add(rng.getrandbits(32))
+        return sorted(selectors)
+
+    def private_chain(self, function_index: int) -> t.List[str]:
+        """Labels of the private functions called (in nesting order) by a public function."""
+        if self.shared_functions:
+            chain = function_index % self.shared_functions
+            return ["shared_{}_{}".format(chain, d) for d in range(self.call_depth)]
+        return ["private_{}_{}".format(function_index, d) for d in range(self.call_depth)]
+
+    def __emit_dispatcher(self, asm: Assembler) -> None:
+        asm.op("PUSH1", 0x80).op("PUSH1", 0x40).op("MSTORE")
+        asm.op("PUSH1", 0x04).op("CALLDATASIZE").op("LT").jumpi("fallback")
+        asm.op("PUSH1", 0x00).op("CALLDATALOAD").op("PUSH1", 0xe0).op("SHR")
+        for i, selector in enumerate(self.selectors):
+            asm.op("DUP1").op("PUSH4", selector).op("EQ").jumpi("public_{}".format(i))
+        asm.label("fallback").op("PUSH1", 0x00).op("DUP1").op("REVERT")
+
+    def __emit_loop(self, asm: Assembler, name: str, filler: int) -> None:
+        asm.op("PUSH1", 0x00)
+        asm.label(name + "_head")
+        asm.op("PUSH1", 0x10).op("DUP2").op("LT").op("ISZERO").jumpi(name + "_exit")
+        self.__emit_filler(asm, filler)
+        asm.op("PUSH1", 0x01).op("ADD").jump(name + "_head")
+        asm.label(name + "_exit").op("POP")
+
+    @staticmethod
+    def __emit_filler(asm: Assembler, units: int) -> None:
+        for _ in range(units):
+            for name, value in FILLER_UNIT:
+                asm.op(name, value)
+
+    def __emit_public_function(self, asm: Assembler, index: int, filler: int) -> None:
+        name = "public_{}".format(index)
+        asm.label(name)
+        loop_filler, body_filler = divmod(filler, self.loops + 1)
+        for loop in range(self.loops):
+            self.__emit_loop(asm, "{}_loop_{}".format(name, loop), loop_filler)
+        self.__emit_filler(asm, body_filler + loop_filler)
+        chain = self.private_chain(index)
+        if chain:
+            # Stack: [ret, arg], callee leaves [result]
+            asm.push_label(name + "_ret").op("PUSH1", 0x04).op("CALLDATALOAD").jump(chain[0])
+            asm.label(name + "_ret")
+        else:
+            asm.op("PUSH1", 0x04).op("CALLDATALOAD")
+        asm.op("PUSH1", 0x00).op("MSTORE").op("PUSH1", 0x20).op("PUSH1", 0x00).op("RETURN")
+
+    def __emit_private_function(self, asm: Assembler, label: str, callee: t.Optional[str]) -> None:
+        # On entry the stack is [ret, arg]
+        asm.label(label)
+        asm.op("PUSH1", 0x01).op("ADD")
+        if callee is not None:
+            asm.push_label(label + "_ret").op("SWAP1").jump(callee)
+            asm.label(label + "_ret")
+        asm.op("SWAP1").op("JUMP")
+
+    def __private_functions(self) -> t.List[t.Tuple[str, t.Optional[str]]]:
+        """(label, callee label) pairs of all private functions, in emission order."""
+        if self.shared_functions:
+            owners = range(min(self.shared_functions, self.num_functions))
+        else:
+            owners = range(self.num_functions)
+        functions = []
+        for i in owners:
+            chain = self.private_chain(i)
+            for d, label in enumerate(chain):
+                functions.append((label, chain[d + 1] if d + 1 < len(chain) else None))
+        return functions
+
+    def __build(self, filler: int) -> bytes:
+        asm = Assembler()
+        self.__emit_dispatcher(asm)
+        per_function, extra = divmod(filler, max(self.num_functions, 1))
+        for i in range(self.num_functions):
+            self.__emit_public_function(asm, i, per_function + int(i < extra))
+        for label, callee in self.__private_functions():
+            self.__emit_private_function(asm, label, callee)
+        return asm.assemble()
+
+    def generate(self) -> bytes:
+        """Return the generated bytecode."""
+        code = self.__build(0)
+        missing = self.code_size - len(code)
+        if missing > 0 and self.num_functions > 0:
+            code = self.__build(-(-missing // FILLER_UNIT_SIZE))
+        return code
+
+    def generate_hex(self) -> str:
+        """Return the generated bytecode as a hex string, in the format of .hex contract files."""
+        return self.generate().hex()
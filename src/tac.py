@@ -0,0 +1,211 @@
+"""tac.py: Indexed, memory-efficient loading of decompiler (three-address code) output relations"""
+
+import os
+import typing as t
+from array import array
+from collections import defaultdict
+
+
+LOAD_CHUNK_SIZE = 1 << 20
+"""Approximate number of bytes of a relation file parsed at a time."""
+
+
+class SymbolTable:
+    """Interns strings as dense integer ids, shared by all relations of an output directory."""
+
+    def __init__(self):
+        self._ids: t.Dict[str, int] = {}
+        self._symbols: t.List[str] = []
+
+    def intern(self, symbol: str) -> int:
+        try:
+            return self._ids[symbol]
+        except KeyError:
+            symbol_id = self._ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            return symbol_id
+
+    def id(self, symbol: str) -> t.Optional[int]:
+        """The id of an already interned symbol, or None."""
+        return self._ids.get(symbol)
+
+    def __getitem__(self, symbol_id: int) -> str:
+        return self._symbols[symbol_id]
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+
+class Relation:
+    """
+    A relation stored column-wise, as arrays of interned symbol ids.
+    Indexes on a column are built on first use.
+    """
+
+    def __init__(self, symbols: SymbolTable, arity: int = 0):
+        self.symbols = symbols
+        self.columns = [array('l') for _ in range(arity)]
+        self._indexes: t.Dict[int, t.Dict[int, array]] = {}
+
+    @property
+    def arity(self) -> int:
+        return len(self.columns)
+
+    def append(self, row: t.Sequence[str]) -> None:
+        self.extend([row])
+
+    def extend(self, rows: t.Sequence[t.Sequence[str]]) -> None:
+        """Append rows, interning column by column."""
+        if not rows:
+            return
+        if not self.columns:
+            self.columns = [array('l') for _ in rows[0]]
+        intern = self.symbols.intern
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(map(intern, values))
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def row(self, i: int) -> t.Tuple[str, ...]:
+        symbols = self.symbols
+        return tuple(symbols[column[i]] for column in self.columns)
+
+    def __iter__(self) -> t.Iterator[t.Tuple[str, ...]]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def index(self, column: int = 0) -> t.Dict[int, array]:
+        """Maps each symbol id of the given column to the row numbers it appears in."""
+        if column not in self._indexes:
+            index = defaultdict(lambda: array('l'))
+            for i, symbol_id in enumerate(self.columns[column]):
+                index[symbol_id].append(i)
+            self._indexes[column] = dict(index)
+        return self._indexes[column]
+
+    def lookup(self, key: str, column: int = 0) -> t.List[t.Tuple[str, ...]]:
+        """All rows whose given column equals key."""
+        key_id = self.symbols.id(key)
+        if key_id is None or not self.columns:
+            return []
+        return [self.row(i) for i in self.index(column).get(key_id, ())]
+
+    def project(self, column: int) -> t.Iterator[str]:
+        symbols = self.symbols
+        return (symbols[symbol_id] for symbol_id in self.columns[column]) if self.columns else iter(())
+
+    def to_dict(self, key: int = 0, value: int = 1) -> t.Dict[str, str]:
+        """Maps the key column to the value column; the last row wins for duplicate keys."""
+        return dict(zip(self.project(key), self.project(value)))
+
+    def to_multidict(self, key: int = 0, value: int = 1) -> t.Dict[str, t.Set[str]]:
+        out = defaultdict(set)
+        for k, v in zip(self.project(key), self.project(value)):
+            out[k].add(v)
+        return dict(out)
+
+
+def pc_sort_key(stmt: str) -> int:
+    """Sort key for statement and block ids, e.g. 0x1a or 0x1a0x2b_3, by their leading hex number."""
+    try:
+        return int(stmt.split('0x')[1].split('_')[0], 16)
+    except (IndexError, ValueError):
+        return 0
+
+
+class TACOutput:
+    """
+    Lazy, indexed view of a decompiler output directory. Relations are named
+    after their files (e.g. "TAC_Op" for TAC_Op.csv) and are read on first use;
+    missing files are treated as empty relations.
+    """
+
+    def __init__(self, out_dir: str = '.'):
+        self.out_dir = out_dir
+        self.symbols = SymbolTable()
+        self._relations: t.Dict[str, Relation] = {}
+        self._cache: t.Dict[str, t.Any] = {}
+
+    def relation(self, name: str) -> Relation:
+        if name not in self._relations:
+            relation = Relation(self.symbols)
+            try:
+                with open(os.path.join(self.out_dir, name + '.csv')) as f:
+                    while True:
+                        lines = f.readlines(LOAD_CHUNK_SIZE)
+                        if not lines:
+                            break
+                        relation.extend([line.rstrip('\n\r').split('\t') for line in lines])
+            except FileNotFoundError:
+                pass
+            self._relations[name] = relation
+        return self._relations[name]
+
+    __getitem__ = relation
+
+    def _cached(self, key: str, compute: t.Callable[[], t.Any]) -> t.Any:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def positional(self, name: str) -> t.Dict[str, t.List[str]]:
+        """
+        For (stmt, value, n) relations such as TAC_Use, TAC_Def and FormalArgs:
+        maps each stmt to its values ordered by n. Negative positions are appended.
+        """
+        def compute():
+            out = defaultdict(list)
+            for stmt, value, n in self.relation(name):
+                n = int(n)
+                values = out[stmt]
+                while n > len(values) - 1:
+                    values.append('')
+                if n < 0:
+                    values.append(value)
+                else:
+                    values[n] = value
+            return dict(out)
+        return self._cached('positional:' + name, compute)
+
+    def block_statements(self) -> t.Dict[str, t.List[str]]:
+        """Maps each block to its statements, in program order."""
+        def compute():
+            out = defaultdict(list)
+            for stmt, block in self.relation('TAC_Block'):
+                out[block].append(stmt)
+            return {block: sorted(stmts, key=pc_sort_key) for block, stmts in out.items()}
+        return self._cached('block_statements', compute)
+
+    def successors(self, block: str, edges: str = 'LocalBlockEdge') -> t.List[str]:
+        return [to for _, to in self.relation(edges).lookup(block, 0)]
+
+    def predecessors(self, block: str, edges: str = 'LocalBlockEdge') -> t.List[str]:
+        return [fro for fro, _ in self.relation(edges).lookup(block, 1)]
+
+    def op(self, stmt: str) -> t.Optional[str]:
+        return self._cached('op', lambda: self.relation('TAC_Op').to_dict()).get(stmt)
+
+    def variable_value(self, var: str) -> t.Optional[str]:
+        return self._cached('value', lambda: self.relation('TAC_Variable_Value').to_dict()).get(var)
+
+    def uses(self, stmt: str) -> t.List[str]:
+        return self.positional('TAC_Use').get(stmt, [])
+
+    def defs(self, stmt: str) -> t.List[str]:
+        return self.positional('TAC_Def').get(stmt, [])
+
+    def function_of(self, block: str) -> t.Optional[str]:
+        return self._cached('in_function', lambda: self.relation('InFunction').to_dict()).get(block)
+
+    def function_name(self, function: str) -> t.Optional[str]:
+        return self._cached('function_name', lambda: self.relation('HighLevelFunctionName').to_dict()).get(function)
+
+    def function_blocks(self) -> t.Dict[str, t.List[str]]:
+        """Maps each function to its blocks, in program order."""
+        def compute():
+            out = defaultdict(list)
+            for block, function in self.relation('InFunction'):
+                out[function].append(block)
+            return {f: sorted(blocks, key=pc_sort_key) for f, blocks in out.items()}
+        return self._cached('function_blocks', compute)
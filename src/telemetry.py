@@ -0,0 +1,175 @@
+"""telemetry.py: Live progress counters and latency histograms for batch runs"""
+
+import json
+import math
+import os
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.sharedctypes import RawArray
+
+STAGES = ('disassemble', 'decomp', 'client')
+"""Stages of the analysis of a single contract, as timed by the driver."""
+
+OUTCOMES = ('completed', 'failed', 'timeout')
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, math.inf)
+"""Upper bounds (in seconds) of the stage latency histogram buckets."""
+
+
+class BatchTelemetry:
+    """
+    Progress counters and per-stage latency histograms shared between the
+    driver and its worker processes.
+
+    Counters live in shared memory, partitioned in one row per job slot. A slot
+    is only ever written by the worker currently holding that job index (or by
+    the driver, once that worker is dead), so updates need neither locks nor a
+    round-trip through the multiprocessing Manager. Readers sum over all rows.
+    """
+
+    def __init__(self, num_slots: int):
+        """
+        Args:
+          num_slots: the number of job slots, i.e. the maximum number of concurrent workers.
+        """
+        self.num_slots = num_slots
+        self._histogram_size = len(LATENCY_BUCKETS) + 1  # buckets, then the sum
+        self._row_size = len(OUTCOMES) + len(STAGES) * self._histogram_size
+        self._counters = RawArray('d', num_slots * self._row_size)
+
+        self.start_time = time.time()
+        self.total: t.Optional[int] = None
+        """Number of contracts in the batch, if known. Only maintained by the driver."""
+        self.dispatched = 0
+        self.running = 0
+
+    def _offset(self, slot: int) -> int:
+        if not 0 <= slot < self.num_slots:
+            raise IndexError("No job slot {}".format(slot))
+        return slot * self._row_size
+
+    def record_outcome(self, slot: int, outcome: str) -> None:
+        self._counters[self._offset(slot) + OUTCOMES.index(outcome)] += 1
+
+    def outcomes(self, slot: int) -> int:
+        """The number of outcomes recorded in a slot, to tell whether its current worker has recorded one."""
+        base = self._offset(slot)
+        return int(sum(self._counters[base:base + len(OUTCOMES)]))
+
+    def record_stage(self, slot: int, stage: str, seconds: float) -> None:
+        base = self._offset(slot) + len(OUTCOMES) + STAGES.index(stage) * self._histogram_size
+        bucket = next(i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound)
+        self._counters[base + bucket] += 1
+        self._counters[base + len(LATENCY_BUCKETS)] += seconds
+
+    def snapshot(self) -> t.Dict[str, t.Any]:
+        """Aggregate all slots into a JSON-serializable summary."""
+        totals = [0.0] * self._row_size
+        counters = self._counters[:]
+        for slot in range(self.num_slots):
+            row = counters[slot * self._row_size:(slot + 1) * self._row_size]
+            totals = [a + b for a, b in zip(totals, row)]
+
+        outcomes = {o: int(totals[i]) for i, o in enumerate(OUTCOMES)}
+        stages = {}
+        for i, stage in enumerate(STAGES):
+            base = len(OUTCOMES) + i * self._histogram_size
+            buckets = [int(c) for c in totals[base:base + len(LATENCY_BUCKETS)]]
+            stages[stage] = {
+                'buckets': buckets,
+                'count': sum(buckets),
+                'sum': totals[base + len(LATENCY_BUCKETS)],
+            }
+
+        elapsed = time.time() - self.start_time
+        finished = sum(outcomes.values())
+        return {
+            'elapsed': elapsed,
+            'total': self.total,
+            'pending': None if self.total is None else self.total - self.dispatched,
+            'running': self.running,
+            'outcomes': outcomes,
+            'throughput': finished / elapsed if elapsed > 0 else 0.0,
+            'stages': stages,
+        }
+
+    def render_prometheus(self) -> str:
+        """Render a snapshot in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = [
+            '# HELP gigahorse_contracts_total Contracts finished, by outcome.',
+            '# TYPE gigahorse_contracts_total counter',
+        ]
+        for outcome, count in snap['outcomes'].items():
+            lines.append('gigahorse_contracts_total{{outcome="{}"}} {}'.format(outcome, count))
+
+        lines += [
+            '# HELP gigahorse_stage_seconds Per-contract latency of each analysis stage.',
+            '# TYPE gigahorse_stage_seconds histogram',
+        ]
+        for stage, hist in snap['stages'].items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, hist['buckets']):
+                cumulative += count
+                le = '+Inf' if math.isinf(bound) else str(bound)
+                lines.append('gigahorse_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(stage, le, cumulative))
+            lines.append('gigahorse_stage_seconds_sum{{stage="{}"}} {}'.format(stage, hist['sum']))
+            lines.append('gigahorse_stage_seconds_count{{stage="{}"}} {}'.format(stage, hist['count']))
+
+        gauges = (
+            ('pending_contracts', 'Contracts not yet dispatched.', snap['pending']),
+            ('running_contracts', 'Contracts currently being analysed.', snap['running']),
+            ('throughput_contracts_per_second', 'Finished contracts per second since the start of the run.', snap['throughput']),
+            ('elapsed_seconds', 'Seconds since the start of the run.', snap['elapsed']),
+        )
+        for name, help_text, value in gauges:
+            if value is None:
+                continue
+            lines.append('# HELP gigahorse_{} {}'.format(name, help_text))
+            lines.append('# TYPE gigahorse_{} gauge'.format(name))
+            lines.append('gigahorse_{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+    def write_stats_file(self, path: str) -> None:
+        """Atomically (re)write a JSON snapshot to path."""
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    def start_stats_file_writer(self, path: str, period: float = 1.0) -> threading.Thread:
+        """Rewrite the stats file every period seconds from a daemon thread."""
+        def loop():
+            while True:
+                self.write_stats_file(path)
+                time.sleep(period)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def start_http_server(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve the Prometheus rendering at /metrics from a daemon thread."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+import unittest
+from multiprocessing import Pool
+
+from src.cache import CompiledProgramCache, link_or_copy, program_key, write_program_key
+from src.fastpath import cache_key
+from src.stages import StageCache, TRANSFORM_INPUTS
+
+
+def _build_counting(args):
+    cache_dir, counter = args
+    def build(path):
+        with open(counter, 'a') as f:
+            f.write('x')
+        time.sleep(0.05)
+        with open(path, 'w') as f:
+            f.write('binary')
+    return CompiledProgramCache(cache_dir).get_or_build('k', build)
+
+
+class CompiledProgramCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CompiledProgramCache(os.path.join(self.tmp.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_inputs(self):
+        functors = os.path.join(self.tmp.name, 'libfunctors.so')
+        with open(functors, 'w') as f:
+            f.write('v1')
+        key = self.cache.key('program', 'no-such-souffle', functors, 'A=1')
+
+        self.assertEqual(key, self.cache.key('program', 'no-such-souffle', functors, 'A=1'))
+        self.assertNotEqual(key, self.cache.key('program2', 'no-such-souffle', functors, 'A=1'))
+        self.assertNotEqual(key, self.cache.key('program', 'no-such-souffle', functors, 'A=2'))
+        with open(functors, 'w') as f:
+            f.write('v2')
+        self.assertNotEqual(key, self.cache.key('program', 'no-such-souffle', functors, 'A=1'))
+
+    def test_concurrent_builds_compile_once(self):
+        counter = os.path.join(self.tmp.name, 'builds')
+        with Pool(4) as pool:
+            paths = pool.map(_build_counting, [(self.cache.cache_dir, counter)] * 4)
+
+        self.assertEqual(len(set(paths)), 1)
+        with open(counter) as f:
+            self.assertEqual(f.read(), 'x')
+        with open(paths[0]) as f:
+            self.assertEqual(f.read(), 'binary')
+
+    def test_failed_build_publishes_nothing(self):
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('partial')
+            raise AssertionError("Compilation failed. Stopping.")
+
+        with self.assertRaises(AssertionError):
+            self.cache.get_or_build('k', build)
+        self.assertIsNone(self.cache.lookup('k'))
+        self.assertEqual([e.name for e in self.cache.entries()], [])
+
+    def test_lru_eviction(self):
+        cache = CompiledProgramCache(self.cache.cache_dir, max_size=20)
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('x' * 8)
+        for key, mtime in (('a', 1), ('b', 2)):
+            cache.get_or_build(key, build)
+            os.utime(cache.path(key), (mtime, mtime))
+        cache.lookup('a')
+        cache.get_or_build('c', build)
+
+        self.assertEqual(sorted(e.name for e in cache.entries()), ['a', 'c'])
+
+
+    def test_byproducts_are_counted_and_evicted(self):
+        cache = CompiledProgramCache(self.cache.cache_dir, max_size=20)
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('x' * 4)
+            with open(path + '.cpp', 'w') as f:
+                f.write('x' * 8)
+        cache.get_or_build('a', build)
+        os.utime(cache.path('a'), (1, 1))
+        cache.get_or_build('b', build)
+
+        self.assertEqual(cache.size('b'), 12)
+        self.assertEqual(sorted(os.listdir(cache.cache_dir)), ['b', 'b.cpp', 'b.lock'])
+
+    def test_entries_in_use_are_not_evicted(self):
+        cache = CompiledProgramCache(self.cache.cache_dir, max_size=10)
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('x' * 8)
+        cache.get_or_build('a', build)
+        os.utime(cache.path('a'), (1, 1))
+        with cache._locked('a'):
+            cache.get_or_build('b', build)
+            self.assertEqual(sorted(e.name for e in cache.entries()), ['a', 'b'])
+        cache.get_or_build('c', build, os.path.join(self.tmp.name, 'decompiler_compiled'))
+
+        self.assertEqual(sorted(os.listdir(cache.cache_dir)), ['c', 'c.lock'])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'decompiler_compiled')))
+
+    def test_linked_binary_survives_eviction(self):
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('binary')
+        executable = os.path.join(self.tmp.name, 'decompiler_compiled')
+        link_or_copy(self.cache.get_or_build('k', build), executable)
+        os.remove(self.cache.path('k'))
+
+        with open(executable) as f:
+            self.assertEqual(f.read(), 'binary')
+
+
+    def test_output_caches_follow_the_program(self):
+        def build(path):
+            with open(path, 'w') as f:
+                f.write('binary')
+        executable = os.path.join(self.tmp.name, 'decompiler_compiled')
+        stage_keys, fast_path_keys = set(), set()
+        for program in ('program', 'program2'):
+            key = self.cache.key(program, 'no-such-souffle', 'no-such-functors', 'A=1')
+            link_or_copy(self.cache.get_or_build(key, build), executable)
+            write_program_key(executable, key)
+
+            self.assertEqual(program_key(executable), key)
+            stage_keys.add(StageCache.key(program_key(executable), self.tmp.name, TRANSFORM_INPUTS))
+            fast_path_keys.add(cache_key('eip1167', program_key(executable), 4))
+
+        self.assertEqual(len(stage_keys), 2)
+        self.assertEqual(len(fast_path_keys), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
 from os.path import abspath, dirname, join
 
-rubus_dir = join(dirname(abspath(__file__)), '..', '..', 'tests/core-decompiler/rubus-token-0x876/')
+rubus_dir = abspath(join(dirname(abspath(__file__)), '..', '..', 'tests/core-decompiler/rubus-token-0x876/'))
 rubus_bytecode_path = abspath(join(rubus_dir, '0x876a11639ce3d2bba1712fc9f47bd6faee575ad4.hex'))
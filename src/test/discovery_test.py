@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from src.discovery import Lookahead, contract_inputs, discover_contracts, read_contract_list, record_contract_list
+
+
+class DiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for path in ('a.hex', 'notes.txt', 'sub/b.hex', 'sub/deeper/c.hex'):
+            self.touch(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def touch(self, path):
+        path = os.path.join(self.tmp.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+
+    def relative(self, paths):
+        return sorted(os.path.relpath(path, self.tmp.name) for path in paths)
+
+    def test_discover_recursively(self):
+        self.assertEqual(self.relative(discover_contracts([self.tmp.name], '.*.hex')),
+                         ['a.hex', 'sub/b.hex', 'sub/deeper/c.hex'])
+        self.assertEqual(self.relative(discover_contracts([self.tmp.name], '.*/sub/.*.hex')),
+                         ['sub/b.hex', 'sub/deeper/c.hex'])
+
+    def test_discover_files(self):
+        notes = os.path.join(self.tmp.name, 'notes.txt')
+        self.assertEqual(list(discover_contracts([notes], '.*.hex')), [])
+        self.assertEqual(list(discover_contracts([notes], '.*')), [notes])
+
+    def test_archives_are_expanded(self):
+        dump = os.path.join(self.tmp.name, 'dump.jsonl')
+        with open(dump, 'w') as f:
+            f.write('{"address": "0xab", "bytecode": "00"}\n')
+        a = os.path.join(self.tmp.name, 'a.hex')
+
+        self.assertEqual(list(discover_contracts([dump], '.*.hex')), [dump])
+        self.assertEqual(list(contract_inputs([a, dump])), [('a', a, None), ('0xab', None, '00')])
+
+    def test_contract_list(self):
+        list_file = os.path.join(self.tmp.name, 'contracts.txt')
+        recorded = record_contract_list(iter(['x.hex', 'y.hex']), list_file)
+        self.assertEqual(next(recorded), 'x.hex')
+        self.assertFalse(os.path.exists(list_file))
+        self.assertEqual(list(recorded), ['y.hex'])
+        self.assertEqual(list(read_contract_list(list_file)), ['x.hex', 'y.hex'])
+
+
+class LookaheadTest(unittest.TestCase):
+    def test_remaining(self):
+        items = Lookahead(iter(range(5)))
+        self.assertEqual(next(items), 0)
+        self.assertEqual(items.remaining(2), 2)
+        self.assertEqual(next(items), 1)
+        self.assertEqual(items.remaining(10), 3)
+        self.assertEqual(list(items), [2, 3, 4])
+        self.assertEqual(items.remaining(10), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import src.blockparse as blockparse
+import src.exporter as exporter
+from src.test.common import rubus_bytecode_path
+
+
+class InstructionTsvExporterTest(unittest.TestCase):
+    def setUp(self):
+        with open(rubus_bytecode_path) as f:
+            self.bytecode = f.read().strip()
+        self.blocks = blockparse.EVMBytecodeParser(self.bytecode).parse()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, *path):
+        with open(os.path.join(self.tmp.name, *path)) as f:
+            return f.read()
+
+    def test_facts(self):
+        exporter.InstructionTsvExporter(self.blocks).export(output_dir=self.tmp.name, bytecode_hex=self.bytecode)
+
+        opcodes = [line.split('\t') for line in self.read('Statement_Opcode.facts').splitlines()]
+        next_facts = [line.split('\t') for line in self.read('Statement_Next.facts').splitlines()]
+        ops = [op for block in self.blocks for op in block.evm_ops]
+
+        self.assertEqual(opcodes[0], ['0x0', 'PUSH1'])
+        self.assertEqual(len(opcodes), len(ops))
+        self.assertEqual(next_facts, [[a[0], b[0]] for a, b in zip(opcodes, opcodes[1:])])
+        self.assertEqual(self.read('PushValue.facts').splitlines()[0], '0x0\t0x60')
+
+    def test_lazy_disassembly(self):
+        exporter.InstructionTsvExporter(self.blocks).export(output_dir=self.tmp.name, bytecode_hex=self.bytecode)
+        eager = self.read('contract.dasm')
+        os.remove(os.path.join(self.tmp.name, 'contract.dasm'))
+
+        exporter.InstructionTsvExporter(self.blocks).export(output_dir=self.tmp.name, bytecode_hex=self.bytecode, dasm=False)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'contract.dasm')))
+
+        exporter.write_disassembly(self.tmp.name)
+        self.assertEqual(self.read('contract.dasm'), eager)
+        self.assertTrue(eager.startswith('    0x0: PUSH1     0x60\n'))
+
+    def test_out_of_order_statements(self):
+        blocks = list(reversed(self.blocks))
+        with self.assertRaises(ValueError):
+            exporter.InstructionTsvExporter(blocks).export(output_dir=self.tmp.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import gzip
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+import src.factgen as factgen
+from src.test.common import rubus_dir
+
+
+class BatchFactGenerationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_directory_to_dirs(self):
+        inputs = list(factgen.batch_inputs(rubus_dir))
+        done, errors, profile = factgen.batch_generate(inputs, self.tmp.name, jobs=2)
+
+        self.assertEqual(done, 2)
+        self.assertEqual(errors, [])
+        self.assertEqual(profile.counts['ops'], profile.counts['statements'])
+        for name, _, _ in inputs:
+            self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, name, 'Statement_Opcode.facts')))
+
+    def test_inputs_are_read_a_window_ahead(self):
+        out_dir = os.path.join(self.tmp.name, 'facts')
+        leads = []
+
+        def inputs():
+            for i in range(200):
+                # contracts read so far, less the ones whose facts are written
+                leads.append(i - len(os.listdir(out_dir)))
+                yield 'c{}'.format(i), None, '6001600201'
+
+        done, errors, _ = factgen.batch_generate(inputs(), out_dir, jobs=1, dasm=False)
+
+        self.assertEqual((done, errors), (200, []))
+        self.assertLessEqual(max(leads), 2 * factgen.BATCH_CHUNKSIZE)
+
+    def test_code_size(self):
+        self.assertEqual(factgen.code_size('0x6001\n'), 2)
+        self.assertEqual(factgen.code_size('6001'), 2)
+
+    def test_sharded_archive(self):
+        inputs = [('a', None, '6001600201'), ('b', None, '00'), ('bad', None, 'zz')]
+        done, errors, _ = factgen.batch_generate(inputs, self.tmp.name, jobs=2, shards=2, dasm=False)
+
+        self.assertEqual(done, 2)
+        self.assertEqual([name for name, _ in errors], ['bad'])
+        members = set()
+        for i in range(2):
+            with tarfile.open(os.path.join(self.tmp.name, 'facts-{:03d}.tar'.format(i))) as archive:
+                members.update(archive.getnames())
+        self.assertIn('a/Statement_Opcode.facts', members)
+        self.assertIn('b/PushValue.facts', members)
+        self.assertNotIn('a/contract.dasm', members)
+
+    def test_list_file(self):
+        list_path = os.path.join(self.tmp.name, 'contracts.txt')
+        with open(list_path, 'w') as f:
+            f.write('/some/dir/first.hex\n\n/other/second.hex\n')
+
+        self.assertEqual(list(factgen.batch_inputs(list_path)), [
+            ('first', '/some/dir/first.hex', None),
+            ('second', '/other/second.hex', None),
+        ])
+
+
+class ArchiveInputsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_jsonl(self):
+        with gzip.open(self.path('dump.jsonl.gz'), 'wt') as f:
+            f.write(json.dumps({'address': '0xab', 'bytecode': '0x6001\n'}) + '\n\n')
+            f.write(json.dumps({'code': '00', 'bytecode': None}) + '\n')
+
+        self.assertTrue(factgen.is_archive(self.path('dump.jsonl.gz')))
+        self.assertEqual(list(factgen.batch_inputs(self.path('dump.jsonl.gz'))),
+                         [('0xab', None, '0x6001'), ('contract2', None, '')])
+        self.assertEqual(list(factgen.archive_inputs(self.path('dump.jsonl.gz'), name_field='code')),
+                         [('contract0', None, '0x6001'), ('00', None, '')])
+
+    def test_jsonl_names_stay_in_the_output_directory(self):
+        with open(self.path('dump.jsonl'), 'w') as f:
+            for address in ('../../x', '/tmp/y.hex', 'a/b', '..'):
+                f.write(json.dumps({'address': address, 'bytecode': '00'}) + '\n')
+
+        self.assertEqual([name for name, _, _ in factgen.archive_inputs(self.path('dump.jsonl'))],
+                         ['x', 'y', 'b', 'contract3'])
+
+    def test_tar_and_zip(self):
+        with tarfile.open(self.path('contracts.tar.gz'), 'w:gz') as archive:
+            for name, data in (('dir/a.hex', b'6001\n'), ('README', b'text')):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        with zipfile.ZipFile(self.path('contracts.zip'), 'w') as archive:
+            archive.writestr('b.hex', '00')
+            archive.writestr('sub/', '')
+
+        self.assertEqual(list(factgen.archive_inputs(self.path('contracts.tar.gz'))), [('a', None, '6001')])
+        self.assertEqual(list(factgen.archive_inputs(self.path('contracts.zip'))), [('b', None, '00')])
+        self.assertFalse(factgen.is_archive(self.path('a.hex')))
+
+
+if __name__ == '__main__':
+    unittest.main()
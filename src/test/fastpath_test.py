@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from src.fastpath import available, recognize, instantiate
+
+PROXY_PREFIX = '363d3d373d3d3d363d'
+PROXY_SUFFIX = '5af43d82803e903d91602b57fd5bf3'
+
+
+class FastPathTest(unittest.TestCase):
+    def test_empty_code(self):
+        self.assertEqual(recognize(''), ('empty', '', {}))
+        self.assertEqual(recognize('0x'), ('empty', '', {}))
+
+    def test_not_available_when_staged(self):
+        # --staged compiles the stages, not the decompiler the fast path caches outputs of
+        ready = threading.Event()
+        ready.set()
+        staged = {'decompiler_transform_compiled': ready, 'decompiler_global_compiled': ready}
+
+        self.assertIsNotNone(recognize(''))
+        self.assertFalse(available(staged, 'decompiler_compiled'))
+        self.assertTrue(available({'decompiler_compiled': ready}, 'decompiler_compiled'))
+        self.assertFalse(available({'decompiler_compiled': threading.Event()}, 'decompiler_compiled'))
+
+    def test_minimal_proxy(self):
+        template, canonical, substitutions = recognize('0x' + PROXY_PREFIX + '73' + '12' * 20 + PROXY_SUFFIX)
+
+        self.assertEqual(template, 'eip1167')
+        self.assertEqual(canonical, PROXY_PREFIX + '73' + 'be' * 20 + PROXY_SUFFIX)
+        self.assertEqual(substitutions, {'0x' + 'be' * 20: '0x' + '12' * 20})
+
+    def test_vanity_minimal_proxy(self):
+        # A 15 byte address moves the JUMPDEST, and so the JUMPI target, 5 bytes earlier
+        template, canonical, _ = recognize(PROXY_PREFIX + '6e' + '12' * 15 + PROXY_SUFFIX.replace('602b', '6026'))
+
+        self.assertEqual(template, 'eip1167_push15')
+        self.assertIn('6e' + 'be' * 15, canonical)
+
+    def test_other_code(self):
+        self.assertIsNone(recognize('6000'))
+        # wrong JUMPI target
+        self.assertIsNone(recognize(PROXY_PREFIX + '73' + '12' * 20 + PROXY_SUFFIX.replace('602b', '602c')))
+        # too large to be a template
+        self.assertIsNone(recognize(PROXY_PREFIX + '73' + '12' * 20 + PROXY_SUFFIX + '00'))
+
+    def test_instantiate(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            with open(os.path.join(out_dir, 'TAC_Variable_Value.csv'), 'w') as f:
+                f.write('v1\t0xbebe\nv2\t0x2b\n')
+            with open(os.path.join(out_dir, 'TAC_Op.csv'), 'w') as f:
+                f.write('s1\tGAS\n')
+
+            instantiate(out_dir, {'0xbebe': '0x1212'})
+
+            with open(os.path.join(out_dir, 'TAC_Variable_Value.csv')) as f:
+                self.assertEqual(f.read(), 'v1\t0x1212\nv2\t0x2b\n')
+            with open(os.path.join(out_dir, 'TAC_Op.csv')) as f:
+                self.assertEqual(f.read(), 's1\tGAS\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from src.manifest import MANIFEST_FILE, build_manifest, write_manifest, read_manifest, nonempty_relations, manifest_analytics
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, contents):
+        with open(os.path.join(self.tmp.name, name), 'w') as f:
+            f.write(contents)
+
+    def test_tuple_counts(self):
+        self.write('TAC_Op.csv', '0x0\tPUSH1\n0x2\tSTOP\n')
+        self.write('Analytics_Jumps.csv', 'a\nb\nc')
+        self.write('Empty.csv', '')
+        manifest = build_manifest(self.tmp.name, counts=True)
+
+        self.assertEqual(manifest['TAC_Op']['tuples'], 2)
+        self.assertEqual(manifest['Analytics_Jumps']['tuples'], 3)
+        self.assertEqual(manifest['Empty']['tuples'], 0)
+        self.assertEqual(sorted(nonempty_relations(manifest)), ['Analytics_Jumps', 'TAC_Op'])
+
+    def test_only_analytics_are_counted_by_default(self):
+        self.write('TAC_Op.csv', '0x0\tPUSH1\n0x2\tSTOP\n')
+        self.write('Analytics_Jumps.csv', 'a\nb\nc')
+        manifest = build_manifest(self.tmp.name)
+
+        self.assertEqual(manifest['TAC_Op'], {'file': 'TAC_Op.csv', 'size': 19})
+        self.assertEqual(manifest['Analytics_Jumps']['tuples'], 3)
+
+    def test_client_outputs_keep_their_names(self):
+        self.write('client.py.out', 'result\n')
+        self.write('client.py.err', '')
+        self.write('PushValue.facts', '0x0\t0x1\n')
+
+        self.assertEqual(sorted(build_manifest(self.tmp.name)), ['PushValue', 'client.py.err', 'client.py.out'])
+
+    def test_results_files_keep_their_stems(self):
+        self.write('client.py.out', 'result\n')
+        self.write('client.py.err', '')
+        self.write('bytecode.hex', '00')
+
+        self.assertEqual(sorted(nonempty_relations(build_manifest(self.tmp.name))), ['bytecode', 'client'])
+
+    def test_hash_ignores_tuple_order(self):
+        self.write('A.csv', 'x\t1\ny\t2\n')
+        first = build_manifest(self.tmp.name, hashes=True)['A']['hash']
+        self.write('A.csv', 'y\t2\nx\t1\n')
+        second = build_manifest(self.tmp.name, hashes=True)['A']['hash']
+        self.write('A.csv', 'y\t2\nx\t3\n')
+        third = build_manifest(self.tmp.name, hashes=True)['A']['hash']
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
+    def test_round_trip(self):
+        self.write('A.csv', 'x\n')
+        manifest = build_manifest(self.tmp.name)
+        write_manifest(self.tmp.name, manifest)
+
+        self.assertEqual(read_manifest(self.tmp.name), manifest)
+        self.assertNotIn(MANIFEST_FILE.split('.')[0], build_manifest(self.tmp.name))
+
+    def test_analytics(self):
+        self.write('Analytics_Jumps.csv', 'a\nb\n')
+        self.write('VulnerabilityDescription_Reentrancy.csv', 'reentrant call\n')
+        self.write('Reentrancy.csv', '0x12\n')
+        self.write('VulnerabilityDescription_Overflow.csv', 'overflow\n')
+        self.write('Overflow.csv', '')
+
+        analytics = manifest_analytics(self.tmp.name, build_manifest(self.tmp.name))
+        self.assertEqual(analytics, {'Analytics_Jumps': 2, 'Reentrancy': '0x12\n', 'Overflow': ''})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import os
+import tempfile
+import textwrap
+import unittest
+
+from src.plugins import is_plugin, load_plugin, run_plugin
+
+PLUGIN = """
+import time
+
+GIGAHORSE_PLUGIN = True
+
+def analyze(out_dir):
+    if out_dir == 'slow':
+        time.sleep(5)
+    if out_dir == 'careless':
+        # gives up on whatever fails, as many clients do
+        try:
+            time.sleep(5)
+        except Exception:
+            pass
+        return 'finished'
+    if out_dir == 'bad':
+        raise ValueError('bad contract')
+    print('analyzing', out_dir)
+    return {'out_dir': out_dir}
+"""
+
+SCRIPT = """
+open({marker!r}, 'w').close()
+
+def main():
+    pass
+"""
+
+UNMARKED = """
+def analyze(out_dir):
+    pass
+
+if __name__ == '__main__':
+    analyze('.')
+"""
+
+PYTHON2 = """#!/usr/bin/env python2
+GIGAHORSE_PLUGIN = True
+
+def analyze(out_dir):
+    print 'analyzing', out_dir
+"""
+
+
+class PluginTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.plugin = self.write('plugin.py', PLUGIN)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, source):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(textwrap.dedent(source))
+        return path
+
+    def run_plugin(self, out_dir, timeout=10):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        runtime = run_plugin(load_plugin(self.plugin), out_dir, timeout, stdout, stderr)
+        return runtime, stdout.getvalue(), stderr.getvalue()
+
+    def test_is_plugin(self):
+        marker = os.path.join(self.tmp.name, 'ran')
+        script = self.write('script.py', SCRIPT.format(marker=marker))
+
+        self.assertTrue(is_plugin(self.plugin))
+        self.assertFalse(is_plugin(script))
+        self.assertFalse(os.path.exists(marker))
+        self.assertFalse(is_plugin(self.write('unmarked.py', UNMARKED)))
+        self.assertFalse(is_plugin(self.write('python2.py', PYTHON2)))
+
+    def test_results_and_output(self):
+        runtime, stdout, stderr = self.run_plugin('out')
+
+        self.assertGreaterEqual(runtime, 0)
+        self.assertEqual(stdout, 'analyzing out\n{\n "out_dir": "out"\n}\n')
+        self.assertEqual(stderr, '')
+
+    def test_errors_are_reported(self):
+        runtime, stdout, stderr = self.run_plugin('bad')
+
+        self.assertGreaterEqual(runtime, 0)
+        self.assertEqual(stdout, '')
+        self.assertIn('ValueError: bad contract', stderr)
+
+    def test_timeout(self):
+        self.assertEqual(self.run_plugin('slow', timeout=0.1)[0], -1)
+        self.assertEqual(self.run_plugin('careless', timeout=0.1)[:2], (-1, ''))
+        self.assertEqual(self.run_plugin('out', timeout=0)[0], -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
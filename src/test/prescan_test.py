@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+
+import src.blockparse as blockparse
+from src.prescan import (
+    CONTEXT_DEPTH_HINT_FACTS, LARGE_DISPATCHER, MIN_CONTEXT_DEPTH, context_depth, scan, write_context_depth_hint
+)
+
+
+def features(jumps, dispatcher_size=0):
+    return {'code_length': 0, 'jumps': jumps, 'jumpis': 0, 'push2_jump_targets': 0, 'dispatcher_size': dispatcher_size}
+
+
+class PrescanTest(unittest.TestCase):
+    def test_scan(self):
+        # JUMPDEST, PUSH2 0x0, JUMP, PUSH2 0x99, JUMPI, STOP
+        blocks = blockparse.EVMBytecodeParser('5b610000566100995700').parse()
+        self.assertEqual(scan(blocks), {
+            'code_length': 10, 'jumps': 1, 'jumpis': 1, 'push2_jump_targets': 1, 'dispatcher_size': 0,
+        })
+
+    def test_context_depth_decreases_with_size(self):
+        depths = [context_depth(features(jumps)) for jumps in (10, 1000, 5000, 10000, 100000)]
+        self.assertEqual(depths, sorted(depths, reverse=True))
+        self.assertEqual(depths[-1], MIN_CONTEXT_DEPTH)
+        self.assertEqual(context_depth(features(5000)), 4)
+
+    def test_context_depth_never_exceeds_default(self):
+        self.assertEqual(context_depth(features(0)), 4)
+
+    def test_large_dispatchers_get_shallower_contexts(self):
+        self.assertEqual(context_depth(features(5000, LARGE_DISPATCHER + 1)), 3)
+        self.assertEqual(context_depth(features(100000, LARGE_DISPATCHER + 1)), MIN_CONTEXT_DEPTH)
+
+    def test_write_context_depth_hint(self):
+        with tempfile.TemporaryDirectory() as fact_dir:
+            write_context_depth_hint(fact_dir, 3)
+            with open(os.path.join(fact_dir, CONTEXT_DEPTH_HINT_FACTS)) as f:
+                self.assertEqual(f.read(), '3\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
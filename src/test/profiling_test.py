@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+
+import src.blockparse as blockparse
+import src.exporter as exporter
+from src.profiling import StageProfiler, NULL_PROFILER
+
+BYTECODE = '6080604052600436106100135760003560e01c5b600080fd'
+
+
+class StageProfilerTest(unittest.TestCase):
+    def test_fact_generation_stages(self):
+        profiler = StageProfiler()
+        blocks = blockparse.EVMBytecodeParser(BYTECODE).parse(profiler)
+        with tempfile.TemporaryDirectory() as d:
+            exporter.InstructionTsvExporter(blocks).export(output_dir=d, bytecode_hex=BYTECODE, profiler=profiler)
+
+        self.assertEqual(list(profiler.times), ['parse', 'blocks', 'links', 'facts', 'dasm'])
+        self.assertEqual(profiler.counts['bytes'], len(BYTECODE) // 2)
+        self.assertEqual(profiler.counts['ops'], profiler.counts['statements'])
+        self.assertEqual(profiler.counts['blocks'], len(blocks))
+
+        analytics = profiler.as_analytics()
+        self.assertIn('facts_parse_time', analytics)
+        self.assertEqual(analytics['facts_push_values'], 7)
+
+    def test_merge(self):
+        a, b = StageProfiler(), StageProfiler()
+        a.count('ops', 2)
+        b.count('ops', 3)
+        with b.stage('parse'):
+            pass
+        a.merge(b)
+
+        self.assertEqual(a.counts['ops'], 5)
+        self.assertIn('parse', a.times)
+
+    def test_null_profiler_records_nothing(self):
+        with NULL_PROFILER.stage('parse'):
+            NULL_PROFILER.count('ops', 10)
+
+        self.assertFalse(NULL_PROFILER.times)
+        self.assertFalse(NULL_PROFILER.counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.manifest import build_manifest, write_manifest
+from src.rundiff import compare_results, compare_runs
+
+
+class CompareRunsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old = os.path.join(self.tmp.name, 'old')
+        self.new = os.path.join(self.tmp.name, 'new')
+        for run in (self.old, self.new):
+            self.write(run, 'same', 'TAC_Op.csv', '0x1\tSTOP\n0x2\tADD\n')
+        self.write(self.old, 'reordered', 'TAC_Op.csv', '0x1\tSTOP\n0x2\tADD\n')
+        self.write(self.new, 'reordered', 'TAC_Op.csv', '0x2\tADD\n0x1\tSTOP\n')
+        self.write(self.old, 'changed', 'TAC_Op.csv', '0x1\tSTOP\n')
+        self.write(self.old, 'changed', 'Analytics_JumpToMany.csv', '0x1\n0x2\n')
+        self.write(self.old, 'changed', 'Empty.csv', '')
+        self.write(self.new, 'changed', 'TAC_Op.csv', '0x1\tSTOP\n0x3\tJUMP\n')
+        self.write(self.new, 'changed', 'Analytics_JumpToMany.csv', '0x1\n')
+        self.write(self.old, 'removed', 'TAC_Op.csv', '')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, run, contract, name, contents):
+        out_dir = os.path.join(run, contract, 'out')
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, name), 'w') as f:
+            f.write(contents)
+
+    def test_compare_runs(self):
+        # Manifests with hashes are used, others are built
+        out_dir = os.path.join(self.new, 'same', 'out')
+        write_manifest(out_dir, build_manifest(out_dir, hashes=True))
+
+        report = compare_runs(self.old, self.new, jobs=2)
+
+        self.assertEqual(report['compared'], 3)
+        self.assertEqual(report['only_old'], ['removed'])
+        self.assertEqual(report['only_new'], [])
+        self.assertEqual(report['relation_changes'], {'Analytics_JumpToMany': 1, 'TAC_Op': 1})
+        self.assertEqual(report['analytics_deltas'], {'Analytics_JumpToMany': -1})
+        [diff] = report['contracts']
+        self.assertEqual(diff['contract'], 'changed')
+        self.assertEqual(diff['tuples']['TAC_Op'],
+                         {'removed': 0, 'added': 1, 'removed_sample': [], 'added_sample': ['0x3\tJUMP']})
+
+    def test_sample(self):
+        [diff] = compare_runs(self.old, self.new, sample=0)['contracts']
+        self.assertNotIn('tuples', diff)
+
+
+class CompareResultsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, results):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            json.dump(results, f)
+        return path
+
+    def test_compare_results(self):
+        times = lambda d: {'disassemble_time': 0.5, 'decomp_time': d, 'client_time': 0.0}
+        old = self.write('old.json', [
+            ['a.hex', [], [], times(1.0)], ['b.hex', [], [], times(2.0)], ['/c/c.hex', [], ['TIMEOUT'], {}],
+        ])
+        new = self.write('new.json', [
+            ['a.hex', [], [], times(3.0)], ['b.hex', [], [], times(1.5)], ['c.hex', [], [], times(9.0)],
+        ])
+
+        results = compare_results(old, new)
+
+        self.assertEqual(results['stage_totals']['decomp_time'], (3.0, 4.5))
+        self.assertEqual(results['outcome_changes'], {'c': (['TIMEOUT'], [])})
+        self.assertEqual(results['slowdowns'], [('a', 2.0)])
+        self.assertEqual(results['speedups'], [('b', -0.5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from src.scheduling import (
+    BYTES_PER_JUMPDEST, JUMPDESTS_PER_THREAD, allocate_threads, predict_jumpdests
+)
+
+
+class SchedulingTest(unittest.TestCase):
+    def test_predict_jumpdests(self):
+        self.assertEqual(predict_jumpdests(0), 0)
+        self.assertEqual(predict_jumpdests(JUMPDESTS_PER_THREAD * BYTES_PER_JUMPDEST), JUMPDESTS_PER_THREAD)
+
+    def test_small_contracts_get_one_thread(self):
+        self.assertEqual(allocate_threads(10, free=8, pending=100), 1)
+
+    def test_large_contracts_get_threads_up_to_free(self):
+        self.assertEqual(allocate_threads(3 * JUMPDESTS_PER_THREAD, free=8, pending=100), 4)
+        self.assertEqual(allocate_threads(100 * JUMPDESTS_PER_THREAD, free=8, pending=100), 8)
+        self.assertEqual(allocate_threads(100 * JUMPDESTS_PER_THREAD, free=2, pending=100), 2)
+
+    def test_end_of_batch_splits_free_threads(self):
+        self.assertEqual(allocate_threads(10, free=8, pending=2), 4)
+        self.assertEqual(allocate_threads(10, free=8, pending=1), 8)
+        self.assertEqual(allocate_threads(10, free=8, pending=8), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
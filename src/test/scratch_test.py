@@ -0,0 +1,79 @@
+import os
+import tarfile
+import tempfile
+import unittest
+
+from src.manifest import build_manifest, read_manifest, write_manifest
+from src.scratch import OUTPUT_ARCHIVE, is_persisted, persist
+
+
+class PersistTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scratch_dir = os.path.join(self.tmp.name, 'shm', 'contract')
+        self.work_dir = os.path.join(self.tmp.name, '.temp', 'contract')
+        scratch_out = os.path.join(self.scratch_dir, 'out')
+        os.makedirs(scratch_out)
+        for name, contents in (('Analytics_JumpToMany.csv', '0x1\n'), ('TAC_Op.csv', '0x1\tSTOP\n'),
+                               ('client.py.out', 'done\n')):
+            with open(os.path.join(scratch_out, name), 'w') as f:
+                f.write(contents)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keeps_matching_outputs(self):
+        persist(self.scratch_dir, self.work_dir, ['Analytics_*', '*.py.out'])
+
+        out_dir = os.path.join(self.work_dir, 'out')
+        self.assertEqual(sorted(os.listdir(out_dir)), ['Analytics_JumpToMany.csv', 'client.py.out', 'manifest.json'])
+        self.assertEqual(sorted(read_manifest(out_dir)), ['Analytics_JumpToMany', 'client.py.out'])
+        self.assertFalse(os.path.exists(self.scratch_dir))
+        self.assertFalse(os.path.exists(os.path.join(self.work_dir, OUTPUT_ARCHIVE)))
+        self.assertTrue(is_persisted(self.work_dir))
+        self.assertFalse(is_persisted(self.scratch_dir))
+
+    def test_uses_written_manifest(self):
+        scratch_out = os.path.join(self.scratch_dir, 'out')
+        manifest = build_manifest(scratch_out, hashes=True)
+        write_manifest(scratch_out, manifest)
+
+        persist(self.scratch_dir, self.work_dir, ['TAC_*'])
+
+        self.assertEqual(read_manifest(os.path.join(self.work_dir, 'out')), {'TAC_Op': manifest['TAC_Op']})
+
+    def test_archive(self):
+        persist(self.scratch_dir, self.work_dir, [], archive=True)
+
+        self.assertEqual(os.listdir(os.path.join(self.work_dir, 'out')), ['manifest.json'])
+        with tarfile.open(os.path.join(self.work_dir, OUTPUT_ARCHIVE)) as packed:
+            self.assertIn('out/TAC_Op.csv', packed.getnames())
+
+    def test_replaces_working_dir_whole(self):
+        os.makedirs(os.path.join(self.work_dir, 'out'))
+        open(os.path.join(self.work_dir, 'out', 'stale.csv'), 'w').close()
+        os.makedirs(self.work_dir + '.tmp')
+
+        persist(self.scratch_dir, self.work_dir, ['TAC_*'])
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.work_dir, 'out'))), ['TAC_Op.csv', 'manifest.json'])
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.work_dir))), ['contract'])
+
+    def test_failed_persist_leaves_no_working_dir(self):
+        scratch_out = os.path.join(self.scratch_dir, 'out')
+        manifest = build_manifest(scratch_out)
+        write_manifest(scratch_out, manifest)
+        os.remove(os.path.join(scratch_out, 'TAC_Op.csv'))
+
+        with self.assertRaises(OSError):
+            persist(self.scratch_dir, self.work_dir, ['*'])
+        self.assertFalse(os.path.exists(self.work_dir))
+        self.assertFalse(os.path.exists(self.work_dir + '.tmp'))
+
+    def test_missing_scratch(self):
+        persist(os.path.join(self.tmp.name, 'missing'), self.work_dir, ['*'], archive=True)
+        self.assertEqual(read_manifest(os.path.join(self.work_dir, 'out')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
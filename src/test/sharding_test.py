@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+import src.blockparse as blockparse
+from src.sharding import (
+    EXCLUDED_FACTS, SELECTED_FACTS, SELECTION_CONTEXT_SENSITIVITIES, context_sensitivity, diff_outputs,
+    dispatch_selectors, merge_outputs, partition, prepare_shard, resolve_selectors
+)
+
+# Two dispatcher comparisons (the second after a DUP1), followed by an unrelated PUSH4
+DISPATCHER = '63a9059cbb1461001057' '8063095ea7b31461002057' '63deadbeef50' '00'
+
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, directory, name, contents):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(contents)
+
+    def read(self, directory, name):
+        with open(os.path.join(directory, name)) as f:
+            return f.read()
+
+    def test_dispatch_selectors(self):
+        blocks = blockparse.EVMBytecodeParser(DISPATCHER).parse()
+        self.assertEqual(dispatch_selectors(blocks), ['0xa9059cbb', '0x95ea7b3'])
+
+    def test_resolve_selectors(self):
+        signatures = os.path.join(self.tmp.name, 'PublicFunctionSignature.facts')
+        self.write(self.tmp.name, 'PublicFunctionSignature.facts',
+                   '0xa9059cbb\ttransfer(address,uint256)\n'
+                   '0x12514bba\ttransfer(uint256)\n'
+                   '0x095ea7b3\tapprove(address,uint256)\n')
+
+        self.assertEqual(resolve_selectors(['transfer'], signatures), ['0xa9059cbb', '0x12514bba'])
+        self.assertEqual(resolve_selectors(['approve(address,uint256)', '0x2e1a7d4d'], signatures),
+                         ['0x95ea7b3', '0x2e1a7d4d'])
+        with self.assertRaises(ValueError):
+            resolve_selectors(['withdraw'], signatures)
+
+    def test_context_sensitivity(self):
+        self.assertEqual(context_sensitivity(''), 'transactional-context')
+        self.assertEqual(context_sensitivity('COMPACT_CONTEXT CONTEXT_SENSITIVITY=selective_2context'),
+                         'selective_2context')
+        self.assertNotIn('selective_2context', SELECTION_CONTEXT_SENSITIVITIES)
+
+    def test_partition_covers_every_selector_once(self):
+        selectors = ['0x{:x}'.format(i) for i in range(7)]
+        shards = partition(selectors, 3)
+
+        self.assertEqual(len(shards), 3)
+        selected = [s for group, _ in shards[:-1] for s in group]
+        self.assertEqual(shards[-1], ([], selected))
+        self.assertEqual(len(set(selected)), len(selected))
+        self.assertEqual(len(selected), 5)
+
+        self.assertEqual(partition([], 4), [([], [])])
+        self.assertEqual(len(partition(selectors[:2], 8)), 2)
+
+    def test_prepare_shard(self):
+        facts = os.path.join(self.tmp.name, 'facts')
+        self.write(facts, 'Statement_Opcode.facts', '0x0\tSTOP\n')
+        self.write(facts, SELECTED_FACTS, '')
+        shard = os.path.join(self.tmp.name, 'shard0')
+
+        prepare_shard(facts, shard, (['0x1', '0x2'], []))
+
+        self.assertTrue(os.path.islink(os.path.join(shard, 'Statement_Opcode.facts')))
+        self.assertEqual(self.read(shard, SELECTED_FACTS), '0x1\n0x2\n')
+        self.assertEqual(self.read(shard, EXCLUDED_FACTS), '')
+
+    def test_merge_and_diff(self):
+        a, b, merged, whole = (os.path.join(self.tmp.name, d) for d in ('a', 'b', 'merged', 'whole'))
+        self.write(a, 'TAC_Op.csv', 'x\ny\n')
+        self.write(b, 'TAC_Op.csv', 'y\nz\n')
+        self.write(b, 'TAC_Block.csv', 'b\n')
+        os.makedirs(merged)
+
+        merge_outputs([a, b], merged)
+
+        self.assertEqual(self.read(merged, 'TAC_Op.csv'), 'x\ny\nz\n')
+        self.assertEqual(self.read(merged, 'TAC_Block.csv'), 'b\n')
+
+        self.write(whole, 'TAC_Op.csv', 'z\nw\ny\nx\n')
+        self.write(whole, 'TAC_Block.csv', 'b\n')
+        self.assertEqual(diff_outputs(whole, merged), {'TAC_Op.csv': (1, 0)})
+
+    def test_merge_negated_relations(self):
+        a, b, merged = (os.path.join(self.tmp.name, d) for d in ('a', 'b', 'merged'))
+        # 0x1 is only reachable from b's functions, 0x2 from neither
+        self.write(a, 'Analytics_UnreachableBlock.csv', '0x1\n0x2\n')
+        self.write(b, 'Analytics_UnreachableBlock.csv', '0x2\n0x3\n')
+        # s2 is analyzed by both shards, but only a misses its operand
+        self.write(a, 'TAC_Op.csv', 's1\tADD\ns2\tADD\n')
+        self.write(b, 'TAC_Op.csv', 's2\tADD\ns3\tADD\n')
+        self.write(a, 'Analytics_StmtMissingOperand.csv', 's1\ns2\n')
+        self.write(b, 'Analytics_StmtMissingOperand.csv', 's3\n')
+        os.makedirs(merged)
+
+        merge_outputs([a, b], merged)
+
+        self.assertEqual(self.read(merged, 'Analytics_UnreachableBlock.csv'), '0x2\n')
+        self.assertEqual(self.read(merged, 'Analytics_StmtMissingOperand.csv'), 's1\ns3\n')
+        self.assertEqual(self.read(merged, 'TAC_Op.csv'), 's1\tADD\ns2\tADD\ns3\tADD\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
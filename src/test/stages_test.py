@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from src.stages import StageCache, TRANSFORM_INPUTS
+
+
+class StageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = StageCache(os.path.join(self.tmp.name, 'stages'))
+        self.facts = os.path.join(self.tmp.name, 'facts')
+        self.out = os.path.join(self.tmp.name, 'out')
+        os.makedirs(self.facts)
+        os.makedirs(self.out)
+        self.write(self.facts, 'Statement_Opcode.facts', '0x0\tSTOP\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, directory, name, contents):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(contents)
+
+    def test_key_depends_on_program_and_inputs(self):
+        key = self.cache.key('program', self.facts, TRANSFORM_INPUTS)
+
+        self.assertEqual(key, self.cache.key('program', self.facts, TRANSFORM_INPUTS))
+        self.assertNotEqual(key, self.cache.key('program2', self.facts, TRANSFORM_INPUTS))
+        self.write(self.facts, 'Statement_Opcode.facts', '0x0\tINVALID\n')
+        self.assertNotEqual(key, self.cache.key('program', self.facts, TRANSFORM_INPUTS))
+
+    def test_store_and_restore(self):
+        key = self.cache.key('program', self.facts, TRANSFORM_INPUTS)
+        self.assertFalse(self.cache.restore(key, self.out))
+
+        self.write(self.out, 'TransformedStatement_Opcode.csv', '0x0\tSTOP\n')
+        self.write(self.out, 'Unrelated.csv', 'x\n')
+        self.cache.store(key, self.out, ['TransformedStatement_Opcode.csv'])
+
+        restored = os.path.join(self.tmp.name, 'restored')
+        os.makedirs(restored)
+        self.assertTrue(self.cache.restore(key, restored))
+        self.assertEqual(os.listdir(restored), ['TransformedStatement_Opcode.csv'])
+
+    def test_store_keeps_first_entry(self):
+        self.write(self.out, 'A.csv', 'first\n')
+        self.cache.store('k', self.out, ['A.csv'])
+        self.write(self.out, 'A.csv', 'second\n')
+        self.cache.store('k', self.out, ['A.csv'])
+
+        restored = os.path.join(self.tmp.name, 'restored')
+        os.makedirs(restored)
+        self.cache.restore('k', restored)
+        with open(os.path.join(restored, 'A.csv')) as f:
+            self.assertEqual(f.read(), 'first\n')
+        self.assertEqual(os.listdir(self.cache.cache_dir), ['k'])
+
+
+if __name__ == '__main__':
+    unittest.main()
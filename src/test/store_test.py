@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.manifest import build_manifest, write_manifest
+from src.store import QueryStore, contract_out_dirs, selector_values
+
+
+class QueryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work_dir = os.path.join(self.tmp.name, '.temp')
+        self.write('a', 'PublicFunction.csv', '0x10\t0xa9059cbb\n0x20\t0x95ea7b3\n')
+        self.write('a', 'HighLevelFunctionName.csv', '0x10\ttransfer(address,uint256)\n')
+        self.write('b', 'PublicFunction.csv', '0x30\t0x95ea7b3\n')
+        self.write('b', 'TAC_Op.csv', '0x1\tSTOP\n')
+        self.store = QueryStore(os.path.join(self.tmp.name, 'results.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def write(self, contract, name, contents):
+        out_dir = os.path.join(self.work_dir, contract, 'out')
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, name), 'w') as f:
+            f.write(contents)
+
+    def test_selector_values(self):
+        self.assertEqual(selector_values('0x095ea7b3'), ['0x095ea7b3', '0x95ea7b3'])
+
+    def test_ingest_and_query(self):
+        self.assertEqual(self.store.ingest(contract_out_dirs(self.work_dir), jobs=2), 2)
+
+        self.assertEqual(self.store.contracts(values=selector_values('0x095ea7b3')), ['a', 'b'])
+        self.assertEqual(self.store.query(relation='HighLevelFunctionName'),
+                         [('a', 'HighLevelFunctionName', ('0x10', 'transfer(address,uint256)'))])
+        self.assertEqual(self.store.query(contract='b'), [('b', 'PublicFunction', ('0x30', '0x95ea7b3'))])
+        self.assertEqual(self.store.query(values=['0x10'], position=1), [])
+
+    def test_reingesting_replaces_contract(self):
+        self.store.ingest(contract_out_dirs(self.work_dir))
+        self.write('b', 'PublicFunction.csv', '0x40\t0x12514bba\n')
+        # the manifest, when there is one, says which relations are non-empty
+        write_manifest(os.path.join(self.work_dir, 'b', 'out'), build_manifest(os.path.join(self.work_dir, 'b', 'out')))
+        self.store.ingest(contract_out_dirs(self.work_dir))
+
+        self.assertEqual(self.store.query(contract='b'), [('b', 'PublicFunction', ('0x40', '0x12514bba'))])
+        self.assertEqual(self.store.contracts(), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
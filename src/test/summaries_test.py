@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+
+from src.summaries import FunctionSummaryStore, function_hashes, read_function_hashes, write_function_hashes
+from src.tac import TACOutput
+
+
+def function_rows(entry: int, constant: str, var_prefix: str, op: str = 'ADD'):
+    """Output rows of a function applying op to its argument and a constant, at code offset entry."""
+    head, tail = hex(entry), hex(entry + 0x10)
+    return {
+        'InFunction': [(head, head), (tail, head)],
+        'FormalArgs': [(head, var_prefix + 'a', '0')],
+        'TAC_Block': [(hex(entry + 1), head), (hex(entry + 2), head), (hex(entry + 0x11), tail)],
+        'TAC_Op': [(hex(entry + 1), 'CONST'), (hex(entry + 2), op), (hex(entry + 0x11), 'RETURNPRIVATE')],
+        'TAC_Def': [(hex(entry + 1), var_prefix + 'c', '0'), (hex(entry + 2), var_prefix + 's', '0')],
+        'TAC_Use': [(hex(entry + 2), var_prefix + 'a', '0'), (hex(entry + 2), var_prefix + 'c', '1'),
+                    (hex(entry + 0x11), var_prefix + 's', '0')],
+        'TAC_Variable_Value': [(var_prefix + 'c', constant)],
+        'LocalBlockEdge': [(head, tail)],
+    }
+
+
+class FunctionHashTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def hashes(self, *functions):
+        out_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        rows = {}
+        for function in functions:
+            for name, function_rows in function.items():
+                rows.setdefault(name, []).extend(function_rows)
+        for name, relation_rows in rows.items():
+            with open(os.path.join(out_dir, name + '.csv'), 'w') as f:
+                f.writelines('\t'.join(row) + '\n' for row in relation_rows)
+        return function_hashes(TACOutput(out_dir))
+
+    def test_independent_of_location_and_names(self):
+        hashes = self.hashes(function_rows(0x100, '0x1', 'v'), function_rows(0x400, '0x1', 'w'))
+        self.assertEqual(hashes['0x100'], hashes['0x400'])
+        self.assertEqual(hashes, self.hashes(function_rows(0x400, '0x1', 'w'), function_rows(0x100, '0x1', 'v')))
+
+    def test_constants_matter(self):
+        hashes = self.hashes(function_rows(0x100, '0x1', 'v'), function_rows(0x400, '0x2', 'w'))
+        self.assertNotEqual(hashes['0x100'], hashes['0x400'])
+
+    def test_constant_blocks_are_renumbered(self):
+        hashes = self.hashes(function_rows(0x100, '0x110', 'v'), function_rows(0x400, '0x410', 'w'),
+                             function_rows(0x700, '0x100', 'x'))
+        self.assertEqual(hashes['0x100'], hashes['0x400'])
+        self.assertNotEqual(hashes['0x100'], hashes['0x700'])
+
+    def test_callees_matter(self):
+        # 0x700 and 0xa00 only differ in the functions they refer to
+        hashes = self.hashes(function_rows(0x100, '0x1', 'v'), function_rows(0x400, '0x2', 'w'),
+                             function_rows(0x700, '0x100', 'x'), function_rows(0xa00, '0x400', 'y'))
+        self.assertNotEqual(hashes['0x700'], hashes['0xa00'])
+
+        hashes = self.hashes(function_rows(0x100, '0x1', 'v'), function_rows(0x400, '0x1', 'w'),
+                             function_rows(0x700, '0x100', 'x'), function_rows(0xa00, '0x400', 'y'))
+        self.assertEqual(hashes['0x700'], hashes['0xa00'])
+
+    def test_recursive_functions(self):
+        hashes = self.hashes(function_rows(0x100, '0x400', 'v'), function_rows(0x400, '0x100', 'w'))
+        self.assertEqual(hashes['0x100'], hashes['0x400'])
+        self.assertEqual(hashes, self.hashes(function_rows(0x400, '0x100', 'w'), function_rows(0x100, '0x400', 'v')))
+
+    def test_recursive_callees_matter(self):
+        # 0x100 and 0x700 are the same, but call back and forth with different functions
+        hashes = self.hashes(function_rows(0x100, '0x400', 'v'), function_rows(0x400, '0x100', 'w'),
+                             function_rows(0x700, '0xa00', 'x'), function_rows(0xa00, '0x700', 'y', op='SUB'))
+        self.assertNotEqual(hashes['0x100'], hashes['0x700'])
+        self.assertNotEqual(hashes['0x400'], hashes['0xa00'])
+
+    def test_write_and_read(self):
+        write_function_hashes(self.tmp.name, {'0x100': 'ab', '0x20': 'cd'})
+        self.assertEqual(read_function_hashes(self.tmp.name), {'0x100': 'ab', '0x20': 'cd'})
+        self.assertEqual(read_function_hashes(os.path.join(self.tmp.name, 'missing')), {})
+
+
+class FunctionSummaryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'summaries.sqlite')
+        self.store = FunctionSummaryStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_keyed_by_function_and_client(self):
+        self.store.put('f1', 'client1', 'summary1')
+        self.store.put('f1', 'client2', 'summary2')
+
+        self.assertEqual(self.store.get('f1', 'client1'), 'summary1')
+        self.assertEqual(self.store.get('f1', 'client2'), 'summary2')
+        self.assertIsNone(self.store.get('f2', 'client1'))
+        self.assertEqual(self.store.get_many(['f1', 'f2', 'f1'], 'client2'), {'f1': 'summary2'})
+
+    def test_first_summary_is_kept_and_shared(self):
+        self.store.put('f1', 'client1', 'first')
+        other = FunctionSummaryStore(self.path)
+        other.put('f1', 'client1', 'second')
+        other.put('f2', 'client1', 'other')
+        other.close()
+
+        self.assertEqual(self.store.get_many(['f1', 'f2'], 'client1'), {'f1': 'first', 'f2': 'other'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import src.blockparse as blockparse
+import src.opcodes as opcodes
+from src.synthetic import Assembler, SyntheticContractGenerator
+
+
+class SyntheticContractTest(unittest.TestCase):
+    def parse_ops(self, bytecode: str):
+        blocks = blockparse.EVMBytecodeParser(bytecode).parse()
+        return [op for block in blocks for op in block.evm_ops]
+
+    def test_jump_targets_are_jumpdests(self):
+        generator = SyntheticContractGenerator(num_functions=6, call_depth=3, shared_functions=2, loops=2)
+        ops = self.parse_ops(generator.generate_hex())
+        jumpdests = {op.pc for op in ops if op.opcode == opcodes.JUMPDEST}
+        pushes = [(op, nxt) for op, nxt in zip(ops, ops[1:]) if op.opcode == opcodes.PUSH2]
+
+        self.assertTrue(all(op.opcode.name != 'MISSING' for op in ops))
+        self.assertTrue(pushes)
+        for push, jump in pushes:
+            if jump.opcode in (opcodes.JUMP, opcodes.JUMPI):
+                self.assertIn(push.value, jumpdests)
+
+    def test_selectors(self):
+        generator = SyntheticContractGenerator(num_functions=10)
+        ops = self.parse_ops(generator.generate_hex())
+        selectors = [op.value for op in ops if op.opcode == opcodes.PUSH4]
+
+        self.assertEqual(selectors, generator.selectors)
+        self.assertEqual(len(set(selectors)), 10)
+
+    def test_shared_functions(self):
+        generator = SyntheticContractGenerator(num_functions=8, call_depth=2, shared_functions=2)
+        chains = {tuple(generator.private_chain(i)) for i in range(8)}
+
+        self.assertEqual(len(chains), 2)
+
+    def test_code_size(self):
+        small = SyntheticContractGenerator(num_functions=3).generate()
+        padded = SyntheticContractGenerator(num_functions=3, loops=1, code_size=5000).generate()
+
+        self.assertLess(len(small), 5000)
+        self.assertGreaterEqual(len(padded), 5000)
+        self.assertLess(len(padded), 5000 + 6 * 3)
+
+    def test_wide_labels(self):
+        asm = Assembler().jump("end")
+        for _ in range(0x10000):
+            asm.op("JUMPDEST")
+        code = asm.label("end").op("STOP").assemble()
+
+        self.assertEqual(code[0], opcodes.PUSH3.code)
+        self.assertEqual(int.from_bytes(code[1:4], "big"), len(code) - 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
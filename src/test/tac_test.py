@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.tac import TACOutput, pc_sort_key
+
+
+class TACOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.write('TAC_Block', [('0x12', '0x10'), ('0x10', '0x10'), ('0x20', '0x20')])
+        self.write('TAC_Op', [('0x10', 'PUSH1'), ('0x12', 'ADD'), ('0x20', 'JUMP')])
+        self.write('TAC_Use', [('0x12', '0x91', '1'), ('0x12', '0x90', '0')])
+        self.write('LocalBlockEdge', [('0x10', '0x20'), ('0x20', '0x10'), ('0x10', '0x30')])
+        self.tac = TACOutput(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, rows):
+        with open(os.path.join(self.tmp.name, name + '.csv'), 'w') as f:
+            f.writelines('\t'.join(row) + '\n' for row in rows)
+
+    def test_relation_is_interned(self):
+        ops = self.tac.relation('TAC_Op')
+        blocks = self.tac.relation('TAC_Block')
+
+        self.assertEqual(len(ops), 3)
+        self.assertEqual(list(ops)[1], ('0x12', 'ADD'))
+        self.assertEqual(ops.columns[0][0], blocks.columns[0][1])
+
+    def test_adjacency(self):
+        self.assertEqual(sorted(self.tac.successors('0x10')), ['0x20', '0x30'])
+        self.assertEqual(self.tac.predecessors('0x10'), ['0x20'])
+        self.assertEqual(self.tac.predecessors('0x99'), [])
+
+    def test_statements_and_uses(self):
+        self.assertEqual(self.tac.block_statements()['0x10'], ['0x10', '0x12'])
+        self.assertEqual(self.tac.uses('0x12'), ['0x90', '0x91'])
+        self.assertEqual(self.tac.defs('0x12'), [])
+        self.assertEqual(self.tac.op('0x20'), 'JUMP')
+
+    def test_missing_relation_is_empty(self):
+        self.assertEqual(len(self.tac.relation('IRFunctionCall')), 0)
+        self.assertEqual(self.tac.relation('IRFunctionCall').lookup('0x10'), [])
+        self.assertEqual(self.tac.function_name('0x10'), None)
+
+    def test_pc_sort_key(self):
+        self.assertEqual(sorted(['0x1a0x2b_3', '0x3', 'junk'], key=pc_sort_key), ['junk', '0x3', '0x1a0x2b_3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+from multiprocessing import Process
+
+from src.telemetry import BatchTelemetry
+
+
+def record_in_worker(telemetry: BatchTelemetry, slot: int):
+    telemetry.record_stage(slot, 'decomp', 3.0)
+    telemetry.record_outcome(slot, 'completed')
+
+
+class BatchTelemetryTest(unittest.TestCase):
+    def test_snapshot_aggregates_slots(self):
+        telemetry = BatchTelemetry(2)
+        telemetry.total = 5
+        telemetry.dispatched = 3
+        telemetry.record_stage(0, 'disassemble', 0.05)
+        telemetry.record_stage(1, 'disassemble', 0.05)
+        telemetry.record_outcome(0, 'completed')
+        telemetry.record_outcome(1, 'timeout')
+
+        snap = telemetry.snapshot()
+
+        self.assertEqual(snap['outcomes'], {'completed': 1, 'failed': 0, 'timeout': 1})
+        self.assertEqual(snap['pending'], 2)
+        self.assertEqual(snap['stages']['disassemble']['count'], 2)
+        self.assertEqual(snap['stages']['disassemble']['buckets'][0], 2)
+        self.assertAlmostEqual(snap['stages']['disassemble']['sum'], 0.1)
+
+    def test_updates_from_worker_processes(self):
+        telemetry = BatchTelemetry(2)
+        workers = [Process(target=record_in_worker, args=(telemetry, slot)) for slot in range(2)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+
+        snap = telemetry.snapshot()
+
+        self.assertEqual(snap['outcomes']['completed'], 2)
+        self.assertEqual(snap['stages']['decomp']['count'], 2)
+
+    def test_outcomes_per_slot(self):
+        telemetry = BatchTelemetry(2)
+        before = telemetry.outcomes(1)
+        worker = Process(target=record_in_worker, args=(telemetry, 1))
+        worker.start()
+        worker.join()
+
+        self.assertEqual(telemetry.outcomes(1), before + 1)
+        self.assertEqual(telemetry.outcomes(0), 0)
+
+    def test_prometheus_histogram_is_cumulative(self):
+        telemetry = BatchTelemetry(1)
+        telemetry.record_stage(0, 'client', 0.2)
+        telemetry.record_stage(0, 'client', 400)
+
+        text = telemetry.render_prometheus()
+
+        self.assertIn('gigahorse_stage_seconds_bucket{stage="client",le="0.5"} 1', text)
+        self.assertIn('gigahorse_stage_seconds_bucket{stage="client",le="+Inf"} 2', text)
+        self.assertIn('gigahorse_stage_seconds_count{stage="client"} 2', text)
+        self.assertNotIn('gigahorse_pending_contracts', text)
+
+    def test_stats_file(self):
+        telemetry = BatchTelemetry(1)
+        telemetry.record_outcome(0, 'failed')
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'stats.json')
+            telemetry.write_stats_file(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['outcomes']['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()